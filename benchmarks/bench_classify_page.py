@@ -0,0 +1,51 @@
+"""Compare classifying NationStates pages with two BeautifulSoup parses
+(the error check and the endorse check) and with one classify_page scan.
+
+Usage: python -m benchmarks.bench_classify_page [REPEATS]
+"""
+
+import os
+import sys
+import time
+
+import bs4
+
+from ns_endotarter import executor
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+PAGES = ['endorse_page.html', 'endorsed_page.html', 'error_page.html', 'settings_page.html']
+
+
+def two_soups(html):
+    """Implementation before classify_page."""
+
+    soup = bs4.BeautifulSoup(html, 'html.parser')
+    soup.find(name='p', attrs={'class': 'error'})
+    soup = bs4.BeautifulSoup(html, 'html.parser')
+    soup.find(name='input', attrs={'name': 'action', 'value': 'unendorse'})
+
+
+def timed(func, html, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        func(html)
+    return (time.perf_counter() - start) / repeats
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    for name in PAGES:
+        with open(os.path.join(FIXTURES_DIR, name)) as f:
+            html = f.read()
+
+        assert executor.classify_page(html) == executor.classify_page_bs4(html)
+        soup_time = timed(two_soups, html, repeats)
+        scan_time = timed(executor.classify_page, html, repeats)
+        print('{:<20} {:>6} bytes: bs4 x2 {:.2f}ms, classify_page {:.3f}ms ({:.0f}x)'.format(
+            name, len(html), soup_time * 1000, scan_time * 1000, soup_time / scan_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Compare a full-tree dump scan with the byte-level region prefilter.
+
+Usage: python -m benchmarks.bench_dump_scan [NATIONS]
+"""
+
+import gzip
+import os
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from unittest import mock
+
+from benchmarks import synthetic_dump
+from ns_endotarter import data
+from ns_endotarter import utils
+
+
+def iterparse_scan(obj, dump):
+    """Scan implementation before the byte-level prefilter."""
+
+    xml = ET.iterparse(dump)
+    xml_iter = iter(xml)
+    evt, root = xml_iter.__next__()
+
+    is_in_region = False
+    for evt, elem in xml_iter:
+        if evt == 'end' and elem.tag == 'NATION':
+            region = utils.canonical(elem.find('REGION').text)
+            if region == obj.my_region:
+                is_in_region = True
+                endorsee = elem.find('ENDORSEMENTS').text
+                if endorsee is None:
+                    continue
+
+                nation = utils.canonical(elem.find('NAME').text)
+                if nation == obj.my_nation:
+                    continue
+
+                if obj.my_nation in utils.canonical(endorsee):
+                    obj.endorsed.add(nation)
+
+            elif is_in_region == True:
+                break
+
+            root.clear()
+
+
+def run(scan, dump_path):
+    obj = data.Data(mock.Mock(), mock.Mock(), dump_path, 'my_region', 'my_nation')
+    start = time.perf_counter()
+    with gzip.open(dump_path) as dump:
+        scan(obj, dump)
+    return time.perf_counter() - start, obj.endorsed
+
+
+def main(nations_num):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        dump_path = os.path.join(tmp_dir, 'nations.xml.gz')
+        synthetic_dump.write_dump(dump_path, nations_num, target_position=0.95)
+
+        old_time, old_result = run(iterparse_scan, dump_path)
+        new_time, new_result = run(data.Data.get_endorsed_from_dump, dump_path)
+
+    assert old_result == new_result
+    print('{} nations, target region at 95%'.format(nations_num))
+    print('iterparse:       {:.3f}s'.format(old_time))
+    print('region prefilter: {:.3f}s ({:.1f}x)'.format(new_time, old_time / new_time))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
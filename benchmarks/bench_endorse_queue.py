@@ -0,0 +1,54 @@
+"""Compare draining the endorseable list with list.remove and EndorseQueue.
+
+Usage: python -m benchmarks.bench_endorse_queue
+"""
+
+import time
+
+from ns_endotarter import endorse_queue
+
+
+def drain_list(nations):
+    """Drain pattern before EndorseQueue, without the skipping bug."""
+
+    endorseable = list(nations)
+    while endorseable:
+        nation = endorseable[0]
+        endorseable.remove(nation)
+
+
+def drain_queue(nations):
+    endorseable = endorse_queue.EndorseQueue(nations)
+    while endorseable:
+        endorseable.pop()
+
+
+def drain_queue_with_membership(nations):
+    endorseable = endorse_queue.EndorseQueue(nations)
+    for i, nation in enumerate(nations):
+        # Simulate a stale target being pruned from the middle
+        if i % 10 == 0:
+            endorseable.discard(nations[-i - 1])
+        if nation in endorseable:
+            endorseable.pop()
+
+
+def timed(func, nations):
+    start = time.perf_counter()
+    func(nations)
+    return time.perf_counter() - start
+
+
+def main():
+    for size in (10000, 50000, 100000):
+        nations = ['nation_{}'.format(i) for i in range(size)]
+        list_time = timed(drain_list, nations)
+        queue_time = timed(drain_queue, nations)
+        membership_time = timed(drain_queue_with_membership, nations)
+        print('{:>6} nations: list.remove {:.3f}s, EndorseQueue {:.3f}s '
+              '(with membership/discard {:.3f}s)'.format(size, list_time, queue_time,
+                                                         membership_time))
+
+
+if __name__ == '__main__':
+    main()
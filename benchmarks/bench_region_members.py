@@ -0,0 +1,51 @@
+"""Compare reading region members through region.nations objects
+and through the raw nations shard on a synthetic 20k-nation response.
+
+Usage: python -m benchmarks.bench_region_members [NATIONS]
+"""
+
+import sys
+import time
+from unittest import mock
+
+import nationstates
+
+from ns_endotarter import api_adapter
+
+
+def object_path(api, shard):
+    """Implementation before reading the raw shard."""
+
+    with mock.patch.object(nationstates.objects.Region, '_auto_shard', return_value=shard):
+        nations = api.region('my_region').nations
+        return {nation.nation_name for nation in nations}
+
+
+def raw_shard_path(api, shard):
+    with mock.patch.object(nationstates.objects.Region, 'get_shards',
+                           return_value={'data': {'region': {'nations': shard}},
+                                         'headers': {}}):
+        return api_adapter.NS_API(api, 'my_nation', 'my_region').get_region_members()
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main(nations_num):
+    api = nationstates.Nationstates('ns_endotarter benchmark')
+    shard = ':'.join('nation_{}'.format(i) for i in range(nations_num))
+
+    object_time, object_result = timed(object_path, api, shard)
+    raw_time, raw_result = timed(raw_shard_path, api, shard)
+
+    assert object_result == raw_result
+    print('{} nations'.format(nations_num))
+    print('region.nations objects: {:.4f}s'.format(object_time))
+    print('raw nations shard:      {:.4f}s ({:.0f}x)'.format(raw_time, object_time / raw_time))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,151 @@
+"""Drive whole Endotarter sessions against the local NationStates
+stand-in and report time to first endorse and per-endorse overhead.
+Overhead is the time an endorse spends in our code, that is without
+the time spent in HTTPAdapter.send and waiting for rate limits.
+
+Usage: python -m benchmarks.bench_session [--nations 20000] [--endorses 20] ...
+"""
+
+import argparse
+import os
+import secrets
+import statistics
+import tempfile
+import time
+
+from benchmarks import fake_ns
+from benchmarks import synthetic_dump
+from ns_endotarter import endotarter
+from ns_endotarter import info
+from ns_endotarter import ratelimit
+
+
+MY_NATION = 'My Nation'
+MY_REGION = 'My Region'
+PASSWORD = 'password'
+
+
+def get_config(metrics_path, save_session=False):
+    return {'General': {'my_nation': MY_NATION,
+                        'my_region': MY_REGION,
+                        'password': PASSWORD,
+                        'user_agent': 'endotarter session benchmark',
+                        'keepalive_interval': 0,
+                        'save_session': save_session},
+            'Cache': {'daily_dump_update_time': '00:00:00',
+                      'update_from_dump': True},
+            'Metrics': {'enabled': True,
+                        'export_path': metrics_path}}
+
+
+def run_session(server, endorses_num, work_dir, save_session=False):
+    """Run one session from a cold cache.
+
+    Args:
+        server (fake_ns.FakeNationStates): Running stand-in server
+        endorses_num (int): Number of endorse triggers
+        work_dir (str): Directory with the dump, cache files are written there
+        save_session (bool): Keep the login session of the previous session
+
+    Returns:
+        dict: Session timings
+    """
+
+    session_path = info.SESSION_PATH.format('my_nation')
+    for file_name in os.listdir(work_dir):
+        if file_name == info.DATA_DUMP_PATH or (save_session and file_name == session_path):
+            continue
+        os.remove(os.path.join(work_dir, file_name))
+
+    with server.redirect() as send_times:
+        start = time.perf_counter()
+        obj = endotarter.Endotarter(get_config(os.path.join(work_dir, info.METRICS_PATH),
+                                               save_session))
+        obj.prepare()
+        prepare_time = time.perf_counter() - start
+
+        overheads = []
+        first_endorse_time = None
+        for _ in range(endorses_num):
+            sends_before = len(send_times)
+            waited_before = obj.governor.get_metrics()[ratelimit.SITE]['wait_time']
+            endorse_start = time.perf_counter()
+            obj.endorse()
+            duration = time.perf_counter() - endorse_start
+
+            if first_endorse_time is None:
+                first_endorse_time = time.perf_counter() - start
+            waited = obj.governor.get_metrics()[ratelimit.SITE]['wait_time'] - waited_before
+            overheads.append(duration - sum(send_times[sends_before:]) - waited)
+
+        obj.shutdown()
+
+    return {'prepare': prepare_time,
+            'first_endorse': first_endorse_time,
+            'stages': {name[len('prepare_'):]: seconds
+                       for name, seconds in obj.metrics.timers.items()
+                       if name.startswith('prepare_')},
+            'overheads': overheads}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark sessions against a local stand-in.')
+    parser.add_argument('--nations', type=int, default=20000, help='Nations in the dump')
+    parser.add_argument('--target-size', type=int, default=500, help='Nations in my region')
+    parser.add_argument('--target-position', type=float, default=0.5,
+                        help='Relative position of my region in the dump (0.0 to 1.0)')
+    parser.add_argument('--endorses', type=int, default=20, help='Endorse triggers per session')
+    parser.add_argument('--sessions', type=int, default=3, help='Number of sessions')
+    parser.add_argument('--api-latency', type=float, default=0.05, help='Seconds per API request')
+    parser.add_argument('--site-latency', type=float, default=0.05,
+                        help='Seconds per site request')
+    parser.add_argument('--site-error-rate', type=float, default=0,
+                        help='Share of endorsements failing a security check')
+    parser.add_argument('--save-session', action='store_true',
+                        help='Reuse the login session, sessions after the first start warm')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        dump_path = os.path.join(work_dir, info.DATA_DUMP_PATH)
+        synthetic_dump.write_dump(dump_path, args.nations, target_region=MY_REGION,
+                                  target_position=args.target_position,
+                                  target_size=args.target_size, my_nation=MY_NATION)
+
+        cwd = os.getcwd()
+        os.chdir(work_dir)
+        try:
+            results = []
+            # The server remembers the site session across restarts
+            local_id = secrets.token_hex(8)
+            for _ in range(args.sessions):
+                # Rate limit windows of the server start over every session
+                with fake_ns.FakeNationStates(dump_path, 'my_nation', PASSWORD,
+                                              api_latency=args.api_latency,
+                                              site_latency=args.site_latency,
+                                              site_error_rate=args.site_error_rate,
+                                              api_limit=(1000, 30),
+                                              site_limit=(1000, 30),
+                                              local_id=local_id) as server:
+                    results.append(run_session(server, args.endorses, work_dir,
+                                               args.save_session))
+        finally:
+            os.chdir(cwd)
+
+    print()
+    print('{} nations, {} sessions of {} endorses, {:.0f}ms API / {:.0f}ms site latency'.format(
+        args.nations, args.sessions, args.endorses, args.api_latency * 1000,
+        args.site_latency * 1000))
+    print('prepare:         median {:.3f}s'.format(
+        statistics.median(result['prepare'] for result in results)))
+    for name in results[0]['stages']:
+        print('  {:<14} median {:.3f}s'.format(
+            name, statistics.median(result['stages'][name] for result in results)))
+    print('first endorse:   median {:.3f}s after start'.format(
+        statistics.median(result['first_endorse'] for result in results)))
+    overheads = [overhead for result in results for overhead in result['overheads']]
+    print('endorse overhead: median {:.2f}ms, max {:.2f}ms'.format(
+        statistics.median(overheads) * 1000, max(overheads) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,436 @@
+"""Local stand-in for the NationStates API and the site pages the
+endotarter uses. Region and WA data come from a synthetic dump.
+
+Serves:
+    /cgi-bin/api.cgi: nation ping (login), nation region, nation endorsements,
+    region nations, WA members and world happenings
+    /template-overall=none/page=settings: Settings page with the localid
+    /cgi-bin/endorse.cgi: Endorse action
+    /pages/nations.xml.gz: The dump itself
+    /robots.txt: For keep-alive requests
+
+Usage: python -m benchmarks.fake_ns DUMP [PORT]
+"""
+
+import collections
+import contextlib
+import gzip
+import http.server
+import random
+import secrets
+import sys
+import threading
+import time
+import urllib.parse
+from unittest import mock
+
+import requests.adapters
+
+from ns_endotarter import api_adapter
+from ns_endotarter import dump_scanner
+from ns_endotarter import utils
+
+
+NS_HOST = 'www.nationstates.net'
+API_PATH = '/cgi-bin/api.cgi'
+SETTINGS_PATH = '/template-overall=none/page=settings'
+ENDORSE_PATH = '/cgi-bin/endorse.cgi'
+DUMP_PATH = '/pages/nations.xml.gz'
+
+SECURITY_ERROR = 'This request failed a security check. Please try again.'
+NOT_WA_ERROR = 'You can only endorse World Assembly members.'
+
+PAGE_TEMPLATE = ('<!DOCTYPE html><html><head><title>NationStates | {title}</title></head>'
+                 '<body><div id="main"><div id="content">{content}</div></div></body></html>')
+ENDORSE_FORM_TEMPLATE = ('<form method="post" action="/cgi-bin/endorse.cgi">'
+                         '<input type="hidden" name="nation" value="{nation}">'
+                         '<input type="hidden" name="localid" value="{local_id}">'
+                         '<input type="hidden" name="action" value="{action}">'
+                         '<button type="submit">{label}</button></form>')
+
+
+def read_dump(dump_path):
+    """Read WA members and region members from a dump.
+
+    Args:
+        dump_path (str): Gzipped dump file path
+
+    Returns:
+        tuple: List of WA members, dict of region -> list of nations,
+        dict of nation -> region and dict of nation -> endorsements
+        as in the dump, all canonical
+    """
+
+    wa_members = []
+    regions = collections.defaultdict(list)
+    nation_regions = {}
+    endorsements = {}
+    with gzip.open(dump_path) as dump:
+        for block in dump_scanner.iter_nation_blocks(dump):
+            name = block[block.find(b'<NAME>') + len(b'<NAME>'):block.find(b'</NAME>')]
+            nation = dump_scanner.canonical_bytes(name).decode()
+            region = dump_scanner.canonical_bytes(dump_scanner.get_block_region(block)).decode()
+            if b'<UNSTATUS>WA Member' in block or b'<UNSTATUS>WA Delegate' in block:
+                wa_members.append(nation)
+            regions[region].append(nation)
+            nation_regions[nation] = region
+            endorsers = dump_scanner.get_block_field(block, b'ENDORSEMENTS')
+            if endorsers:
+                endorsements[nation] = utils.canonical(endorsers.decode())
+
+    return wa_members, dict(regions), nation_regions, endorsements
+
+
+class RateLimit():
+    """Server side sliding window rate limit.
+
+    Args:
+        limit (int): Max requests within a window
+        window (float): Window length in seconds
+    """
+
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self.seen = collections.deque()
+        self.lock = threading.Lock()
+        self.throttled_num = 0
+
+    def check(self):
+        """Count a request.
+
+        Returns:
+            dict: Rate limit headers, None if the request is over the limit
+        """
+
+        with self.lock:
+            now = time.monotonic()
+            while self.seen and self.seen[0] <= now - self.window:
+                self.seen.popleft()
+
+            if len(self.seen) >= self.limit:
+                self.throttled_num += 1
+                return None
+
+            self.seen.append(now)
+            reset = self.seen[0] + self.window - now
+            return {'RateLimit-Policy': '{};w={}'.format(self.limit, self.window),
+                    'RateLimit-Remaining': str(self.limit - len(self.seen)),
+                    'RateLimit-Reset': str(max(round(reset), 1)),
+                    'X-ratelimit-requests-seen': str(len(self.seen))}
+
+
+class FakeNSHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, which would stall on delayed ACKs
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def send_body(self, status, body, headers=None, content_type='text/html; charset=utf-8'):
+        if isinstance(body, str):
+            body = body.encode()
+
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def read_params(self):
+        url = urllib.parse.urlsplit(self.path)
+        params = dict(urllib.parse.parse_qsl(url.query))
+        length = int(self.headers.get('Content-Length', 0))
+        if length:
+            params.update(urllib.parse.parse_qsl(self.rfile.read(length).decode()))
+
+        return url.path, params
+
+    def do_HEAD(self):
+        self.send_body(200, '', content_type='text/plain')
+
+    def do_GET(self):
+        path, params = self.read_params()
+        server = self.server.fake
+
+        if path == API_PATH:
+            server.handle_api(self, params)
+        elif path == SETTINGS_PATH:
+            server.handle_settings(self)
+        elif path == DUMP_PATH:
+            with open(server.dump_path, 'rb') as f:
+                self.send_body(200, f.read(), content_type='application/x-gzip')
+        elif path == '/robots.txt':
+            self.send_body(200, 'User-agent: *\n', content_type='text/plain')
+        else:
+            self.send_body(404, PAGE_TEMPLATE.format(title='Not Found', content='<h1>Not Found</h1>'))
+
+    def do_POST(self):
+        path, params = self.read_params()
+        server = self.server.fake
+
+        if path == API_PATH:
+            server.handle_api(self, params)
+        elif path == ENDORSE_PATH:
+            server.handle_endorse(self, params)
+        else:
+            self.send_body(404, PAGE_TEMPLATE.format(title='Not Found', content='<h1>Not Found</h1>'))
+
+
+class FakeNationStates():
+    """Local NationStates stand-in server.
+
+    Args:
+        dump_path (str): Gzipped synthetic dump to draw nations from
+        my_nation (str): Nation that can log in (canonical)
+        password (str): Its password
+        api_latency (float): Seconds to wait before each API response
+        site_latency (float): Seconds to wait before each site response
+        api_error_rate (float): Share of API requests answered with a 500 error
+        site_error_rate (float): Share of site requests answered with a security check error
+        api_limit (tuple): API rate limit (max requests, window in seconds)
+        site_limit (tuple): Site rate limit (max requests, window in seconds)
+        seed (int): Random seed of error injection
+        local_id (str): Local id of the site session, random if not given
+    """
+
+    def __init__(self, dump_path, my_nation, password, api_latency=0, site_latency=0,
+                 api_error_rate=0, site_error_rate=0, api_limit=(50, 30), site_limit=(30, 30),
+                 seed=0, local_id=None):
+        self.dump_path = dump_path
+        self.my_nation = my_nation
+        self.password = password
+        self.api_latency = api_latency
+        self.site_latency = site_latency
+        self.api_error_rate = api_error_rate
+        self.site_error_rate = site_error_rate
+        self.api_limit = RateLimit(*api_limit)
+        self.site_limit = RateLimit(*site_limit)
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+        wa_members, self.regions, self.nation_regions, self.endorsements = read_dump(dump_path)
+        self.wa_members = set(wa_members)
+        self.pin = None
+        self.local_id = local_id or secrets.token_hex(8)
+        # Nations endorsed during the session
+        self.endorsed = []
+        # (timestamp, text, region) of membership changes during the session
+        self.happenings = []
+        # Endorsements of nations which had left the WA
+        self.stale_endorsements_num = 0
+        self.requests_num = collections.Counter()
+
+        self.httpd = None
+        self.thread = None
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}/'.format(self.httpd.server_port)
+
+    def start(self, port=0):
+        self.httpd = http.server.ThreadingHTTPServer(('127.0.0.1', port), FakeNSHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.fake = self
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def resign(self, nation):
+        """Make a nation leave the WA, which shows in the happenings of its region.
+
+        Args:
+            nation (str): Canonical nation name
+        """
+
+        with self.lock:
+            self.wa_members.remove(nation)
+            self.happenings.append((int(time.time()),
+                                    '@@{}@@ resigned from the World Assembly.'.format(nation),
+                                    self.nation_regions[nation]))
+
+    def get_happenings_xml(self, params):
+        since_time = int(params.get('sincetime', 0))
+        region = params.get('view', '')[len('region.'):] or None
+        with self.lock:
+            events = [(timestamp, text) for timestamp, text, event_region in self.happenings
+                      if timestamp >= since_time and region in (None, event_region)]
+
+        return '<WORLD><HAPPENINGS>{}</HAPPENINGS></WORLD>'.format(''.join(
+            '<EVENT id="{}"><TIMESTAMP>{}</TIMESTAMP><TEXT>{}</TEXT></EVENT>'.format(
+                i, timestamp, text) for i, (timestamp, text) in enumerate(events)))
+
+    def is_error(self, rate):
+        with self.lock:
+            return self.random.random() < rate
+
+    def handle_api(self, handler, params):
+        self.requests_num['api'] += 1
+        time.sleep(self.api_latency)
+
+        headers = self.api_limit.check()
+        if headers is None:
+            handler.send_body(429, '<h1>Too Many Requests</h1>',
+                              {'X-Retry-After': str(self.api_limit.window),
+                               'Retry-After': str(self.api_limit.window),
+                               'X-ratelimit-requests-seen': str(self.api_limit.limit)})
+            return
+
+        if self.is_error(self.api_error_rate):
+            handler.send_body(500, '<h1>Internal Server Error</h1>', headers)
+            return
+
+        # parse_qsl decodes the '+' between shards to spaces
+        shards = params.get('q', '').split()
+        if 'nation' in params:
+            nation = params['nation']
+            if 'ping' in shards:
+                if nation != self.my_nation or handler.headers.get('Password') != self.password:
+                    handler.send_body(403, '<h1>Forbidden</h1>', headers)
+                    return
+                self.pin = secrets.token_hex(5)
+                headers.update({'X-Pin': self.pin, 'X-Autologin': secrets.token_hex(8)})
+                xml = '<NATION id="{}"><PING>1</PING></NATION>'.format(nation)
+            elif nation in self.nation_regions and 'endorsements' in shards:
+                endorsers = self.endorsements.get(nation, '')
+                if nation in self.endorsed:
+                    endorsers = ','.join(filter(None, [endorsers, self.my_nation]))
+                xml = '<NATION id="{}"><ENDORSEMENTS>{}</ENDORSEMENTS></NATION>'.format(
+                    nation, endorsers)
+            elif nation in self.nation_regions and 'wa' in shards:
+                status = 'WA Member' if nation in self.wa_members else 'Non-member'
+                xml = '<NATION id="{}"><UNSTATUS>{}</UNSTATUS></NATION>'.format(nation, status)
+            elif nation in self.nation_regions:
+                xml = '<NATION id="{}"><REGION>{}</REGION></NATION>'.format(
+                    nation, self.nation_regions[nation])
+            else:
+                handler.send_body(404, '<h1>Unknown nation</h1>', headers)
+                return
+        elif 'region' in params:
+            region = params['region']
+            if region not in self.regions:
+                handler.send_body(404, '<h1>Unknown region</h1>', headers)
+                return
+            nations = api_adapter.REGION_LIST_DELIMITER.join(self.regions[region])
+            xml = '<REGION id="{}"><NATIONS>{}</NATIONS></REGION>'.format(region, nations)
+        elif 'wa' in params:
+            members = api_adapter.NS_LIST_DELIMITER.join(self.wa_members)
+            xml = '<WA council="{}"><MEMBERS>{}</MEMBERS></WA>'.format(params['wa'], members)
+        else:
+            xml = self.get_happenings_xml(params)
+
+        handler.send_body(200, xml, headers, 'text/xml; charset=utf-8')
+
+    def get_error_page(self, message):
+        return PAGE_TEMPLATE.format(title='Error', content='<p class="error">{}</p>'.format(message))
+
+    def handle_settings(self, handler):
+        self.requests_num['site'] += 1
+        time.sleep(self.site_latency)
+
+        headers = self.site_limit.check()
+        if headers is None:
+            handler.send_body(429, '<h1>Too Many Requests</h1>',
+                              {'Retry-After': str(self.site_limit.window)})
+            return
+
+        cookies = handler.headers.get('Cookie', '')
+        if self.pin is None or 'pin={}'.format(self.pin) not in cookies:
+            content = '<h1>Log In</h1><form method="post" action="/page=login"></form>'
+        else:
+            content = ('<h1>Settings</h1><form method="post" action="/page=settings">'
+                       '<input type="hidden" name="localid" value="{}"></form>'.format(self.local_id))
+        handler.send_body(200, PAGE_TEMPLATE.format(title='Settings', content=content), headers)
+
+    def handle_endorse(self, handler, params):
+        self.requests_num['site'] += 1
+        time.sleep(self.site_latency)
+
+        headers = self.site_limit.check()
+        if headers is None:
+            handler.send_body(429, '<h1>Too Many Requests</h1>',
+                              {'Retry-After': str(self.site_limit.window)})
+            return
+
+        nation = params.get('nation')
+        if params.get('localid') != self.local_id or self.is_error(self.site_error_rate):
+            handler.send_body(200, self.get_error_page(SECURITY_ERROR), headers)
+            return
+
+        with self.lock:
+            is_member = nation in self.wa_members
+            if not is_member:
+                self.stale_endorsements_num += 1
+        if not is_member:
+            handler.send_body(200, self.get_error_page(NOT_WA_ERROR), headers)
+            return
+
+        with self.lock:
+            is_endorsed = nation in self.endorsed
+            if not is_endorsed:
+                self.endorsed.append(nation)
+
+        if is_endorsed:
+            # Endorsing twice only shows the form to withdraw it
+            form = ENDORSE_FORM_TEMPLATE.format(nation=nation, local_id=self.local_id,
+                                                action='unendorse', label='Withdraw Endorsement')
+        else:
+            form = '<p class="info">You have endorsed {}.</p>'.format(nation)
+        handler.send_body(200, PAGE_TEMPLATE.format(title=nation, content=form), headers)
+
+    @contextlib.contextmanager
+    def redirect(self):
+        """Send every request to NationStates to this server instead.
+        The nationstates library has the API URL built in, so URLs
+        are rewritten where all requests go through.
+
+        Yields:
+            list: Seconds each redirected request spent in HTTPAdapter.send
+        """
+
+        target = urllib.parse.urlsplit(self.url)
+        original_send = requests.adapters.HTTPAdapter.send
+        send_times = []
+
+        def send(adapter, request, **kwargs):
+            url = urllib.parse.urlsplit(request.url)
+            if url.hostname == NS_HOST:
+                request.url = urllib.parse.urlunsplit((target.scheme, target.netloc, url.path,
+                                                       url.query, url.fragment))
+            start = time.perf_counter()
+            try:
+                resp = original_send(adapter, request, **kwargs)
+                if not kwargs.get('stream'):
+                    # Count reading the body as network time too
+                    resp.content
+                return resp
+            finally:
+                send_times.append(time.perf_counter() - start)
+
+        with mock.patch.object(requests.adapters.HTTPAdapter, 'send', send):
+            yield send_times
+
+
+if __name__ == '__main__':
+    server = FakeNationStates(sys.argv[1], 'my_nation', 'password')
+    server.start(int(sys.argv[2]) if len(sys.argv) > 2 else 0)
+    print('Serving on {} (my_nation / password), Ctrl-C to stop'.format(server.url))
+    try:
+        server.thread.join()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,340 @@
+"""Benchmark suite over a synthetic dump. Records the time, throughput
+and peak memory of each case in a JSON file so runs of different
+versions can be compared.
+
+Usage:
+    python -m benchmarks.suite [--nations 250000] [--label NAME] [--only CASE ...]
+    python -m benchmarks.suite --compare BASE.json NEW.json
+"""
+
+import argparse
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from unittest import mock
+
+from benchmarks import synthetic_dump
+from ns_endotarter import data
+from ns_endotarter import dump_scanner
+from ns_endotarter import exceptions
+from ns_endotarter import executor
+from ns_endotarter import instrumentation
+
+
+BENCHMARKS_DIR = os.path.dirname(__file__)
+RESULTS_DIR = os.path.join(BENCHMARKS_DIR, 'results')
+DUMPS_DIR = os.path.join(BENCHMARKS_DIR, '.dumps')
+FIXTURES_DIR = os.path.join(BENCHMARKS_DIR, 'fixtures')
+PAGES = ['endorse_page.html', 'endorsed_page.html', 'error_page.html', 'settings_page.html']
+
+MY_NATION = 'My Nation'
+MY_REGION = 'My Region'
+
+# Slowdown in percent reported as a regression by --compare
+REGRESSION_THRESHOLD = 10
+
+
+def get_dump(params):
+    """Get a synthetic dump, generated once per set of parameters.
+
+    Args:
+        params (dict): Keyword arguments for synthetic_dump.write_dump
+
+    Returns:
+        str: Dump file path
+    """
+
+    key = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:12]
+    dump_path = os.path.join(DUMPS_DIR, 'nations_{}.xml.gz'.format(key))
+    if not os.path.exists(dump_path):
+        os.makedirs(DUMPS_DIR, exist_ok=True)
+        print('Generating dump of {} nations...'.format(params['nations_num']))
+        synthetic_dump.write_dump(dump_path + '.tmp', my_nation=MY_NATION,
+                                  target_region=MY_REGION, **params)
+        os.replace(dump_path + '.tmp', dump_path)
+
+    return dump_path
+
+
+def measure(func, repeats):
+    """Time a function and measure its peak memory.
+    Peak memory is measured in a separate run since tracing slows it down.
+
+    Args:
+        func (callable): Function to measure, gets called repeats + 1 times
+        repeats (int): Number of timed runs
+
+    Returns:
+        dict: Best time in seconds and peak bytes allocated
+    """
+
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {'seconds': min(times), 'peak_bytes': peak}
+
+
+def get_members(dump_path):
+    """Read WA members and members of my region from a dump.
+
+    Returns:
+        tuple: Set of WA members and set of my region's members
+    """
+
+    wa_members = set()
+    region_members = set()
+    my_region = dump_scanner.canonical_bytes(MY_REGION.encode())
+    with gzip.open(dump_path) as dump:
+        for block in dump_scanner.iter_nation_blocks(dump):
+            name = block[block.find(b'<NAME>') + 6:block.find(b'</NAME>')]
+            nation = dump_scanner.canonical_bytes(name).decode()
+            if b'<UNSTATUS>WA Member' in block:
+                wa_members.add(nation)
+            if dump_scanner.canonical_bytes(dump_scanner.get_block_region(block)) == my_region:
+                region_members.add(nation)
+
+    return wa_members, region_members
+
+
+def new_data(**kwargs):
+    return data.Data(mock.Mock(), mock.Mock(), '', 'my_region', 'my_nation', **kwargs)
+
+
+def bench_dump_scan(dump_path, repeats, audit_endorsements=False):
+    def scan():
+        with gzip.open(dump_path) as dump:
+            new_data(audit_endorsements=audit_endorsements).get_endorsed_from_dump(dump)
+
+    result = measure(scan, repeats)
+
+    # The scan stops after my region, so count what it actually reads
+    metrics = instrumentation.Metrics()
+    with gzip.open(dump_path) as dump:
+        new_data(metrics=metrics, audit_endorsements=audit_endorsements).get_endorsed_from_dump(dump)
+    result['items'] = metrics.gauges['dump_scan_items']
+    result['bytes'] = metrics.gauges['dump_scan_bytes']
+    return result
+
+
+def bench_cache(dump_path, repeats, tmp_dir):
+    wa_members, region_members = get_members(dump_path)
+    cache_path = os.path.join(tmp_dir, 'cache.json')
+    cache = data.Cache(cache_path, '00:00:00')
+    # Every WA member of the region has a cache entry as large as the region
+    region_wa_members = sorted(wa_members & region_members)
+    for nation in region_wa_members:
+        cache[data.ENDORSED_KEY.format(nation)] = region_wa_members
+
+    save = measure(cache.save, repeats)
+    load = measure(lambda: data.Cache(cache_path, '00:00:00').load(), repeats)
+    entries = len(region_wa_members) ** 2
+    save['items'] = load['items'] = entries
+    save['bytes'] = load['bytes'] = os.path.getsize(cache_path)
+    return {'cache_save': save, 'cache_load': load}
+
+
+def bench_endorseable(dump_path, repeats):
+    wa_members, region_members = get_members(dump_path)
+    obj = new_data()
+    obj.endorsed = set(sorted(region_members)[::2])
+
+    gen = measure(lambda: obj.gen_endorseable(wa_members, region_members), repeats)
+    gen['items'] = len(wa_members) + len(region_members)
+
+    def drain():
+        obj.gen_endorseable(wa_members, region_members)
+        for nation in obj.get_endorseable_iter():
+            pass
+
+    remaining = len(obj.endorseable)
+    drain_result = measure(drain, repeats)
+    drain_result['seconds'] = max(drain_result['seconds'] - gen['seconds'], 0)
+    drain_result['items'] = remaining
+    return {'gen_endorseable': gen, 'get_endorseable_iter': drain_result}
+
+
+def bench_check_errors(repeats):
+    resps = []
+    for name in PAGES:
+        with open(os.path.join(FIXTURES_DIR, name)) as f:
+            resps.append(mock.Mock(status_code=200, text=f.read()))
+
+    def check():
+        for resp in resps:
+            try:
+                executor.check_errors(resp)
+            except exceptions.NSSiteError:
+                pass
+
+    result = measure(check, repeats)
+    result['items'] = len(resps)
+    result['bytes'] = sum(len(resp.text.encode()) for resp in resps)
+    return result
+
+
+def add_throughput(result):
+    if not result['seconds']:
+        return
+    if 'items' in result:
+        result['items_per_second'] = result['items'] / result['seconds']
+    if 'bytes' in result:
+        result['mb_per_second'] = result['bytes'] / result['seconds'] / 1024 / 1024
+
+
+def get_label():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=BENCHMARKS_DIR, stderr=subprocess.DEVNULL,
+                                       text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return datetime.datetime.now().strftime('%Y%m%d%H%M%S')
+
+
+def run(params, repeats, only=None):
+    """Run benchmark cases.
+
+    Args:
+        params (dict): Keyword arguments for synthetic_dump.write_dump
+        repeats (int): Number of timed runs of each case
+        only (list): Names of cases to run, all if not given
+
+    Returns:
+        dict: Case name -> result
+    """
+
+    dump_path = get_dump(params)
+
+    def wanted(*names):
+        return only is None or any(name in only for name in names)
+
+    results = {}
+    if wanted('dump_scan'):
+        results['dump_scan'] = bench_dump_scan(dump_path, repeats)
+    if wanted('dump_scan_audit'):
+        results['dump_scan_audit'] = bench_dump_scan(dump_path, repeats, audit_endorsements=True)
+    if wanted('cache_save', 'cache_load'):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            results.update(bench_cache(dump_path, repeats, tmp_dir))
+    if wanted('gen_endorseable', 'get_endorseable_iter'):
+        results.update(bench_endorseable(dump_path, repeats))
+    if wanted('check_errors'):
+        results['check_errors'] = bench_check_errors(repeats)
+
+    for result in results.values():
+        add_throughput(result)
+
+    return results
+
+
+def save_results(results, params, label, output_dir=RESULTS_DIR):
+    os.makedirs(output_dir, exist_ok=True)
+    file_path = os.path.join(output_dir, '{}.json'.format(label))
+    with open(file_path, 'w') as f:
+        json.dump({'label': label,
+                   'time': datetime.datetime.now().isoformat(timespec='seconds'),
+                   'python': platform.python_version(),
+                   'machine': platform.machine(),
+                   'params': params,
+                   'results': results}, f, indent=2)
+
+    return file_path
+
+
+def compare(base_path, new_path):
+    """Print changes between two result files.
+
+    Returns:
+        bool: True if some case got slower than REGRESSION_THRESHOLD
+    """
+
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    if base['params'] != new['params']:
+        print('Warning: runs used different dump parameters')
+
+    print('{:<22} {:>12} {:>12} {:>8} {:>12} {:>12}'.format(
+        'case', base['label'], new['label'], 'time', 'base peak', 'new peak'))
+    is_regressed = False
+    for name, new_result in new['results'].items():
+        base_result = base['results'].get(name)
+        if base_result is None:
+            continue
+
+        change = (new_result['seconds'] / base_result['seconds'] - 1) * 100
+        mark = ''
+        if change > REGRESSION_THRESHOLD:
+            mark = ' REGRESSION'
+            is_regressed = True
+        print('{:<22} {:>11.4f}s {:>11.4f}s {:>+7.1f}% {:>11.1f}M {:>11.1f}M{}'.format(
+            name, base_result['seconds'], new_result['seconds'], change,
+            base_result['peak_bytes'] / 1024 / 1024, new_result['peak_bytes'] / 1024 / 1024, mark))
+
+    return is_regressed
+
+
+def print_results(results):
+    for name, result in results.items():
+        throughput = ''
+        if 'items_per_second' in result:
+            throughput += ' {:>12.0f} items/s'.format(result['items_per_second'])
+        if 'mb_per_second' in result:
+            throughput += ' {:>8.1f} MB/s'.format(result['mb_per_second'])
+        print('{:<22} {:>9.4f}s peak {:>7.1f}M{}'.format(name, result['seconds'],
+                                                       result['peak_bytes'] / 1024 / 1024,
+                                                       throughput))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the benchmark suite.')
+    parser.add_argument('--nations', type=int, default=100000, help='Nations in the dump')
+    parser.add_argument('--region-size', type=int, default=50, help='Size of other regions')
+    parser.add_argument('--target-position', type=float, default=0.5,
+                        help='Relative position of my region in the dump (0.0 to 1.0)')
+    parser.add_argument('--target-size', type=int, default=2000, help='Nations in my region')
+    parser.add_argument('--endorsements', type=int, default=200,
+                        help='Max endorsement list length')
+    parser.add_argument('--repeats', type=int, default=3, help='Timed runs of each case')
+    parser.add_argument('--only', nargs='+', help='Cases to run')
+    parser.add_argument('--label', help='Result name, defaults to the git commit')
+    parser.add_argument('--output-dir', default=RESULTS_DIR, help='Directory to save results in')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'),
+                        help='Compare two result files instead of running')
+    args = parser.parse_args()
+
+    if args.compare:
+        raise SystemExit(1 if compare(*args.compare) else 0)
+
+    params = {'nations_num': args.nations,
+              'region_size': args.region_size,
+              'target_position': args.target_position,
+              'target_size': args.target_size,
+              'endorsements_num': args.endorsements}
+    results = run(params, args.repeats, args.only)
+    print_results(results)
+
+    file_path = save_results(results, params, args.label or get_label(), args.output_dir)
+    print('Saved results to {}'.format(file_path))
+
+
+if __name__ == '__main__':
+    main()
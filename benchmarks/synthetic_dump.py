@@ -0,0 +1,113 @@
+"""Generate synthetic NationStates nations dumps for benchmarking.
+
+Usage: python -m benchmarks.synthetic_dump OUTPUT [NATIONS]
+"""
+
+import gzip
+import random
+import sys
+
+
+NATION_TEMPLATE = ('<NATION><NAME>{name}</NAME><TYPE>Republic</TYPE>'
+                   '<FULLNAME>The Republic of {name}</FULLNAME>'
+                   '<MOTTO>Strength and Unity</MOTTO>'
+                   '<CATEGORY>Inoffensive Centrist Democracy</CATEGORY>'
+                   '<UNSTATUS>{unstatus}</UNSTATUS>'
+                   '<ENDORSEMENTS>{endorsements}</ENDORSEMENTS>'
+                   '<ISSUES_ANSWERED>{issues}</ISSUES_ANSWERED>'
+                   '<FREEDOM><CIVILRIGHTS>Good</CIVILRIGHTS><ECONOMY>Good</ECONOMY>'
+                   '<POLITICALFREEDOM>Good</POLITICALFREEDOM></FREEDOM>'
+                   '<REGION>{region}</REGION><POPULATION>{population}</POPULATION>'
+                   '<TAX>25.4</TAX><ANIMAL>eagle</ANIMAL><CURRENCY>dollar</CURRENCY>'
+                   '<DEMONYM>Citizen</DEMONYM><DEMONYM2>Citizen</DEMONYM2>'
+                   '<DEMONYM2PLURAL>Citizens</DEMONYM2PLURAL>'
+                   '<FLAG>https://www.nationstates.net/images/flags/Default.png</FLAG>'
+                   '<MAJORINDUSTRY>Information Technology</MAJORINDUSTRY>'
+                   '<GOVTPRIORITY>Education</GOVTPRIORITY>'
+                   '<FOUNDED>{founded} days ago</FOUNDED><FIRSTLOGIN>1500000000</FIRSTLOGIN>'
+                   '<LASTLOGIN>1600000000</LASTLOGIN><LASTACTIVITY>2 days ago</LASTACTIVITY>'
+                   '<INFLUENCE>Minnow</INFLUENCE><LEADER></LEADER><CAPITAL></CAPITAL>'
+                   '<RELIGION></RELIGION><FACTBOOKS>0</FACTBOOKS><DISPATCHES>0</DISPATCHES>'
+                   '<DBID>{dbid}</DBID></NATION>\n')
+
+
+def gen_regions(nations_num, region_size, target_region, target_position, target_size):
+    """Split nations into regions and place the target region.
+
+    Args:
+        nations_num (int): Total number of nations
+        region_size (int): Size of every other region
+        target_region (str): Target region name
+        target_position (float): Relative position of the target region (0.0 to 1.0)
+        target_size (int): Size of the target region
+
+    Returns:
+        list: List of (region name, size) pairs in dump order
+    """
+
+    other_num = max(nations_num - target_size, 0)
+    regions = []
+    i = 0
+    while other_num > 0:
+        size = min(region_size, other_num)
+        regions.append(('Region {}'.format(i), size))
+        other_num -= size
+        i += 1
+
+    index = round(len(regions) * target_position)
+    regions.insert(index, (target_region, target_size))
+    return regions
+
+
+def write_dump(file_path, nations_num=10000, region_size=50, target_region='My Region',
+               target_position=1.0, target_size=500, endorsements_num=20,
+               wa_ratio=0.3, my_nation='My Nation', seed=0):
+    """Write a gzipped synthetic dump.
+
+    Args:
+        file_path (str): Output path
+        nations_num (int): Total number of nations
+        region_size (int): Size of every non-target region
+        target_region (str): Target region name
+        target_position (float): Relative position of the target region (0.0 to 1.0)
+        target_size (int): Number of nations in the target region
+        endorsements_num (int): Maximum endorsement list length
+        wa_ratio (float): Share of nations in the WA
+        my_nation (str): Nation placed in the target region that others endorse
+        seed (int): Random seed
+    """
+
+    rand = random.Random(seed)
+    dbid = 0
+
+    with gzip.open(file_path, 'wt', compresslevel=6) as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<NATIONS api_version="11">\n')
+
+        for region, size in gen_regions(nations_num, region_size, target_region,
+                                        target_position, target_size):
+            names = ['{} Nation {}'.format(region, i) for i in range(size)]
+            if region == target_region:
+                names[0] = my_nation
+
+            canonical_names = [name.lower().replace(' ', '_') for name in names]
+            for name in names:
+                dbid += 1
+                is_wa = rand.random() < wa_ratio
+                endorsements = ''
+                if is_wa:
+                    num = rand.randint(0, min(endorsements_num, size))
+                    endorsements = ','.join(rand.sample(canonical_names, num))
+
+                f.write(NATION_TEMPLATE.format(name=name, region=region,
+                                               unstatus='WA Member' if is_wa else 'Non-member',
+                                               endorsements=endorsements,
+                                               issues=rand.randint(0, 1000),
+                                               population=rand.randint(5, 20000),
+                                               founded=rand.randint(1, 3000),
+                                               dbid=dbid))
+
+        f.write('</NATIONS>\n')
+
+
+if __name__ == '__main__':
+    write_dump(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 10000)
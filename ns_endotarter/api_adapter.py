@@ -1,10 +1,19 @@
+import sys
+
 import nationstates
 
 from ns_endotarter import exceptions
+from ns_endotarter import ratelimit
+from ns_endotarter import utils
 
 
 CHAMBER = 'ga'
 NS_LIST_DELIMITER = ';'
+REGION_LIST_DELIMITER = ':'
+# WA status shard values of WA members
+WA_STATUSES = ('WA Member', 'WA Delegate')
+# Max number of events the API returns in one happenings request
+HAPPENINGS_LIMIT = 100
 
 
 class NS_API():
@@ -13,11 +22,43 @@ class NS_API():
     Args:
         ns_api (nationstates.Nationstates): NationStates API object
         my_nation (str): My nation's name
+        my_region (str): My region's name. Looked up from my nation if not given
+        governor (ratelimit.Governor): Rate limit governor shared with the site
     """
 
-    def __init__(self, ns_api, my_nation):
+    def __init__(self, ns_api, my_nation, my_region=None, governor=None):
         self.api = ns_api
         self.my_nation = my_nation
+        self.my_region = my_region
+        self.governor = governor
+
+    def get_shards(self, api_object, *shards):
+        """Request shards through the rate limit governor.
+
+        Args:
+            api_object: API object of the nationstates library (e.g. Nation)
+            shards: Shards to request
+
+        Returns:
+            dict: Full response with parsed data and headers
+        """
+
+        if self.governor is None:
+            return api_object.get_shards(*shards, full_response=True)
+
+        self.governor.acquire(ratelimit.API)
+        try:
+            resp = api_object.get_shards(*shards, full_response=True)
+        except nationstates.exceptions.APIRateLimitBan as err:
+            self.governor.update(ratelimit.API)
+            self.governor.block(ratelimit.API, ratelimit.parse_retry_after(str(err)))
+            raise
+        except Exception:
+            self.governor.update(ratelimit.API)
+            raise
+
+        self.governor.update(ratelimit.API, resp['headers'], resp.get('status'))
+        return resp
 
     def login(self, password):
         """Send ping to the nation and return X-Pin.
@@ -32,7 +73,7 @@ class NS_API():
         my_nation = self.api.nation(self.my_nation, password)
 
         try:
-            resp = my_nation.get_shards('ping', full_response=True)
+            resp = self.get_shards(my_nation, 'ping')
         except nationstates.exceptions.Forbidden:
             raise exceptions.AuthError('Could not log into your nation!')
 
@@ -45,7 +86,7 @@ class NS_API():
             Set: Set of WA members
         """
         wa = self.api.wa(CHAMBER)
-        members = wa.members
+        members = self.get_shards(wa, 'members')['data']['wa']['members']
 
         result = set(members.split(NS_LIST_DELIMITER))
         return result
@@ -57,8 +98,79 @@ class NS_API():
             Set: Set of all regional nations
         """
 
-        my_nation = self.api.nation(self.my_nation)
-        nations = my_nation.region.nations
+        my_region = self.my_region
+        if my_region is None:
+            my_nation = self.api.nation(self.my_nation)
+            my_region = self.get_shards(my_nation, 'region')['data']['nation']['region']
+
+        # Read the raw shard rather than region.nations,
+        # which builds a nation object for every member
+        region = self.api.region(my_region)
+        nations = self.get_shards(region, 'nations')['data']['region']['nations']
+
+        result = {sys.intern(utils.canonical(nation))
+                  for nation in nations.split(REGION_LIST_DELIMITER) if nation}
+        return result
+
+    def get_endorsements(self, nation):
+        """Get nations which have endorsed a nation.
+
+        Args:
+            nation (str): Nation's name
+
+        Returns:
+            set: Endorsing nations
+        """
+
+        resp = self.get_shards(self.api.nation(nation), 'endorsements')
+        endorsements = resp['data']['nation']['endorsements']
+        if not endorsements:
+            return set()
+
+        return set(utils.canonical(endorsements).split(','))
+
+    def is_wa_member(self, nation):
+        """Check if a nation is a WA member.
+
+        Args:
+            nation (str): Nation's name
+
+        Returns:
+            bool: True if the nation is a WA member or delegate
+        """
+
+        resp = self.get_shards(self.api.nation(nation), 'wa')
+        return resp['data']['nation']['unstatus'] in WA_STATUSES
+
+    def get_happenings(self, filters, since_time, region=None, limit=HAPPENINGS_LIMIT):
+        """Get world happenings since a time.
+
+        Args:
+            filters (list): Happenings filters (e.g. member, move)
+            since_time (int): UNIX timestamp of the earliest event
+            region (str): Only get happenings of this region
+            limit (int): Max number of events
+
+        Returns:
+            list: (timestamp, text) pairs of events, oldest first
+        """
+
+        params = {'filter': '+'.join(filters), 'sincetime': since_time, 'limit': limit}
+        if region is not None:
+            params['view'] = 'region.{}'.format(region)
+
+        world = self.api.world()
+        resp = self.get_shards(world, nationstates.Shard('happenings', **params))
+
+        happenings = resp['data']['world']['happenings']
+        if happenings is None:
+            return []
+
+        events = happenings['event']
+        # A single event is not parsed as a list
+        if isinstance(events, dict):
+            events = [events]
 
-        result = {nation.nation_name for nation in nations}
+        result = [(int(event['timestamp']), event['text']) for event in events]
+        result.sort(key=lambda event: event[0])
         return result
@@ -0,0 +1,117 @@
+class EndorsementIndex():
+    """Endorsements among nations of a region as of the data dump.
+    Each nation name is stored once and endorsers refer to nations
+    by position, which keeps the index small in the cache.
+
+    Args:
+        nations (list): Canonical nation names
+        endorsers (list): Positions of the endorsers of each nation
+    """
+
+    def __init__(self, nations=None, endorsers=None):
+        self.nations = nations or []
+        self.endorsers = endorsers or []
+
+        self._positions = {nation: i for i, nation in enumerate(self.nations)}
+
+    def __len__(self):
+        return len(self.nations)
+
+    def get_position(self, nation):
+        position = self._positions.get(nation)
+        if position is None:
+            position = len(self.nations)
+            self._positions[nation] = position
+            self.nations.append(nation)
+            self.endorsers.append([])
+
+        return position
+
+    def add(self, nation, endorsers):
+        """Add a nation and its endorsers.
+
+        Args:
+            nation (str): Canonical nation name
+            endorsers (iterable): Canonical names of nations endorsing it
+        """
+
+        position = self.get_position(nation)
+        self.endorsers[position] = [self.get_position(endorser) for endorser in endorsers
+                                    if endorser and endorser != nation]
+
+    def get_endorsers(self, nation):
+        """Get nations endorsing a nation.
+
+        Args:
+            nation (str): Canonical nation name
+
+        Returns:
+            set: Endorsing nations
+        """
+
+        position = self._positions.get(nation)
+        if position is None:
+            return set()
+
+        return {self.nations[endorser] for endorser in self.endorsers[position]}
+
+    def get_endorsed(self, nation):
+        """Get nations a nation has endorsed.
+
+        Args:
+            nation (str): Canonical nation name
+
+        Returns:
+            set: Endorsed nations
+        """
+
+        position = self._positions.get(nation)
+        if position is None:
+            return set()
+
+        return {self.nations[i] for i, endorsers in enumerate(self.endorsers)
+                if position in endorsers}
+
+    def get_counts(self):
+        """Get the number of endorsements of each nation.
+
+        Returns:
+            dict: Nation -> number of endorsements
+        """
+
+        return {nation: len(endorsers) for nation, endorsers in zip(self.nations, self.endorsers)}
+
+    def get_reciprocation_gaps(self, nation, endorsed):
+        """Get nations which endorse a nation that it does not endorse back.
+
+        Args:
+            nation (str): Canonical nation name
+            endorsed (set): Nations it has endorsed, including ones
+            endorsed after the dump
+
+        Returns:
+            set: Nations to endorse back
+        """
+
+        return self.get_endorsers(nation) - endorsed - {nation}
+
+    def order(self, nations, my_nation, endorsed):
+        """Order nations to endorse: nations endorsing my nation come
+        first, then the rest, each by number of endorsements, most first.
+
+        Args:
+            nations (iterable): Nations to endorse
+            my_nation (str): Canonical name of my nation
+            endorsed (set): Nations my nation has endorsed
+
+        Returns:
+            list: Ordered nations
+        """
+
+        gaps = self.get_reciprocation_gaps(my_nation, endorsed)
+        counts = self.get_counts()
+        return sorted(nations, key=lambda nation: (nation not in gaps,
+                                                   -counts.get(nation, 0), nation))
+
+    def to_dict(self):
+        return {'nations': self.nations, 'endorsers': self.endorsers}
@@ -0,0 +1,122 @@
+"""Thin client of the Endotarter daemon. Only uses the standard
+library so it starts at once.
+
+Usage: python -m ns_endotarter.client {endorse,status,remaining,stop}
+"""
+
+import json
+import socket
+import sys
+
+from ns_endotarter import exceptions
+from ns_endotarter import info
+
+
+ENDORSE = 'endorse'
+STATUS = 'status'
+REMAINING = 'remaining'
+STOP = 'stop'
+COMMANDS = [ENDORSE, STATUS, REMAINING, STOP]
+
+# Seconds to wait for a response, an endorse may wait for the rate limit
+TIMEOUT = 60
+# Max bytes of a request or response line
+MAX_LINE_SIZE = 64 * 1024
+
+
+def encode(message):
+    return json.dumps(message).encode() + b'\n'
+
+
+def decode(line):
+    return json.loads(line.decode())
+
+
+class DaemonClient():
+    """Send commands to the Endotarter daemon over its Unix socket.
+
+    Args:
+        socket_path (str): Daemon socket path
+        timeout (float): Seconds to wait for a response
+    """
+
+    def __init__(self, socket_path=info.DAEMON_SOCKET_PATH, timeout=TIMEOUT):
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def send(self, command):
+        """Send a command and wait for its response.
+
+        Args:
+            command (str): Command name
+
+        Raises:
+            exceptions.DaemonError: The daemon is not running or the command failed
+
+        Returns:
+            dict: Response
+        """
+
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(self.timeout)
+                sock.connect(self.socket_path)
+                sock.sendall(encode({'command': command}))
+                with sock.makefile('rb') as f:
+                    line = f.readline(MAX_LINE_SIZE)
+        except OSError as err:
+            raise exceptions.DaemonError('Could not reach the daemon: {}'.format(err))
+
+        if not line:
+            raise exceptions.DaemonError('The daemon closed the connection')
+
+        resp = decode(line)
+        if not resp['ok']:
+            raise exceptions.DaemonError(resp['error'])
+
+        return resp
+
+    def endorse(self):
+        return self.send(ENDORSE)
+
+    def get_status(self):
+        return self.send(STATUS)
+
+    def get_remaining(self):
+        return self.send(REMAINING)['remaining']
+
+    def stop(self):
+        return self.send(STOP)
+
+
+def main(args):
+    if len(args) != 1 or args[0] not in COMMANDS:
+        print('Usage: python -m ns_endotarter.client {{{}}}'.format(','.join(COMMANDS)))
+        return 2
+
+    client = DaemonClient()
+    try:
+        resp = client.send(args[0])
+    except exceptions.DaemonError as err:
+        print(err)
+        return 1
+
+    if args[0] == ENDORSE:
+        if resp['nation'] is None:
+            print('YOu have endorsed all nations!')
+        else:
+            print('Endorsed {}, {} nations to endorse'.format(resp['nation'], resp['remaining']))
+    elif args[0] == REMAINING:
+        print('{} nations to endorse'.format(resp['remaining']))
+    elif args[0] == STATUS:
+        for key, value in resp.items():
+            if key != 'ok':
+                print('{}: {}'.format(key, value))
+    else:
+        print('Stopped the daemon')
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,148 @@
+import threading
+import time
+
+import requests.adapters
+
+from ns_endotarter import ratelimit
+
+
+# One host is contacted, the keep-alive thread may use a second connection
+POOL_CONNECTIONS = 1
+POOL_MAXSIZE = 2
+
+# Seconds idle before the connection is kept alive with a request
+KEEPALIVE_INTERVAL = 15
+# Site requests of a rate limit window left for endorsing
+KEEPALIVE_RESERVE = 10
+# Small static page which does not touch the session
+KEEPALIVE_PAGE = 'robots.txt'
+
+
+class ConnectionManager():
+    """Keep a warm connection pool to NationStates website so
+    requests do not pay a new TCP and TLS handshake.
+
+    Args:
+        session (requests.Session): Session to manage
+        base_url (str): NationStates site URL
+        governor (ratelimit.Governor): Rate limit governor for keep-alive requests
+        pool_connections (int): Number of hosts to keep pools for
+        pool_maxsize (int): Max connections kept per host
+        keepalive_interval (float): Seconds idle before a keep-alive request,
+        0 disables keep-alive requests
+        clock (callable): Monotonic clock
+    """
+
+    def __init__(self, session, base_url, governor=None, pool_connections=POOL_CONNECTIONS,
+                 pool_maxsize=POOL_MAXSIZE, keepalive_interval=KEEPALIVE_INTERVAL,
+                 clock=time.monotonic):
+        self.session = session
+        self.base_url = base_url
+        self.governor = governor
+        self.keepalive_interval = keepalive_interval
+        self.clock = clock
+
+        self.adapter = requests.adapters.HTTPAdapter(pool_connections=pool_connections,
+                                                     pool_maxsize=pool_maxsize)
+        session.mount(base_url, self.adapter)
+
+        self.last_used = clock()
+        self.keepalives_num = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def get_pool(self):
+        """Get the connection pool of the site.
+
+        Returns:
+            urllib3.HTTPConnectionPool: Connection pool
+        """
+
+        return self.adapter.poolmanager.connection_from_url(self.base_url)
+
+    def touch(self):
+        """Mark the connection as just used.
+        """
+
+        self.last_used = self.clock()
+
+    def ping(self):
+        """Send a lightweight request if the rate limit allows it now.
+
+        Returns:
+            bool: True if the request was sent
+        """
+
+        if self.governor is not None:
+            if not self.governor.try_acquire(ratelimit.SITE, KEEPALIVE_RESERVE):
+                return False
+
+        resp = None
+        try:
+            resp = self.session.head(self.base_url + KEEPALIVE_PAGE)
+        except Exception:
+            # Keep-alive is best-effort, the next request connects again
+            pass
+        finally:
+            if self.governor is not None:
+                if resp is None:
+                    self.governor.update(ratelimit.SITE)
+                else:
+                    self.governor.update(ratelimit.SITE, resp.headers, resp.status_code)
+
+        self.touch()
+        self.keepalives_num += 1
+        return resp is not None
+
+    def warm_up(self):
+        """Open a connection before the first real request.
+        """
+
+        if self.get_pool().num_connections == 0:
+            self.ping()
+
+    def keep_alive(self):
+        """Send keep-alive requests while the connection is idle.
+        Runs until stop_keepalive is called.
+        """
+
+        while not self._stop.is_set():
+            idle_time = self.clock() - self.last_used
+            if idle_time >= self.keepalive_interval:
+                self.ping()
+                idle_time = 0
+            self._stop.wait(self.keepalive_interval - idle_time)
+
+    def start_keepalive(self):
+        """Start sending keep-alive requests in a background thread.
+        """
+
+        if not self.keepalive_interval or self._thread is not None:
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.keep_alive, daemon=True)
+        self._thread.start()
+
+    def stop_keepalive(self):
+        """Stop the keep-alive thread.
+        """
+
+        if self._thread is None:
+            return
+
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def get_metrics(self):
+        """Get connection reuse statistics.
+
+        Returns:
+            dict: Number of handshakes, reused connections and keep-alive requests
+        """
+
+        pool = self.get_pool()
+        return {'handshakes': pool.num_connections,
+                'reuses': pool.num_requests - pool.num_connections,
+                'keepalives': self.keepalives_num}
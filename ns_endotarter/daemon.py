@@ -0,0 +1,259 @@
+"""Keep a prepared Endotarter in memory and serve the thin client
+(ns_endotarter.client) over a Unix socket, so a session does not
+start by importing, loading data and logging in.
+
+Usage: python -m ns_endotarter.daemon
+"""
+
+import os
+import signal
+import socket
+import socketserver
+import threading
+import time
+
+import requests
+
+from ns_endotarter import client
+from ns_endotarter import data
+from ns_endotarter import endotarter
+from ns_endotarter import exceptions
+from ns_endotarter import info
+from ns_endotarter import utils
+
+
+# Seconds between refreshes of member lists and endorsed nations
+REFRESH_INTERVAL = data.ROSTER_TTL
+# Only the owner may connect to the socket
+SOCKET_MODE = 0o600
+
+
+class DaemonHandler(socketserver.StreamRequestHandler):
+    """Answer one command per connection.
+    """
+
+    def handle(self):
+        line = self.rfile.readline(client.MAX_LINE_SIZE)
+        if not line:
+            return
+
+        try:
+            command = client.decode(line)['command']
+        except (ValueError, KeyError, TypeError):
+            resp = {'ok': False, 'error': 'Invalid request'}
+        else:
+            resp = self.server.endotarter_daemon.handle_command(command)
+
+        self.wfile.write(client.encode(resp))
+
+
+class EndotarterDaemon():
+    """Serve a prepared Endotarter over a Unix socket and
+    refresh its data in the background.
+
+    Args:
+        endotarter (endotarter.Endotarter): Endotarter to serve
+        socket_path (str): Socket path
+        refresh_interval (float): Seconds between refreshes, 0 disables refreshing
+        clock (callable): Monotonic clock
+    """
+
+    def __init__(self, endotarter, socket_path=info.DAEMON_SOCKET_PATH,
+                 refresh_interval=REFRESH_INTERVAL, clock=time.monotonic):
+        self.endotarter = endotarter
+        self.socket_path = socket_path
+        self.refresh_interval = refresh_interval
+        self.clock = clock
+
+        # Endorsing and refreshing never overlap
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.server = None
+        self._threads = []
+
+        self.started_time = None
+        self.refreshed_time = None
+        self.refresh_error = None
+        self.endorsements_num = 0
+
+    def bind(self):
+        """Create the socket, replacing a socket left by a daemon which has exited.
+
+        Raises:
+            exceptions.DaemonError: Another daemon is serving the socket
+        """
+
+        if os.path.exists(self.socket_path):
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                try:
+                    sock.connect(self.socket_path)
+                except OSError:
+                    os.remove(self.socket_path)
+                else:
+                    raise exceptions.DaemonError('A daemon is already running at {}'.format(
+                        self.socket_path))
+
+        # The socket must never be accessible to others, even briefly
+        old_umask = os.umask(0o777 & ~SOCKET_MODE)
+        try:
+            self.server = socketserver.ThreadingUnixStreamServer(self.socket_path, DaemonHandler)
+        finally:
+            os.umask(old_umask)
+        self.server.daemon_threads = True
+        self.server.endotarter_daemon = self
+
+    def start(self):
+        """Prepare the Endotarter, then serve commands and refresh in the background.
+        """
+
+        self.endotarter.prepare()
+        self.started_time = self.clock()
+        self.refreshed_time = self.started_time
+        self.bind()
+
+        self._threads = [threading.Thread(target=self.server.serve_forever, daemon=True)]
+        if self.refresh_interval:
+            self._threads.append(threading.Thread(target=self.refresh_loop, daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def wait(self):
+        """Block until the daemon is asked to stop, then stop it.
+        """
+
+        try:
+            self.stopped.wait()
+        except KeyboardInterrupt:
+            pass
+        self.stop()
+
+    def stop(self):
+        """Stop serving, save data and close the socket.
+        """
+
+        self.stopped.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+        with self.lock:
+            self.endotarter.shutdown()
+
+    def refresh(self):
+        """Bring member lists and endorsed nations up to date.
+        Requests are sent without holding up endorsing.
+        """
+
+        endotarter = self.endotarter
+        ns_data = endotarter.ns_data
+
+        changes = None
+        if endotarter.member_sync is None:
+            wa_members = ns_data.get_wa_members()
+            region_members = ns_data.get_region_members()
+        else:
+            # The pruner may sync at the same time
+            with endotarter.member_sync.lock:
+                changes = endotarter.member_sync.sync()
+                wa_members, region_members = endotarter.member_sync.get_members()
+
+        if ns_data.is_endorsed_cached():
+            with self.lock:
+                ns_data.save_cache()
+                if changes is None:
+                    ns_data.gen_endorseable(wa_members, region_members)
+                else:
+                    ns_data.gen_endorseable(changes=changes)
+        else:
+            # A new data dump is read, endorsing goes on with the old data meanwhile
+            rebuilt = ns_data.rebuild(wa_members, region_members)
+            with self.lock:
+                if endotarter.member_sync is not None:
+                    # The pruner may have synced members meanwhile
+                    region_wa_members = endotarter.member_sync.region_wa_members
+                    for nation in list(rebuilt.endorseable):
+                        if nation not in region_wa_members:
+                            rebuilt.endorseable.discard(nation)
+                ns_data.replace(rebuilt)
+
+        self.refreshed_time = self.clock()
+
+    def refresh_loop(self):
+        while not self.stopped.wait(self.refresh_interval):
+            try:
+                self.refresh()
+                self.refresh_error = None
+            except Exception as err:
+                # Keep serving the data there is
+                self.refresh_error = '{}: {}'.format(type(err).__name__, err)
+                print('Refreshing failed: {}'.format(self.refresh_error))
+
+    def endorse(self):
+        with self.lock:
+            nation = self.endotarter.endorse_next()
+            if nation is not None:
+                self.endorsements_num += 1
+            remaining = len(self.endotarter.ns_data.endorseable)
+
+        return {'nation': nation, 'remaining': remaining}
+
+    def get_status(self):
+        ns_data = self.endotarter.ns_data
+        now = self.clock()
+        return {'nation': ns_data.my_nation,
+                'region': ns_data.my_region,
+                'logged_in': self.endotarter.executor.ns_site.local_id is not None,
+                'remaining': len(ns_data.endorseable),
+                'endorsed': len(ns_data.endorsed),
+                'endorsements': self.endorsements_num,
+                'uptime': round(now - self.started_time, 1),
+                'last_refresh': round(now - self.refreshed_time, 1),
+                'refresh_error': self.refresh_error}
+
+    def handle_command(self, command):
+        """Run a client command.
+
+        Args:
+            command (str): Command name
+
+        Returns:
+            dict: Response
+        """
+
+        try:
+            if command == client.ENDORSE:
+                resp = self.endorse()
+            elif command == client.STATUS:
+                resp = self.get_status()
+            elif command == client.REMAINING:
+                resp = {'remaining': len(self.endotarter.ns_data.endorseable)}
+            elif command == client.STOP:
+                self.stopped.set()
+                resp = {}
+            else:
+                return {'ok': False, 'error': 'Unknown command {}'.format(command)}
+        except (exceptions.EndotarterError, requests.RequestException) as err:
+            return {'ok': False, 'error': '{}: {}'.format(type(err).__name__, err)}
+
+        resp['ok'] = True
+        return resp
+
+
+if __name__ == '__main__':
+    print('Endotarter v0.1.1 daemon')
+
+    config = utils.load_config(info.CONFIG_PATH)
+    daemon = EndotarterDaemon(endotarter.Endotarter(config),
+                              config['General'].get('daemon_socket_path', info.DAEMON_SOCKET_PATH),
+                              config['General'].get('daemon_refresh_interval', REFRESH_INTERVAL))
+    signal.signal(signal.SIGTERM, lambda signum, frame: daemon.stopped.set())
+    daemon.start()
+    print('Serving on {}'.format(daemon.socket_path))
+    daemon.wait()
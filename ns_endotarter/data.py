@@ -1,13 +1,186 @@
 import collections
+import concurrent.futures
+import copy
+import io
+import mmap
 import os
+import threading
 import time
 import json
 import xml.etree.ElementTree as ET
 import datetime
 
+from ns_endotarter import audit
+from ns_endotarter import dump_scanner
+from ns_endotarter import endorse_queue
+from ns_endotarter import instrumentation
+from ns_endotarter import planner
 from ns_endotarter import utils
 
 
+# Cache key of a nation's endorsed nations
+ENDORSED_KEY = 'endorsed:{}'
+# Cache key of the endorsement index of a region
+AUDIT_KEY = 'audit:{}'
+# Cache keys of WA members and members of a region
+WA_MEMBERS_KEY = 'wa_members'
+REGION_MEMBERS_KEY = 'region_members:{}'
+
+# Freshness policy of entries which expire at the next daily dump update
+DUMP_POLICY = 'dump'
+# Freshness policy of entries which never expire
+NO_EXPIRY = None
+# Seconds WA and region member lists are reused for
+ROSTER_TTL = 5 * 60
+# Freshness policies by key prefix (the part before ':'),
+# entries of other keys expire with the dump
+DEFAULT_POLICIES = {'wa_members': ROSTER_TTL, 'region_members': ROSTER_TTL}
+# Max entries kept in memory, least recently used ones are evicted first
+MAX_ENTRIES = 10000
+# Cache file key of entry store times
+STORED_TIMES_KEY = '_stored_times'
+
+_shared_caches = {}
+_shared_caches_lock = threading.Lock()
+
+
+def get_endorsed_from_blocks(blocks, nations_by_region, indexes=None):
+    """Find the nations endorsed by my nations in their regions' nation blocks.
+
+    Args:
+        blocks (iterable): Canonical region name (bytes) and nation block pairs
+        nations_by_region (dict): Canonical region name (bytes) -> set of my nations
+        indexes (dict): Canonical region name (bytes) -> audit.EndorsementIndex
+        to add every nation of the region and its endorsers to
+
+    Returns:
+        dict: My nation -> set of nations it has endorsed
+    """
+
+    result = {nation: set() for nations in nations_by_region.values() for nation in nations}
+
+    for region, block in blocks:
+        elem = ET.fromstring(block)
+        endorsee = elem.find('ENDORSEMENTS').text
+        index = indexes.get(region) if indexes is not None else None
+        if endorsee is None and index is None:
+            continue
+
+        endorsers = utils.canonical(endorsee).split(',') if endorsee else []
+        nation = utils.canonical(elem.find('NAME').text)
+        if index is not None:
+            index.add(nation, endorsers)
+
+        endorsers = set(endorsers)
+        for my_nation in nations_by_region[region] & endorsers:
+            if nation != my_nation:
+                result[my_nation].add(nation)
+
+    return result
+
+
+def group_by_region(pairs):
+    """Group my nations by their region.
+
+    Args:
+        pairs (iterable): Canonical (nation, region) pairs
+
+    Returns:
+        dict: Canonical region name (bytes) -> set of my nations
+    """
+
+    nations_by_region = collections.defaultdict(set)
+    for nation, region in pairs:
+        nations_by_region[region.encode()].add(nation)
+
+    return dict(nations_by_region)
+
+
+def extract_endorsed(dump, pairs, indexes=None):
+    """Get endorsed nations of several nations in one pass over the data dump.
+
+    Args:
+        dump (file): Dump file handle
+        pairs (iterable): Canonical (nation, region) pairs
+        indexes (dict): Canonical region name (bytes) -> audit.EndorsementIndex
+        to fill in the same pass
+
+    Returns:
+        dict: My nation -> set of nations it has endorsed
+    """
+
+    nations_by_region = group_by_region(pairs)
+    blocks = dump_scanner.iter_region_blocks(dump, set(nations_by_region))
+    return get_endorsed_from_blocks(blocks, nations_by_region, indexes)
+
+
+def _extract_endorsed_range(xml_path, start, end, nations_by_region):
+    """Process pool worker of extract_endorsed_parallel.
+    """
+
+    with open(xml_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        blocks = dump_scanner.iter_range_region_blocks(buf, set(nations_by_region), start, end)
+        result = get_endorsed_from_blocks(blocks, nations_by_region)
+
+    return {nation: list(endorsed) for nation, endorsed in result.items()}
+
+
+def extract_endorsed_parallel(xml_path, pairs, processes=None):
+    """Get endorsed nations of several nations from a decompressed data dump.
+    The dump is split into byte ranges which are scanned by a process pool.
+
+    Args:
+        xml_path (str): Decompressed data dump file path
+        pairs (iterable): Canonical (nation, region) pairs
+        processes (int): Number of worker processes, defaults to CPU count
+
+    Returns:
+        dict: My nation -> set of nations it has endorsed
+    """
+
+    nations_by_region = group_by_region(pairs)
+    processes = processes or os.cpu_count() or 1
+    size = os.path.getsize(xml_path)
+    bounds = [size * i // processes for i in range(processes + 1)]
+
+    result = {nation: set() for nations in nations_by_region.values() for nation in nations}
+    with concurrent.futures.ProcessPoolExecutor(processes) as pool:
+        futures = [pool.submit(_extract_endorsed_range, xml_path, start, end, nations_by_region)
+                   for start, end in zip(bounds, bounds[1:])]
+        for future in futures:
+            for nation, endorsed in future.result().items():
+                result[nation].update(endorsed)
+
+    return result
+
+
+def build_endorsed_cache(cache, pairs, dump_path, xml_path=None, processes=None,
+                         dump_options=None):
+    """Scan the data dump once for several nations and write
+    each nation's endorsed nations as its own cache entry.
+
+    Args:
+        cache (Cache): File cache object
+        pairs (iterable): Canonical (nation, region) pairs
+        dump_path (str): Data dump file path
+        xml_path (str): Decompressed data dump file path.
+        Scanned by a process pool if given and exists.
+        processes (int): Number of worker processes
+        dump_options (dict): Keyword arguments for utils.load_dump
+    """
+
+    if xml_path is not None and os.path.exists(xml_path):
+        result = extract_endorsed_parallel(xml_path, pairs, processes)
+    else:
+        with utils.load_dump(dump_path, **(dump_options or {})) as dump:
+            result = extract_endorsed(dump, pairs)
+
+    cache.load()
+    for nation, endorsed in result.items():
+        cache[ENDORSED_KEY.format(nation)] = list(endorsed)
+    cache.save()
+
+
 class Data():
     """Represents NationStates game data.
 
@@ -17,12 +190,33 @@ class Data():
         dump_path (str): Data dump file path
         my_region (str): My region name
         my_nation (str): My nation name
+        daily_cache_update (bool): Update the cache from the data dump daily
+        dump_index (DumpIndex): Read my region from a region index
+        of the decompressed data dump instead of scanning it
+        dump_options (dict): Keyword arguments for utils.load_dump
+        journal (Journal): Journal to record endorsements in right away
+        metrics (instrumentation.Metrics): Metrics to record dump scans in
+        endorsement_db (EndorsementDB): Look endorsed nations up in a database
+        built from the data dump instead of scanning it
+        source_planner (planner.SourcePlanner): Choose between the data dump
+        and the API for endorsed nations, the data dump is always used if not given
+        audit_endorsements (bool): Index endorsements of my region while reading
+        the data dump and order nations to endorse by it
     """
 
     def __init__(self, api, cache, dump_path, my_region,
-                 my_nation, daily_cache_update=True):
+                 my_nation, daily_cache_update=True, dump_index=None,
+                 dump_options=None, journal=None, metrics=None, endorsement_db=None,
+                 source_planner=None, audit_endorsements=False):
         self.api = api
         self.cache = cache
+        self.journal = journal
+        self.metrics = metrics or instrumentation.NULL_METRICS
+        self.dump_index = dump_index
+        self.endorsement_db = endorsement_db
+        self.source_planner = source_planner
+        self.audit_endorsements = audit_endorsements
+        self.dump_options = dump_options or {}
 
         self.my_region = my_region
         self.my_nation = my_nation
@@ -31,65 +225,289 @@ class Data():
 
         # Nations you have endorsed
         self.endorsed = set()
+        # Nations endorsed since this object was created
+        self.session_endorsed = set()
         # Nations for you to endorse
-        self.endorseable = []
+        self.endorseable = endorse_queue.EndorseQueue()
+        # Held while taking nations off endorseable and while pruning it in the background
+        self.lock = threading.RLock()
+        # Plan and seconds of the last time endorsed nations were not cached
+        self.endorsed_plan = None
+        self.endorsed_time = None
+        # Endorsements of my region as of the data dump
+        self.audit = None
 
     def get_endorsed_from_dump(self, dump):
         """Parse data dump to get endorsed nations.
+        Only nations of my region are handed to the XML parser.
 
         Args:
             dump (file): Dump file handle
         """
 
-        xml = ET.iterparse(dump)
-        xml_iter = iter(xml)
-        evt, root = xml_iter.__next__()
+        indexes = None
+        if self.audit_endorsements:
+            indexes = {self.my_region.encode(): audit.EndorsementIndex()}
 
-        is_in_region = False
-        for evt, elem in xml_iter:
-            if evt == 'end' and elem.tag == 'NATION':
-                region = utils.canonical(elem.find('REGION').text)
-                if region == self.my_region:
-                    is_in_region = True
-                    endorsee = elem.find('ENDORSEMENTS').text
-                    if endorsee is None:
-                        continue
+        with self.metrics.peak_memory('dump_scan'), \
+                self.metrics.scan('dump_scan', dump, dump_scanner.NATION_START) as dump:
+            result = extract_endorsed(dump, [(self.my_nation, self.my_region)], indexes)
+        self.endorsed.update(result[self.my_nation])
 
-                    nation = utils.canonical(elem.find('NAME').text)
-                    if nation == self.my_nation:
-                        continue
+        if indexes is not None:
+            self.audit = indexes[self.my_region.encode()]
 
-                    if self.my_nation in utils.canonical(endorsee):
-                        self.endorsed.add(nation)
+    def get_endorsed_from_api(self, nations):
+        """Ask the API which of the nations my nation has endorsed.
+        Requests are sent by a pool of workers and paced by the
+        rate limit governor of the API adapter.
 
-                elif is_in_region == True:
-                    break
+        Args:
+            nations (iterable): Nations to check, WA members of my region
+        """
 
-                root.clear()
+        with concurrent.futures.ThreadPoolExecutor(self.source_planner.api_workers) as pool:
+            nations = list(nations)
+            for nation, endorsers in zip(nations, pool.map(self.api.get_endorsements, nations)):
+                if self.my_nation in endorsers:
+                    self.endorsed.add(nation)
 
-    def get_endorsed_nations(self):
-        """Get endorsed nations from data dump or from cache.
+    def read_endorsed_from_dump(self):
+        """Get endorsed nations from the endorsement database, the dump index or the data dump.
         """
 
-        is_created = self.cache.load()
-
-        if self.daily_cache_update and (not is_created or not self.cache.is_updated):
-            dump = utils.load_dump(self.dump_path)
+        if self.endorsement_db is not None:
+            self.endorsement_db.load()
+            self.endorsed.update(self.endorsement_db.get_endorsed(self.my_nation,
+                                                                  self.my_region))
+            if self.audit_endorsements:
+                self.audit = audit.EndorsementIndex()
+                endorsements = self.endorsement_db.get_region_endorsements(self.my_region)
+                for nation, endorsers in endorsements.items():
+                    self.audit.add(nation, endorsers)
+            return
+
+        if self.dump_index is None:
+            refresh = not self.cache.is_file_updated(self.dump_path)
+            dump = utils.load_dump(self.dump_path, refresh=refresh, **self.dump_options)
+        else:
+            self.dump_index.load()
+            dump = io.BytesIO(self.dump_index.get_region(self.my_region.encode()))
+        # Closing the dump stops decompression after an early exit
+        with dump:
             self.get_endorsed_from_dump(dump)
-            self.cache['endorsed'] = list(self.endorsed)
+
+    def is_dump_indexed(self):
+        """Can endorsed nations be read from the dump without scanning it.
+        """
+
+        if self.endorsement_db is not None:
+            return self.endorsement_db.is_built()
+        if self.dump_index is not None:
+            return self.dump_index.is_built()
+        return False
+
+    def get_endorsed_nations(self, wa_members=None, region_members=None):
+        """Get endorsed nations from cache, or from the data dump or the API,
+        whichever the source planner expects to be faster.
+
+        Args:
+            wa_members (set): WA members, for the source planner. Fetched if not given.
+            region_members (set): Nations of my region, for the source planner.
+            Fetched if not given.
+        """
+
+        self.endorsed_plan = None
+        self.cache.load()
+        cache_key = ENDORSED_KEY.format(self.my_nation)
+        # Entries outdated by a newer dump are only used if daily updates are off
+        endorsed = self.cache.get(cache_key, allow_expired=not self.daily_cache_update)
+
+        if endorsed is None:
+            start = time.perf_counter()
+            if self.source_planner is None:
+                self.read_endorsed_from_dump()
+            else:
+                if wa_members is None:
+                    wa_members = self.get_wa_members()
+                if region_members is None:
+                    region_members = self.get_region_members()
+                # Only WA members can be endorsed
+                targets = (wa_members & region_members) - {self.my_nation}
+                self.endorsed_plan = self.source_planner.plan(len(targets), self.is_dump_indexed())
+                if self.endorsed_plan.source == planner.API:
+                    self.get_endorsed_from_api(targets)
+                else:
+                    self.read_endorsed_from_dump()
+
+            self.endorsed_time = time.perf_counter() - start
+            source = planner.DUMP if self.endorsed_plan is None else self.endorsed_plan.source
+            self.metrics.record_time('endorsed_' + source, self.endorsed_time)
+
+            self.cache[cache_key] = list(self.endorsed)
+            if self.audit is not None:
+                self.cache[AUDIT_KEY.format(self.my_region)] = self.audit.to_dict()
             self.cache.save()
         else:
-            self.endorsed = set(self.cache['endorsed'])
+            self.endorsed = set(endorsed)
+            if self.audit_endorsements:
+                # The index is only built from the dump, not from the API
+                cached_audit = self.cache.get(AUDIT_KEY.format(self.my_region),
+                                              allow_expired=not self.daily_cache_update)
+                if cached_audit is not None:
+                    self.audit = audit.EndorsementIndex(list(cached_audit['nations']),
+                                                        list(cached_audit['endorsers']))
+
+        self.compact_journal()
+
+    def is_endorsed_cached(self):
+        """Are endorsed nations in the cache and up-to-date.
+        """
+
+        self.cache.load()
+        endorsed = self.cache.get(ENDORSED_KEY.format(self.my_nation),
+                                  allow_expired=not self.daily_cache_update)
+        return endorsed is not None
+
+    def rebuild(self, wa_members, region_members):
+        """Get endorsed nations and generate nations to endorse in a new
+        object, so this one can be used in the meantime.
+
+        Args:
+            wa_members (set): WA members
+            region_members (set): Nations of my region
+
+        Returns:
+            Data: Rebuilt data, to be put in place by replace
+        """
+
+        rebuilt = copy.copy(self)
+        # Journaled endorsements are kept by this object
+        rebuilt.journal = None
+        rebuilt.endorsed = set()
+        rebuilt.session_endorsed = set()
+        rebuilt.endorseable = endorse_queue.EndorseQueue()
+        rebuilt.audit = None
+
+        rebuilt.get_endorsed_nations(wa_members, region_members)
+        rebuilt.gen_endorseable(wa_members, region_members)
+        return rebuilt
 
-    def gen_endorseable(self):
+    def replace(self, rebuilt):
+        """Put data built by rebuild in place, keeping endorsements of
+        this session, which the data dump may not have yet.
+
+        Args:
+            rebuilt (Data): Rebuilt data
+        """
+
+        with self.lock:
+            for nation in self.session_endorsed:
+                rebuilt.endorseable.discard(nation)
+            self.endorsed = rebuilt.endorsed | self.session_endorsed
+            self.endorseable = rebuilt.endorseable
+            self.audit = rebuilt.audit
+            self.endorsed_plan = rebuilt.endorsed_plan
+            self.endorsed_time = rebuilt.endorsed_time
+            self.save_cache()
+
+    def compact_journal(self):
+        """Add endorsements journaled by an interrupted session
+        to endorsed nations and the cache.
+        """
+
+        if self.journal is None:
+            return
+
+        journaled = self.journal.replay()
+        if not journaled:
+            return
+
+        self.endorsed.update(journaled)
+        self.save_cache()
+
+    def gen_endorseable(self, wa_members=None, region_members=None, changes=None):
         """Generate nations to endorse.
+
+        Args:
+            wa_members (set): WA members, fetched if not given
+            region_members (set): Nations of my region, fetched if not given
+            changes (tuple): Nations that joined and left WA members of my region
+            since endorseable was generated. Applied to endorseable instead of
+            generating it again.
         """
 
-        wa_members = self.api.get_wa_members()
-        region_members = self.api.get_region_members()
+        if changes is not None:
+            joined, left = changes
+            for nation in left:
+                self.endorseable.discard(nation)
+            self.endorseable.extend(joined - self.endorsed - {self.my_nation})
+            return
+
+        if wa_members is None:
+            wa_members = self.get_wa_members()
+        if region_members is None:
+            region_members = self.get_region_members()
         region_wa_members = wa_members & region_members
 
-        self.endorseable = list(region_wa_members - self.endorsed)
+        nations = region_wa_members - self.endorsed - {self.my_nation}
+        if self.audit is not None:
+            nations = self.audit.order(nations, self.my_nation, self.endorsed)
+        self.endorseable = endorse_queue.EndorseQueue(nations)
+
+    def get_reciprocation_gaps(self):
+        """Get nations to endorse which endorse my nation.
+
+        Returns:
+            set: Nations to endorse back, empty if there is no endorsement index
+        """
+
+        if self.audit is None:
+            return set()
+
+        with self.lock:
+            return {nation for nation
+                    in self.audit.get_reciprocation_gaps(self.my_nation, self.endorsed)
+                    if nation in self.endorseable}
+
+    def get_cached(self, key, fetch):
+        """Get a set from the cache, or fetch and cache it if it has expired.
+
+        Args:
+            key (str): Cache key
+            fetch (callable): Function to fetch the set
+
+        Returns:
+            set: Cached or fetched set
+        """
+
+        self.cache.load()
+        cached = self.cache.get(key)
+        if cached is not None:
+            return set(cached)
+
+        result = fetch()
+        self.cache[key] = list(result)
+        return result
+
+    def get_wa_members(self):
+        """Get WA members from the cache or the API.
+
+        Returns:
+            set: WA members
+        """
+
+        return self.get_cached(WA_MEMBERS_KEY, self.api.get_wa_members)
+
+    def get_region_members(self):
+        """Get nations of my region from the cache or the API.
+
+        Returns:
+            set: Nations of my region
+        """
+
+        return self.get_cached(REGION_MEMBERS_KEY.format(self.my_region),
+                               self.api.get_region_members)
 
     def load(self):
         """Load all data and return an iterator for endorseable.
@@ -102,34 +520,92 @@ class Data():
         self.gen_endorseable()
 
     def get_endorseable_iter(self):
-        for endorseable in self.endorseable:
-            yield endorseable
-            self.endorseable.remove(endorseable)
-            self.endorsed.add(endorseable)
+        """Get an iterator that takes nations off the endorseable queue.
+        Nations that fail can be put back with endorseable.requeue.
+
+        Returns:
+            Iterator: Iterator to get endorseable nations.
+        """
+
+        while self.endorseable:
+            yield self.endorseable.pop()
+
+    def record_endorsement(self, nation):
+        """Record a successful endorsement.
+
+        Args:
+            nation (str): Endorsed nation's name
+        """
+
+        self.endorsed.add(nation)
+        self.session_endorsed.add(nation)
+        if self.journal is not None:
+            self.journal.append(nation)
 
     def save_cache(self):
         """Save endorsed nations to cache
         """
 
-        self.cache['endorsed'] = list(self.endorsed)
+        self.cache[ENDORSED_KEY.format(self.my_nation)] = list(self.endorsed)
         self.cache.save()
 
+        # Journaled endorsements are in the cache now
+        if self.journal is not None:
+            self.journal.clear()
+
+
+def get_cache(file_path, daily_dump_update_time, **kwargs):
+    """Get the cache object of a file shared by every caller in the process,
+    so data cached by one Endotarter instance is reused by the others.
+
+    Args:
+        file_path (str): Cache file path
+        daily_dump_update_time (str): Daily data dump update time (ISO format)
+        kwargs: Keyword arguments for Cache, only used when it is created
+
+    Returns:
+        Cache: Cache object
+    """
+
+    key = os.path.abspath(file_path)
+    with _shared_caches_lock:
+        if key not in _shared_caches:
+            _shared_caches[key] = Cache(file_path, daily_dump_update_time, **kwargs)
+        return _shared_caches[key]
+
 
 class Cache(collections.UserDict):
-    """Cache various data to avoid using the data dump.
-    Use like a normal dictionary.
+    """Cache various data to avoid using the data dump and the API.
+    Use like a normal dictionary. Each entry expires by the freshness
+    policy of its key and expired entries are treated as missing.
 
     Args:
         file_path (str): Cache file path
         dump_update_time (str): Daily data dump update time (ISO format)
+        policies (dict): Key prefix -> freshness policy, DUMP_POLICY,
+        NO_EXPIRY or seconds after the entry is stored
+        default_policy: Freshness policy of keys without a policy
+        max_entries (int): Max entries kept in memory
     """
 
-    def __init__(self, file_path, daily_dump_update_time):
+    def __init__(self, file_path, daily_dump_update_time, policies=None,
+                 default_policy=DUMP_POLICY, max_entries=MAX_ENTRIES):
         super().__init__()
 
         self.file_path = file_path
         self.created_day = None
         self.daily_dump_update_time = datetime.time.fromisoformat(daily_dump_update_time)
+        self.policies = DEFAULT_POLICIES if policies is None else policies
+        self.default_policy = default_policy
+        self.max_entries = max_entries
+
+        # Least recently used entries first
+        self.data = collections.OrderedDict()
+        # Key -> UNIX timestamp of when the entry was stored
+        self.stored_times = {}
+        # Modification time of the file when it was last read or written
+        self.file_mtime = None
+        self.lock = threading.RLock()
 
     @property
     def is_updated(self):
@@ -145,31 +621,184 @@ class Cache(collections.UserDict):
         else:
             return False
 
+    @property
+    def last_dump_update_time(self):
+        """UTC time of the latest daily data dump update.
+        """
+
+        current_time = datetime.datetime.utcnow()
+        update_time = datetime.datetime.combine(current_time.date(), self.daily_dump_update_time)
+        if current_time < update_time:
+            update_time -= datetime.timedelta(days=1)
+
+        return update_time
+
+    def is_file_updated(self, file_path):
+        """Is a file modified after the latest daily data dump update.
+
+        Args:
+            file_path (str): File path
+
+        Returns:
+            bool: True if the file exists and is up-to-date
+        """
+
+        if not os.path.exists(file_path):
+            return False
+
+        modified_time = datetime.datetime.utcfromtimestamp(os.path.getmtime(file_path))
+        return modified_time >= self.last_dump_update_time
+
+    def get_expire_time(self, key):
+        """Get when an entry expires.
+
+        Args:
+            key (str): Cache key
+
+        Returns:
+            float: UNIX timestamp, None if the entry never expires
+        """
+
+        policy = self.policies.get(key.split(':', 1)[0], self.default_policy)
+        stored_time = self.stored_times.get(key, 0)
+        if policy is NO_EXPIRY:
+            return None
+
+        if policy == DUMP_POLICY:
+            # First daily data dump update after the entry was stored
+            stored_datetime = datetime.datetime.utcfromtimestamp(stored_time)
+            expire_time = datetime.datetime.combine(stored_datetime.date(),
+                                                    self.daily_dump_update_time)
+            if stored_datetime >= expire_time:
+                expire_time += datetime.timedelta(days=1)
+            return expire_time.replace(tzinfo=datetime.timezone.utc).timestamp()
+
+        return stored_time + policy
+
+    def is_expired(self, key):
+        expire_time = self.get_expire_time(key)
+        return expire_time is not None and time.time() >= expire_time
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.data and not self.is_expired(key)
+
+    def __getitem__(self, key):
+        with self.lock:
+            if key not in self.data or self.is_expired(key):
+                raise KeyError(key)
+            self.data.move_to_end(key)
+            return self.data[key]
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            self.stored_times[key] = time.time()
+            while len(self.data) > self.max_entries:
+                oldest_key, _ = self.data.popitem(last=False)
+                del self.stored_times[oldest_key]
+
+    def __delitem__(self, key):
+        with self.lock:
+            del self.data[key]
+            self.stored_times.pop(key, None)
+
+    def __iter__(self):
+        with self.lock:
+            return iter([key for key in self.data if not self.is_expired(key)])
+
+    def __len__(self):
+        with self.lock:
+            return sum(1 for key in self.data if not self.is_expired(key))
+
+    def get(self, key, default=None, allow_expired=False):
+        """Get an entry.
+
+        Args:
+            key (str): Cache key
+            default: Value returned if there is no entry
+            allow_expired (bool): Return the entry even if it has expired
+
+        Returns:
+            Entry value or default
+        """
+
+        with self.lock:
+            if key not in self.data or (not allow_expired and self.is_expired(key)):
+                return default
+            self.data.move_to_end(key)
+            return self.data[key]
+
+    def expire(self):
+        """Drop expired entries.
+        """
+
+        with self.lock:
+            for key in [key for key in self.data if self.is_expired(key)]:
+                del self[key]
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+            self.stored_times.clear()
+
     def load(self):
         """Load cache from JSON file and return if it exists.
+        Entries stored in memory after the file was written are kept,
+        and the file is not read again if it has not changed.
 
         Returns:
             bool: True if file exists and loaded, False otherwise.
         """
 
-        if os.path.exists(self.file_path):
+        with self.lock:
+            if not os.path.exists(self.file_path):
+                # The file was deleted since it was read, which clears the cache
+                if self.file_mtime is not None:
+                    self.clear()
+                    self.file_mtime = None
+                return False
+
+            file_mtime = os.stat(self.file_path).st_mtime_ns
+            if file_mtime == self.file_mtime:
+                return True
+
             with open(self.file_path) as f:
                 json_dict = json.load(f)
-                created_time = json_dict.pop('created_time')
-                self.created_day = datetime.datetime.utcfromtimestamp(created_time).date()
-                self.data = json_dict
-                return True
-        else:
-            return False
+            created_time = json_dict.pop('created_time')
+            # Files without store times have all entries stored when created
+            stored_times = json_dict.pop(STORED_TIMES_KEY, {})
+            self.created_day = datetime.datetime.utcfromtimestamp(created_time).date()
+
+            for key, value in json_dict.items():
+                stored_time = stored_times.get(key, created_time)
+                if key in self.data and self.stored_times[key] >= stored_time:
+                    continue
+                self.data[key] = value
+                self.stored_times[key] = stored_time
+            while len(self.data) > self.max_entries:
+                oldest_key, _ = self.data.popitem(last=False)
+                del self.stored_times[oldest_key]
+
+            self.file_mtime = file_mtime
+            return True
 
     def save(self):
-        """Save cache to JSON file
+        """Save cache to JSON file. Expired entries are dropped.
         """
 
-        created_time = int(time.time())
-        json_dict = {'created_time': created_time}
-        json_dict.update(self.data)
-        # Discard cache dict after saving
-        self.data = {}
-        with open(self.file_path, 'w') as f:
-            json.dump(json_dict, f)
+        with self.lock:
+            self.expire()
+
+            created_time = int(time.time())
+            json_dict = {'created_time': created_time,
+                         STORED_TIMES_KEY: self.stored_times}
+            json_dict.update(self.data)
+            tmp_path = self.file_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(json_dict, f)
+            os.replace(tmp_path, self.file_path)
+
+            self.created_day = datetime.datetime.utcfromtimestamp(created_time).date()
+            self.file_mtime = os.stat(self.file_path).st_mtime_ns
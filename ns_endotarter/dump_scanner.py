@@ -0,0 +1,347 @@
+import html
+import mmap
+import os
+import shutil
+
+from ns_endotarter import utils
+
+
+CHUNK_SIZE = 1024 * 1024
+
+NATION_START = b'<NATION>'
+NATION_END = b'</NATION>'
+REGION_START = b'<REGION>'
+REGION_END = b'</REGION>'
+
+
+def canonical_bytes(name):
+    """Byte version of utils.canonical.
+
+    Args:
+        name (bytes): Name as it appears in the dump
+
+    Returns:
+        bytes: Canonicalized name
+    """
+
+    if b'&' in name:
+        name = html.unescape(name.decode()).encode()
+
+    return name.lower().replace(b' ', b'_')
+
+
+def iter_nation_blocks(dump, chunk_size=CHUNK_SIZE):
+    """Split a dump stream into raw <NATION> blocks without parsing them.
+
+    Args:
+        dump (file): Decompressed dump file handle
+        chunk_size (int): Number of bytes to read at a time
+
+    Yields:
+        bytes: A <NATION>...</NATION> block
+    """
+
+    buf = b''
+    while True:
+        chunk = dump.read(chunk_size)
+        if not chunk:
+            break
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+
+        buf += chunk
+        pos = 0
+        while True:
+            start = buf.find(NATION_START, pos)
+            if start == -1:
+                # Keep a possible partial start tag for the next chunk
+                pos = max(pos, len(buf) - len(NATION_START))
+                break
+
+            end = buf.find(NATION_END, start)
+            if end == -1:
+                pos = start
+                break
+
+            end += len(NATION_END)
+            yield buf[start:end]
+            pos = end
+
+        buf = buf[pos:]
+
+
+def get_block_region(block):
+    """Get the raw region name of a nation block.
+
+    Args:
+        block (bytes): A <NATION> block
+
+    Returns:
+        bytes: Region name, None if the block has none
+    """
+
+    start = block.find(REGION_START)
+    if start == -1:
+        return None
+
+    start += len(REGION_START)
+    end = block.find(REGION_END, start)
+    return block[start:end]
+
+
+def get_block_field(block, tag):
+    """Get the raw text of a field of a nation block.
+
+    Args:
+        block (bytes): A <NATION> block
+        tag (bytes): Tag name (e.g. b'NAME')
+
+    Returns:
+        bytes: Text of the field, None if the block has none
+    """
+
+    start_tag = b'<' + tag + b'>'
+    start = block.find(start_tag)
+    if start == -1:
+        return None
+
+    start += len(start_tag)
+    end = block.find(b'</' + tag + b'>', start)
+    return block[start:end]
+
+
+def filter_region_blocks(blocks, regions, early_exit=True):
+    """Keep nation blocks that belong to some regions.
+
+    Region names are compared as canonicalized bytes so nations
+    of other regions are never decoded or parsed. Since the dump
+    groups nations by region, filtering stops once every wanted
+    region has been passed if early_exit is set.
+
+    Args:
+        blocks (iterable): Nation blocks (bytes)
+        regions (set): Canonical region names (bytes)
+        early_exit (bool): Stop after all regions have been passed
+
+    Yields:
+        tuple: Canonical region name (bytes) and nation block (bytes)
+    """
+
+    canonical_names = {}
+    done = set()
+    current = None
+
+    for block in blocks:
+        raw_region = get_block_region(block)
+        region = canonical_names.get(raw_region)
+        if region is None:
+            if raw_region is None:
+                continue
+            region = canonical_bytes(raw_region)
+            canonical_names[raw_region] = region
+
+        if region != current:
+            if current in regions:
+                done.add(current)
+                if early_exit and done >= regions:
+                    return
+            current = region
+
+        if region in regions:
+            yield region, block
+
+
+def iter_region_blocks(dump, regions, early_exit=True, chunk_size=CHUNK_SIZE):
+    """Yield nation blocks of a dump stream that belong to some regions.
+
+    Args:
+        dump (file): Decompressed dump file handle
+        regions (set): Canonical region names (bytes)
+        early_exit (bool): Stop after all regions have been passed
+        chunk_size (int): Number of bytes to read at a time
+
+    Yields:
+        tuple: Canonical region name (bytes) and nation block (bytes)
+    """
+
+    blocks = iter_nation_blocks(dump, chunk_size)
+    yield from filter_region_blocks(blocks, regions, early_exit)
+
+
+def iter_nation_offsets(buf, start=0, end=None):
+    """Find the byte ranges of <NATION> blocks in a buffer.
+
+    Args:
+        buf (bytes-like): Buffer supporting find (e.g. mmap)
+        start (int): Offset to start searching from
+        end (int): Blocks must start before this offset
+
+    Yields:
+        tuple: Start and end offsets of a block
+    """
+
+    if end is None:
+        end = len(buf)
+
+    pos = start
+    while True:
+        block_start = buf.find(NATION_START, pos)
+        if block_start == -1 or block_start >= end:
+            return
+
+        block_end = buf.find(NATION_END, block_start)
+        if block_end == -1:
+            return
+
+        block_end += len(NATION_END)
+        yield block_start, block_end
+        pos = block_end
+
+
+def iter_range_region_blocks(buf, regions, start, end):
+    """Yield nation blocks starting within a byte range of a buffer
+    that belong to some regions. Ranges that split a dump never
+    split a block, so they can be scanned independently.
+
+    Args:
+        buf (bytes-like): Decompressed dump buffer (e.g. mmap)
+        regions (set): Canonical region names (bytes)
+        start (int): Start offset of the range
+        end (int): End offset of the range
+
+    Yields:
+        tuple: Canonical region name (bytes) and nation block (bytes)
+    """
+
+    blocks = (buf[block_start:block_end]
+              for block_start, block_end in iter_nation_offsets(buf, start, end))
+    yield from filter_region_blocks(blocks, regions, early_exit=False)
+
+
+class DumpIndex():
+    """Index from region name to its byte range in a decompressed,
+    memory-mapped data dump. The index is kept in a cache object
+    so it expires with the daily dump like the endorsed cache.
+
+    Args:
+        cache (Cache): Cache object to store the index in
+        dump_path (str): Compressed data dump file path
+        xml_path (str): Decompressed data dump file path
+        dump_options (dict): Keyword arguments for utils.load_dump
+    """
+
+    def __init__(self, cache, dump_path, xml_path, dump_options=None):
+        self.cache = cache
+        self.dump_path = dump_path
+        self.xml_path = xml_path
+        self.dump_options = dump_options or {}
+
+        # Canonical region name (bytes) -> [start, end]
+        self.regions = {}
+        self.mmap = None
+        self._xml_file = None
+
+    def decompress(self):
+        """Refresh the data dump and decompress it into a local file.
+        """
+
+        refresh = not self.cache.is_file_updated(self.dump_path)
+        tmp_path = self.xml_path + '.tmp'
+        with utils.load_dump(self.dump_path, refresh=refresh, **self.dump_options) as dump, \
+                open(tmp_path, 'wb') as f:
+            shutil.copyfileobj(dump, f, CHUNK_SIZE)
+        os.replace(tmp_path, self.xml_path)
+
+    def open(self):
+        """Memory-map the decompressed data dump.
+        """
+
+        self.close()
+        self._xml_file = open(self.xml_path, 'rb')
+        self.mmap = mmap.mmap(self._xml_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        """Unmap the decompressed data dump.
+        """
+
+        if self.mmap is not None:
+            self.mmap.close()
+            self._xml_file.close()
+            self.mmap = None
+            self._xml_file = None
+
+    def build(self):
+        """Decompress the data dump and index its regions.
+        """
+
+        self.close()
+        self.decompress()
+        self.open()
+
+        regions = {}
+        canonical_names = {}
+        current = None
+        is_first_run = False
+        for start, end in iter_nation_offsets(self.mmap):
+            region_start = self.mmap.find(REGION_START, start, end)
+            if region_start == -1:
+                continue
+            region_start += len(REGION_START)
+            raw_region = self.mmap[region_start:self.mmap.find(REGION_END, region_start, end)]
+
+            region = canonical_names.get(raw_region)
+            if region is None:
+                region = canonical_bytes(raw_region)
+                canonical_names[raw_region] = region
+
+            # Like the early exit of a scan, only the first run of
+            # a region is indexed since the dump groups nations by region
+            if region != current:
+                current = region
+                is_first_run = region not in regions
+                if is_first_run:
+                    regions[region] = [start, end]
+            elif is_first_run:
+                regions[region][1] = end
+
+        self.regions = regions
+        self.cache['regions'] = {region.decode(): offsets
+                                 for region, offsets in regions.items()}
+        self.cache.save()
+
+    def is_built(self):
+        """Is an up-to-date index built.
+
+        Returns:
+            bool: True if the index can be loaded without rebuilding it
+        """
+
+        return self.cache.load() and 'regions' in self.cache and os.path.exists(self.xml_path)
+
+    def load(self):
+        """Load the index from cache, or rebuild it if it is outdated.
+        """
+
+        # The index entry expires at the first dump update after it was built
+        if not self.is_built():
+            self.build()
+        else:
+            self.regions = {region.encode(): offsets
+                            for region, offsets in self.cache['regions'].items()}
+            self.open()
+
+    def get_region(self, region):
+        """Get the nation blocks of a region.
+
+        Args:
+            region (bytes): Canonical region name
+
+        Returns:
+            bytes: Nation blocks of the region, empty if not found
+        """
+
+        if region not in self.regions:
+            return b''
+
+        start, end = self.regions[region]
+        return self.mmap[start:end]
@@ -0,0 +1,103 @@
+import collections
+
+
+class EndorseQueue():
+    """Queue of nations to endorse in order. All operations are O(1).
+
+    Args:
+        nations (iterable): Nations to endorse
+    """
+
+    def __init__(self, nations=()):
+        self._nations = collections.OrderedDict.fromkeys(nations)
+
+    def __len__(self):
+        return len(self._nations)
+
+    def __contains__(self, nation):
+        return nation in self._nations
+
+    def __iter__(self):
+        return iter(self._nations)
+
+    def __repr__(self):
+        return 'EndorseQueue({} nations)'.format(len(self))
+
+    def append(self, nation):
+        """Add a nation to the back of the queue if it is not queued.
+
+        Args:
+            nation (str): Nation's name
+        """
+
+        if nation not in self._nations:
+            self._nations[nation] = None
+
+    def extend(self, nations):
+        """Add nations to the back of the queue.
+
+        Args:
+            nations (iterable): Nations' names
+        """
+
+        for nation in nations:
+            self.append(nation)
+
+    def peek(self):
+        """Get the next nation without removing it.
+
+        Raises:
+            IndexError: The queue is empty
+
+        Returns:
+            str: Nation's name
+        """
+
+        try:
+            return next(iter(self._nations))
+        except StopIteration:
+            raise IndexError('peek from an empty queue')
+
+    def pop(self):
+        """Remove and return the next nation.
+
+        Raises:
+            IndexError: The queue is empty
+
+        Returns:
+            str: Nation's name
+        """
+
+        try:
+            return self._nations.popitem(last=False)[0]
+        except KeyError:
+            raise IndexError('pop from an empty queue')
+
+    def requeue(self, nation):
+        """Put a nation back to the front, e.g. after a failed endorsement.
+
+        Args:
+            nation (str): Nation's name
+        """
+
+        self._nations[nation] = None
+        self._nations.move_to_end(nation, last=False)
+
+    def defer(self, nation):
+        """Move a nation to the back of the queue, queuing it if needed.
+
+        Args:
+            nation (str): Nation's name
+        """
+
+        self._nations[nation] = None
+        self._nations.move_to_end(nation)
+
+    def discard(self, nation):
+        """Remove a nation from the queue if it is queued.
+
+        Args:
+            nation (str): Nation's name
+        """
+
+        self._nations.pop(nation, None)
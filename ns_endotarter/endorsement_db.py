@@ -0,0 +1,238 @@
+import os
+import sqlite3
+
+from ns_endotarter import dump_scanner
+from ns_endotarter import utils
+
+
+# Rows inserted per executemany call
+BATCH_SIZE = 10000
+
+NAME_TAG = b'NAME'
+UNSTATUS_TAG = b'UNSTATUS'
+ENDORSEMENTS_TAG = b'ENDORSEMENTS'
+NON_MEMBER = b'Non-member'
+
+SCHEMA = """
+CREATE TABLE nations (
+    name TEXT PRIMARY KEY,
+    region TEXT NOT NULL,
+    is_wa INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE endorsements (
+    endorser TEXT NOT NULL,
+    endorsee TEXT NOT NULL,
+    PRIMARY KEY (endorser, endorsee)
+) WITHOUT ROWID;
+"""
+
+# Indexes are created after the rows are inserted, which is faster
+INDEXES = """
+CREATE INDEX nations_region ON nations (region, is_wa);
+CREATE INDEX endorsements_endorsee ON endorsements (endorsee);
+"""
+
+
+def iter_dump_rows(dump):
+    """Read nation rows and endorsement edges of a dump stream
+    without parsing nation blocks as XML.
+
+    Args:
+        dump (file): Decompressed dump file handle
+
+    Yields:
+        tuple: Nation row (name, region, is_wa) and list of
+        (endorser, endorsee) edges of the nation
+    """
+
+    for block in dump_scanner.iter_nation_blocks(dump):
+        name = dump_scanner.get_block_field(block, NAME_TAG)
+        name = dump_scanner.canonical_bytes(name).decode()
+        region = dump_scanner.get_block_region(block)
+        region = dump_scanner.canonical_bytes(region).decode() if region is not None else ''
+        unstatus = dump_scanner.get_block_field(block, UNSTATUS_TAG)
+        is_wa = unstatus is not None and unstatus != NON_MEMBER
+
+        edges = []
+        endorsers = dump_scanner.get_block_field(block, ENDORSEMENTS_TAG)
+        if endorsers:
+            edges = [(endorser, name)
+                     for endorser in utils.canonical(endorsers.decode()).split(',')
+                     if endorser and endorser != name]
+
+        yield (name, region, is_wa), edges
+
+
+class EndorsementDB():
+    """Indexed SQLite copy of nations, regions, WA status and
+    endorsements of the data dump. Built once per dump day so
+    lookups of any nation or region do not rescan the dump.
+
+    Args:
+        cache (Cache): Cache object, tells if the database is up-to-date
+        db_path (str): Database file path
+        dump_path (str): Data dump file path
+        dump_options (dict): Keyword arguments for utils.load_dump
+    """
+
+    def __init__(self, cache, db_path, dump_path, dump_options=None):
+        self.cache = cache
+        self.db_path = db_path
+        self.dump_path = dump_path
+        self.dump_options = dump_options or {}
+
+        self.conn = None
+
+    def build(self):
+        """Load the data dump into a new database in one streaming pass.
+        """
+
+        self.close()
+
+        tmp_path = self.db_path + '.tmp'
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+        conn = sqlite3.connect(tmp_path)
+        try:
+            # The file is thrown away if building fails
+            conn.execute('PRAGMA journal_mode = OFF')
+            conn.execute('PRAGMA synchronous = OFF')
+            conn.executescript(SCHEMA)
+
+            refresh = not self.cache.is_file_updated(self.dump_path)
+            with utils.load_dump(self.dump_path, refresh=refresh, **self.dump_options) as dump:
+                nations = []
+                edges = []
+                for nation, nation_edges in iter_dump_rows(dump):
+                    nations.append(nation)
+                    edges.extend(nation_edges)
+                    if len(nations) >= BATCH_SIZE:
+                        self.insert(conn, nations, edges)
+                        nations = []
+                        edges = []
+                self.insert(conn, nations, edges)
+
+            conn.executescript(INDEXES)
+            conn.commit()
+        finally:
+            conn.close()
+
+        os.replace(tmp_path, self.db_path)
+        self.open()
+
+    def insert(self, conn, nations, edges):
+        conn.executemany('INSERT OR REPLACE INTO nations VALUES (?, ?, ?)', nations)
+        conn.executemany('INSERT OR IGNORE INTO endorsements VALUES (?, ?)', edges)
+
+    def open(self):
+        self.close()
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def is_built(self):
+        """Is the database built from the latest dump.
+
+        Returns:
+            bool: True if the database can be opened without rebuilding it
+        """
+
+        return self.cache.is_file_updated(self.db_path)
+
+    def load(self):
+        """Open the database, or rebuild it if it is older than the latest dump.
+        """
+
+        if self.cache.is_file_updated(self.db_path):
+            if self.conn is None:
+                self.open()
+        else:
+            self.build()
+
+    def get_endorsed(self, nation, region=None):
+        """Get nations a nation has endorsed.
+
+        Args:
+            nation (str): Canonical nation name
+            region (str): Only get nations of this region
+
+        Returns:
+            set: Endorsed nations
+        """
+
+        if region is None:
+            rows = self.conn.execute('SELECT endorsee FROM endorsements WHERE endorser = ?',
+                                     (nation,))
+        else:
+            rows = self.conn.execute('SELECT endorsee FROM endorsements '
+                                     'JOIN nations ON nations.name = endorsements.endorsee '
+                                     'WHERE endorser = ? AND region = ?', (nation, region))
+
+        return {row[0] for row in rows}
+
+    def get_endorsers(self, nation):
+        """Get nations which have endorsed a nation.
+
+        Args:
+            nation (str): Canonical nation name
+
+        Returns:
+            set: Endorsing nations
+        """
+
+        rows = self.conn.execute('SELECT endorser FROM endorsements WHERE endorsee = ?',
+                                 (nation,))
+        return {row[0] for row in rows}
+
+    def get_region_endorsements(self, region):
+        """Get endorsers of every nation of a region.
+
+        Args:
+            region (str): Canonical region name
+
+        Returns:
+            dict: Nation -> list of nations which have endorsed it
+        """
+
+        result = {nation: [] for nation in self.get_region_members(region)}
+        rows = self.conn.execute('SELECT endorser, endorsee FROM endorsements '
+                                 'JOIN nations ON nations.name = endorsements.endorsee '
+                                 'WHERE region = ?', (region,))
+        for endorser, endorsee in rows:
+            result[endorsee].append(endorser)
+
+        return result
+
+    def get_region_members(self, region, wa_only=False):
+        """Get nations of a region as of the dump.
+
+        Args:
+            region (str): Canonical region name
+            wa_only (bool): Only get WA members
+
+        Returns:
+            set: Nations of the region
+        """
+
+        query = 'SELECT name FROM nations WHERE region = ?'
+        if wa_only:
+            query += ' AND is_wa = 1'
+
+        return {row[0] for row in self.conn.execute(query, (region,))}
+
+    def get_region(self, nation):
+        """Get the region of a nation as of the dump.
+
+        Args:
+            nation (str): Canonical nation name
+
+        Returns:
+            str: Canonical region name, None if the nation is not in the dump
+        """
+
+        row = self.conn.execute('SELECT region FROM nations WHERE name = ?', (nation,)).fetchone()
+        return row[0] if row is not None else None
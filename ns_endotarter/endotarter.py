@@ -1,11 +1,23 @@
+import time
+
 import nationstates
 import toml
 
 from ns_endotarter import api_adapter
+from ns_endotarter import connection
 from ns_endotarter import data
+from ns_endotarter import dump_scanner
+from ns_endotarter import endorsement_db
 from ns_endotarter import executor
 from ns_endotarter import exceptions
+from ns_endotarter import instrumentation
 from ns_endotarter import info
+from ns_endotarter import journal
+from ns_endotarter import membership
+from ns_endotarter import pipeline
+from ns_endotarter import planner
+from ns_endotarter import ratelimit
+from ns_endotarter import session_store
 from ns_endotarter import utils
 
 
@@ -13,48 +25,237 @@ class Endotarter():
     def __init__(self, config):
         conf = config['General']
         my_nation = utils.canonical(conf['my_nation'])
+        my_region = utils.canonical(conf['my_region'])
         self.password = conf['password']
         user_agent = conf['user_agent']
         if user_agent == '':
             raise exceptions.UserError('You need to set the user agent!')
 
+        metrics_conf = config.get('Metrics', {})
+        self.metrics = instrumentation.NULL_METRICS
+        if metrics_conf.get('enabled', False):
+            self.metrics = instrumentation.Metrics(
+                trace_memory=metrics_conf.get('trace_memory', False))
+        self.metrics_path = metrics_conf.get('export_path', info.METRICS_PATH)
+        self.metrics_format = metrics_conf.get('export_format', instrumentation.JSON_FORMAT)
+
+        self.governor = ratelimit.Governor()
         ns_api = nationstates.Nationstates(user_agent=user_agent)
-        ns_api = api_adapter.NS_API(ns_api, my_nation)
-        ns_site = executor.NSSite(user_agent)
-        self.executor = executor.EndorseExecutor(ns_api, ns_site)
+        ns_api = api_adapter.NS_API(ns_api, my_nation, my_region, self.governor)
+        ns_site = executor.NSSite(user_agent, self.governor,
+                                  keepalive_interval=conf.get('keepalive_interval',
+                                                              connection.KEEPALIVE_INTERVAL),
+                                  metrics=self.metrics)
+        store = None
+        if conf.get('save_session', False):
+            store = session_store.SessionStore(info.SESSION_PATH.format(my_nation), my_nation)
+        self.executor = executor.EndorseExecutor(ns_api, ns_site, store)
 
         cache_conf = config['Cache']
-        cache = data.Cache(info.CACHE_PATH, cache_conf['daily_dump_update_time'])
+        roster_ttl = cache_conf.get('roster_ttl', data.ROSTER_TTL)
+        cache = data.get_cache(info.CACHE_PATH, cache_conf['daily_dump_update_time'],
+                               policies={'wa_members': roster_ttl,
+                                         'region_members': roster_ttl},
+                               max_entries=cache_conf.get('max_entries', data.MAX_ENTRIES))
+
+        dump_options = {'user_agent': user_agent,
+                        'stream': cache_conf.get('stream_dump_download', False),
+                        'threaded': cache_conf.get('threaded_decompression', False),
+                        'buffer_size': cache_conf.get('decompress_buffer_size',
+                                                      utils.DECOMPRESS_BUFFER_SIZE),
+                        'queue_depth': cache_conf.get('decompress_queue_depth',
+                                                      utils.DECOMPRESS_QUEUE_DEPTH)}
+
+        dump_index = None
+        if cache_conf.get('use_dump_index', False):
+            index_cache = data.Cache(info.DUMP_INDEX_PATH, cache_conf['daily_dump_update_time'])
+            dump_index = dump_scanner.DumpIndex(index_cache, info.DATA_DUMP_PATH,
+                                                info.DECOMPRESSED_DUMP_PATH, dump_options)
+
+        nations_db = None
+        if cache_conf.get('use_endorsement_db', False):
+            nations_db = endorsement_db.EndorsementDB(cache, info.ENDORSEMENT_DB_PATH,
+                                                      info.DATA_DUMP_PATH, dump_options)
+
+        endorse_journal = journal.Journal(info.JOURNAL_PATH.format(my_nation),
+                                          cache_conf.get('journal_sync_every',
+                                                         journal.SYNC_EVERY))
+
+        source_planner = None
+        if cache_conf.get('plan_endorsed_source', False):
+            source_planner = planner.SourcePlanner(self.governor, cache, info.DATA_DUMP_PATH)
+
         self.ns_data = data.Data(ns_api, cache, info.DATA_DUMP_PATH,
-                                 conf['my_region'], my_nation,
-                                 cache_conf['update_from_dump'])
+                                 my_region, my_nation,
+                                 cache_conf['update_from_dump'], dump_index,
+                                 dump_options, endorse_journal, self.metrics, nations_db,
+                                 source_planner, cache_conf.get('audit_endorsements', False))
+
+        self.member_sync = None
+        prune_interval = conf.get('prune_interval', 0)
+        # The pruner keeps member sets current with the same sync
+        if cache_conf.get('incremental_member_sync', False) or prune_interval:
+            # Member sets are brought up to date by the sync instead of expiring
+            members_cache = data.Cache(info.MEMBERS_CACHE_PATH, cache_conf['daily_dump_update_time'],
+                                       policies={}, default_policy=data.NO_EXPIRY)
+            self.member_sync = membership.MembershipSync(ns_api, members_cache, my_region,
+                                                         cache_conf.get('member_sync_max_age',
+                                                                        membership.MAX_DELTA_AGE))
 
-        self.endorseable_iter = None
+        self.pruner = None
+        if prune_interval:
+            self.pruner = membership.MembershipPruner(self.member_sync, self.ns_data,
+                                                      self.governor, prune_interval)
+
+        self.async_executor = executor.AsyncEndorseExecutor(ns_site, self.ns_data,
+                                                            conf.get('max_in_flight', 1),
+                                                            self.executor)
 
     def prepare(self):
-        self.executor.setup_session(password=self.password)
-        print('Logged in')
-        self.ns_data.load()
-        self.endorseable_iter = self.ns_data.get_endorseable_iter()
-        print('Loaded nation list')
+        ns_site = self.executor.ns_site
+        ns_data = self.ns_data
+
+        # Requests are paced by the shared rate limit governor.
+        # The site connection is opened while logging in through the API.
+        stages = {'session': pipeline.Stage(lambda: self.executor.setup_session(self.password),
+                                            []),
+                  'warm_up': pipeline.Stage(ns_site.connections.warm_up, [])}
+
+        if self.member_sync is None:
+            stages['wa_members'] = pipeline.Stage(ns_data.get_wa_members, [])
+            stages['region_members'] = pipeline.Stage(ns_data.get_region_members, [])
+        else:
+            member_sync = self.member_sync
+            stages['member_sync'] = pipeline.Stage(member_sync.sync, [])
+            stages['wa_members'] = pipeline.Stage(lambda changes: member_sync.wa_members,
+                                                  ['member_sync'])
+            stages['region_members'] = pipeline.Stage(lambda changes: member_sync.region_members,
+                                                      ['member_sync'])
+
+        if ns_data.source_planner is None:
+            stages['endorsed'] = pipeline.Stage(ns_data.get_endorsed_nations, [])
+        else:
+            # The source is chosen by the number of WA members of my region
+            stages['endorsed'] = pipeline.Stage(ns_data.get_endorsed_nations,
+                                                ['wa_members', 'region_members'])
+
+        stages['endorseable'] = pipeline.Stage(lambda endorsed, wa_members, region_members:
+                                               ns_data.gen_endorseable(wa_members, region_members),
+                                               ['endorsed', 'wa_members', 'region_members'])
+
+        start = time.perf_counter()
+        results, durations = pipeline.run_stages(stages)
+        total_time = time.perf_counter() - start
+
+        self.metrics.record_time('prepare', total_time)
+        for name, duration in durations.items():
+            self.metrics.record_time('prepare_' + name, duration)
+
+        ns_site.connections.start_keepalive()
+        if self.pruner is not None:
+            self.pruner.start()
+        print('Logged in and loaded nation list in {:.2f}s'.format(total_time))
+        print(', '.join('{} {:.2f}s'.format(name, duration)
+                        for name, duration in durations.items()))
+        plan = ns_data.endorsed_plan
+        if plan is not None:
+            print('Got endorsed nations from the {} in {:.2f}s '
+                  '(estimated API {:.2f}s, dump {:.2f}s)'.format(plan.source, ns_data.endorsed_time,
+                                                                 plan.api_seconds,
+                                                                 plan.dump_seconds))
+        if ns_data.audit is not None:
+            gaps_num = len(ns_data.get_reciprocation_gaps())
+            self.metrics.set_gauge('reciprocation_gaps', gaps_num)
+            print('{} nations endorse you and are queued first to endorse back'.format(gaps_num))
+
+    def endorse_next(self):
+        """Endorse the next nation to endorse.
+
+        Raises:
+            NSSiteError, AuthError, requests.RequestException: Endorsing failed,
+            the nation is put back to be retried
+
+        Returns:
+            str: Endorsed nation, None if all nations are endorsed
+        """
+
+        with self.ns_data.lock:
+            if not self.ns_data.endorseable:
+                return None
+            nation_to_endorse = self.ns_data.endorseable.pop()
 
-    def endorse(self):
         try:
-            nation_to_endorse = next(self.endorseable_iter)
             self.executor.endorse(nation_to_endorse)
-        except StopIteration:
+        except executor.RETRY_ERRORS:
+            # Retry it next time
+            with self.ns_data.lock:
+                self.ns_data.endorseable.requeue(nation_to_endorse)
+            raise
+
+        self.ns_data.record_endorsement(nation_to_endorse)
+        return nation_to_endorse
+
+    def endorse(self):
+        if self.endorse_next() is None:
             print('YOu have endorsed all nations!')
             self.shutdown()
 
+    def endorse_async(self):
+        """Endorse without waiting for the response. Must be called
+        from an asyncio event loop.
+
+        Returns:
+            asyncio.Task: Task which verifies the endorsement, None if
+            all nations are endorsed
+        """
+
+        task = self.async_executor.trigger()
+        if task is None:
+            print('YOu have endorsed all nations!')
+
+        return task
+
+    async def shutdown_async(self):
+        await self.async_executor.drain()
+        self.async_executor.close()
+        self.shutdown()
+
     def print_remaining_nations(self):
-        remaining_nations = ', '.join(self.ns_data.endorseable)
-        remaining_num = len(remaining_nations)
-        print('{} nations to endorse:\n {}'.format(remaining_num, remaining_nations))
+        remaining_num = len(self.ns_data.endorseable)
+        print('{} nations to endorse:\n {}'.format(remaining_num,
+                                                   ', '.join(self.ns_data.endorseable)))
 
     def shutdown(self):
         self.ns_data.save_cache()
         print('Saved cache')
 
+        if self.pruner is not None:
+            self.pruner.stop()
+            pruner_metrics = self.pruner.get_metrics()
+            print('Dropped {} nations which left from the queue in {} member syncs'.format(
+                pruner_metrics['pruned'], pruner_metrics['syncs']))
+            for name, value in pruner_metrics.items():
+                self.metrics.set_gauge('pruner_' + name, value)
+
+        connections = self.executor.ns_site.connections
+        connections.stop_keepalive()
+        connection_metrics = connections.get_metrics()
+        print('site: {} handshakes, {} reused connections, {} keep-alive requests'.format(
+            connection_metrics['handshakes'], connection_metrics['reuses'],
+            connection_metrics['keepalives']))
+        for name, value in connection_metrics.items():
+            self.metrics.set_gauge('site_' + name, value)
+
+        for name, metrics in self.governor.get_metrics().items():
+            print('{}: {} requests, waited {:.2f}s for rate limits'.format(name, metrics['requests'],
+                                                                         metrics['wait_time']))
+            for metric, value in metrics.items():
+                self.metrics.set_gauge('ratelimit_{}_{}'.format(name, metric), value)
+
+        if self.metrics.enabled:
+            self.metrics.export(self.metrics_path, self.metrics_format)
+            print('Saved metrics to {}'.format(self.metrics_path))
+
 
 if __name__ == "__main__":
     print('Endotarter v0.1.1')
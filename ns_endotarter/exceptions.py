@@ -11,4 +11,16 @@ class AuthError(EndotarterError):
 
 
 class NSSiteError(EndotarterError):
-    pass
\ No newline at end of file
+    pass
+
+
+class DumpError(EndotarterError):
+    pass
+
+
+class SessionError(NSSiteError):
+    pass
+
+
+class DaemonError(EndotarterError):
+    pass
@@ -1,12 +1,129 @@
+import asyncio
+import collections
+import concurrent.futures
+import html as html_lib
+import re
+
 import requests
 import bs4
 
+from ns_endotarter import connection
 from ns_endotarter import exceptions
+from ns_endotarter import instrumentation
+from ns_endotarter import ratelimit
 
 
-ACTION_URL = "https://www.nationstates.net/{}"
-LOCALID_URL = "https://www.nationstates.net/template-overall=none/page=settings"
+BASE_URL = "https://www.nationstates.net/"
+LOCALID_PAGE = "template-overall=none/page=settings"
 ENDORSE_ACTION = "cgi-bin/endorse.cgi"
+# Error shown when the local id or the login is no longer valid
+SECURITY_CHECK_ERROR = "failed a security check"
+
+
+# Inputs the classifier looks at, e.g. <input type="hidden" name="localid" value="123">
+# Attribute names and class names are matched whole, e.g. not as part of data-value or error-hint
+INPUT_RE = re.compile(r'<input\b[^>]*?(?<![\w-])name\s*=\s*["\']?(action|localid)(?![\w-])[^>]*>',
+                      re.I)
+INPUT_VALUE_RE = re.compile(r'(?<![\w-])value\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))', re.I)
+ERROR_RE = re.compile(r'<p\b[^>]*?(?<![\w-])class\s*=\s*(?:"(?:[^"]*\s)?error(?=[\s"])[^"]*"'
+                      r'|\'(?:[^\']*\s)?error(?=[\s\'])[^\']*\'|error(?=[\s>]))[^>]*>(.*?)</p\s*>',
+                      re.I | re.S)
+# Looser matches which tell that the markup may be something the regexes miss
+LOOSE_ERROR_RE = re.compile(r'class\s*=\s*["\']?[^"\'>]*(?<![\w-])error(?![\w-])', re.I)
+
+# Errors after which a nation taken off the queue is put back to be retried
+RETRY_ERRORS = (exceptions.NSSiteError, exceptions.AuthError, requests.RequestException)
+
+PageInfo = collections.namedtuple('PageInfo', ['error', 'endorsed', 'local_id'])
+PageInfo.__doc__ = """What a NationStates page tells about a request.
+
+    error (str): Site error message, None if there is no error
+    endorsed (bool): True if the page offers to withdraw an endorsement,
+    False if it offers to endorse, None if neither
+    local_id (str): Local id, None if the page does not contain it
+"""
+
+
+def _get_endorsed(action):
+    if action == 'unendorse':
+        return True
+    if action == 'endorse':
+        return False
+    return None
+
+
+def classify_page_bs4(html):
+    """Classify a page with BeautifulSoup.
+    Slow, used for markup classify_page can not handle.
+
+    Args:
+        html (str): Page HTML
+
+    Returns:
+        PageInfo: Page classification
+    """
+
+    soup = bs4.BeautifulSoup(html, 'html.parser')
+
+    error = None
+    error_elem = soup.find(name='p', attrs={'class': 'error'})
+    if error_elem is not None:
+        # An empty error element is still an error
+        error = error_elem.get_text()
+
+    endorsed = None
+    for value in ('unendorse', 'endorse'):
+        if soup.find(name='input', attrs={'name': 'action', 'value': value}):
+            endorsed = _get_endorsed(value)
+            break
+
+    local_id = None
+    local_id_elem = soup.find(name='input', attrs={'name': 'localid'})
+    if local_id_elem is not None:
+        local_id = local_id_elem.get('value')
+
+    return PageInfo(error, endorsed, local_id)
+
+
+def classify_page(html):
+    """Classify a page in one regex scan instead of parsing it.
+    Falls back to BeautifulSoup if the page has markup
+    the scan can not read reliably.
+
+    Args:
+        html (str): Page HTML
+
+    Returns:
+        PageInfo: Page classification
+    """
+
+    error = None
+    # Most pages have no error, a substring search rules them out quickly
+    match = ERROR_RE.search(html) if 'error' in html else None
+    if match is not None:
+        error = match.group(1)
+        if '<' in error:
+            # Nested markup, bs4 knows what text to keep
+            return classify_page_bs4(html)
+        error = html_lib.unescape(error)
+    elif 'error' in html and LOOSE_ERROR_RE.search(html):
+        return classify_page_bs4(html)
+
+    endorsed = None
+    local_id = None
+    for match in INPUT_RE.finditer(html):
+        value = INPUT_VALUE_RE.search(match.group(0))
+        if value is None:
+            return classify_page_bs4(html)
+        value = html_lib.unescape(next(group for group in value.groups() if group is not None))
+
+        if match.group(1).lower() == 'localid':
+            if local_id is None:
+                local_id = value
+        elif endorsed is None or value == 'unendorse':
+            endorsed = _get_endorsed(value)
+
+    return PageInfo(error, endorsed, local_id)
 
 
 def check_errors(resp):
@@ -15,22 +132,26 @@ def check_errors(resp):
     Args:
         resp (requests.Respond): Respond.
 
+    Returns:
+        PageInfo: Classification of the respond's page
+
     Raises:
         exceptions.NSSiteError: Contains error message.
+        exceptions.SessionError: The session has expired.
     """
 
     if resp.status_code != 200:
         raise exceptions.NSSiteError("""A HTTP error occured when connecting to NationStates website.
                                    HTTP status code: {}""".format(resp.status_code))
 
-    soup = bs4.BeautifulSoup(resp.text, 'html.parser')
-    error_elem = soup.find(name='p', attrs={'class': 'error'})
+    page = classify_page(resp.text)
 
-    if error_elem is None:
-        return
+    if page.error is None:
+        return page
+    elif SECURITY_CHECK_ERROR in page.error:
+        raise exceptions.SessionError("NationStates site error: {}".format(page.error))
     else:
-        error = error_elem.string
-        raise exceptions.NSSiteError("NationStates site error: {}".format(error))
+        raise exceptions.NSSiteError("NationStates site error: {}".format(page.error))
 
 
 class NSSite():
@@ -38,14 +159,101 @@ class NSSite():
 
     Args:
         user_agent (str): User agent
+        governor (ratelimit.Governor): Rate limit governor shared with the API
+        base_url (str): NationStates site URL
+        keepalive_interval (float): Seconds idle before the connection is kept
+        alive with a request, 0 disables it
+        metrics (instrumentation.Metrics): Metrics to record action latency in
     """
 
-    def __init__(self, user_agent):
+    def __init__(self, user_agent, governor=None, base_url=BASE_URL,
+                 keepalive_interval=connection.KEEPALIVE_INTERVAL, metrics=None):
         self.session = requests.Session()
         self.session.headers['user-agent'] = user_agent
+        self.governor = governor
+        self.base_url = base_url
+        self.metrics = metrics or instrumentation.NULL_METRICS
+        self.connections = connection.ConnectionManager(self.session, base_url, governor,
+                                                        keepalive_interval=keepalive_interval)
 
         self.local_id = None
 
+    def send(self, send_func, url, **kwargs):
+        """Send a request through the rate limit governor.
+
+        Args:
+            send_func (callable): Session method (e.g. session.get)
+            url (str): URL
+
+        Returns:
+            requests.Response: Response
+        """
+
+        self.connections.touch()
+        if self.governor is None:
+            return send_func(url, **kwargs)
+
+        self.governor.acquire(ratelimit.SITE)
+        try:
+            resp = send_func(url, **kwargs)
+        except Exception:
+            self.governor.update(ratelimit.SITE)
+            raise
+        finally:
+            self.connections.touch()
+
+        self.governor.update(ratelimit.SITE, resp.headers, resp.status_code)
+        return resp
+
+    def prepare_action(self, action, params):
+        """Build a POST request ahead of sending it.
+
+        Args:
+            action (str): URL
+            params (dict): Parameters.
+
+        Returns:
+            requests.PreparedRequest: Request to send with send_prepared
+        """
+
+        params = dict(params, localid=self.local_id)
+        request = requests.Request('POST', self.base_url + action, data=params)
+        return self.session.prepare_request(request)
+
+    def send_prepared(self, prepared):
+        """Send a request built by prepare_action.
+
+        Args:
+            prepared (requests.PreparedRequest): Request
+
+        Returns:
+            requests.Response: Response
+        """
+
+        settings = self.session.merge_environment_settings(prepared.url, {}, None, None, None)
+        with self.metrics.latency('site_execute'):
+            return self.send(self.session.send, prepared, **settings)
+
+    def get_session_state(self):
+        """Get what is needed to resume the logged in session later.
+
+        Returns:
+            dict: Local id and cookies
+        """
+
+        return {'local_id': self.local_id,
+                'cookies': requests.utils.dict_from_cookiejar(self.session.cookies)}
+
+    def restore_session_state(self, state):
+        """Resume a session saved by get_session_state.
+
+        Args:
+            state (dict): Session state
+        """
+
+        self.session.cookies.update(state['cookies'])
+        self.local_id = state['local_id']
+
     def set_local_id(self, pin):
         """Set local id acquired from a page that contains it.
         Args:
@@ -54,13 +262,13 @@ class NSSite():
 
         self.session.cookies['pin'] = pin
 
-        resp = self.session.get(LOCALID_URL)
-        check_errors(resp)
+        resp = self.send(self.session.get, self.base_url + LOCALID_PAGE)
+        page = check_errors(resp)
 
-        soup = bs4.BeautifulSoup(resp.text, 'html.parser')
-        local_id = soup.find(name='input', attrs={'name': 'localid'})['value']
+        if page.local_id is None:
+            raise exceptions.NSSiteError('Could not find local id in the settings page')
 
-        self.local_id = local_id
+        self.local_id = page.local_id
 
 
     def execute(self, action, params):
@@ -71,17 +279,16 @@ class NSSite():
             params (dict): Parameters.
 
         Returns:
-            str: Respond's HTML content
+            PageInfo: Classification of the respond's page
         """
 
         params['localid'] = self.local_id
-        url = ACTION_URL.format(action)
+        url = self.base_url + action
 
-        resp = self.session.post(url, data=params)
+        with self.metrics.latency('site_execute'):
+            resp = self.send(self.session.post, url, data=params)
 
-        check_errors(resp)
-
-        return resp.text
+        return check_errors(resp)
 
 
 class EndorseExecutor():
@@ -90,20 +297,45 @@ class EndorseExecutor():
     Args:
         ns_api (ns_endotarter.NS_API): NS API adapter
         ns_site (ns_endotarter.NSSite): NS main site interface
-        password (str): Password
+        session_store (ns_endotarter.SessionStore): Saves the logged in
+        session to reuse it on the next start
     """
 
-    def __init__(self, ns_api, ns_site):
+    def __init__(self, ns_api, ns_site, session_store=None):
         self.ns_api = ns_api
         self.ns_site = ns_site
+        self.session_store = session_store
+
+        self.password = None
 
     def setup_session(self, password):
-        """Setup a logged in NS session.
+        """Setup a logged in NS session. A saved session is reused
+        without checking it, endorse logs in again if it has expired.
+
+        Args:
+            password (str): Password
         """
 
-        pin = self.ns_api.login(password)
+        self.password = password
+
+        if self.session_store is not None:
+            state = self.session_store.load()
+            if state is not None:
+                self.ns_site.restore_session_state(state)
+                return
+
+        self.login()
+
+    def login(self):
+        """Log in and save the session.
+        """
+
+        pin = self.ns_api.login(self.password)
         self.ns_site.set_local_id(pin)
 
+        if self.session_store is not None:
+            self.session_store.save(self.ns_site.get_session_state())
+
     def endorse(self, nation):
         """Endorse a nation
 
@@ -112,14 +344,179 @@ class EndorseExecutor():
 
         Raises:
             exceptions.EndotarterError: Raises if failed to endorse a nation
+            exceptions.SessionError: The session had expired. It is logged in
+            again, the nation is endorsed by a later trigger.
         """
 
         params = {'nation': nation,
                   'action': 'endorse'}
 
-        html = self.ns_site.execute(action=ENDORSE_ACTION, params=params)
+        try:
+            page = self.ns_site.execute(action=ENDORSE_ACTION, params=params)
+        except exceptions.SessionError as err:
+            if self.password is None:
+                raise
+            # Each trigger sends one endorse action, so it is not sent again here
+            self.login()
+            raise exceptions.SessionError(
+                'Logged in again after the session expired, {} was not endorsed'.format(
+                    nation)) from err
+
+        if page.endorsed:
+            raise exceptions.EndotarterError('Could not endorse {}'.format(nation))
 
-        soup = bs4.BeautifulSoup(html, 'html.parser')
 
-        if soup.find(name='input', attrs={'name': 'action', 'value': 'unendorse'}):
-            raise exceptions.EndotarterError('Could not endorse {}'.format(nation))
+class AsyncEndorseExecutor():
+    """Endorse on an asyncio event loop without waiting for responses.
+
+    The request of the next queued nation is built ahead of time, so a
+    trigger only sends it. Responses are verified by a task off the
+    trigger's path: endorsements are recorded, nations that failed
+    because of a site or connection error go back to the queue. Every
+    trigger sends exactly one endorse action, failed ones are not
+    retried until a later trigger. If the session has expired, it logs
+    in again before the nation's next trigger.
+
+    Args:
+        ns_site (ns_endotarter.NSSite): NS main site interface
+        ns_data (ns_endotarter.Data): Data which holds the endorseable queue
+        max_in_flight (int): Max endorse requests waiting for a response
+        endorse_executor (EndorseExecutor): Logs in again when the session
+        has expired, None disables it
+    """
+
+    def __init__(self, ns_site, ns_data, max_in_flight=1, endorse_executor=None):
+        self.ns_site = ns_site
+        self.ns_data = ns_data
+        self.endorse_executor = endorse_executor
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_in_flight)
+
+        # Next nation and its prepared request
+        self.next = None
+        # Login in progress, shared by endorsements rejected by the same session
+        self.login_future = None
+        self.pending = set()
+        # Nations and errors of failed endorsements
+        self.failures = []
+
+    def prepare_next(self):
+        """Build the request of the nation at the front of the queue,
+        unless it is built already.
+        """
+
+        endorseable = self.ns_data.endorseable
+        if not endorseable:
+            self.next = None
+            return
+
+        nation = endorseable.peek()
+        if self.next is None or self.next[0] != nation:
+            params = {'nation': nation,
+                      'action': 'endorse'}
+            self.next = (nation, self.ns_site.prepare_action(ENDORSE_ACTION, params))
+
+    def trigger(self):
+        """Send one endorsement. Must be called from the event loop.
+
+        Returns:
+            asyncio.Task: Task which verifies the endorsement and returns
+            if it succeeded, None if there is no nation left to endorse
+        """
+
+        with self.ns_data.lock:
+            # The queue may have changed since the request was built
+            self.prepare_next()
+            if self.next is None:
+                return None
+
+            nation, prepared = self.next
+            self.next = None
+            self.ns_data.endorseable.pop()
+            local_id = self.ns_site.local_id
+
+        loop = asyncio.get_running_loop()
+        resp = loop.run_in_executor(self.pool, self.ns_site.send_prepared, prepared)
+        task = loop.create_task(self.verify(nation, resp, local_id))
+        self.pending.add(task)
+        task.add_done_callback(self.pending.discard)
+
+        loop.call_soon(self.prepare_next_locked)
+        return task
+
+    def prepare_next_locked(self):
+        """Build the next request holding the data lock, as the queue
+        may be changed by other threads.
+        """
+
+        with self.ns_data.lock:
+            self.prepare_next()
+
+    async def relogin(self, local_id):
+        """Log in again on a pool thread, unless a login since the
+        rejected request was sent has already renewed the session.
+        The prepared request is built again with the new session.
+
+        Args:
+            local_id (str): Local id the rejected request was sent with
+        """
+
+        if self.ns_site.local_id == local_id:
+            if self.login_future is None:
+                loop = asyncio.get_running_loop()
+                self.login_future = loop.run_in_executor(self.pool, self.endorse_executor.login)
+            login_future = self.login_future
+            try:
+                await login_future
+            finally:
+                if self.login_future is login_future:
+                    self.login_future = None
+
+        with self.ns_data.lock:
+            self.next = None
+            self.prepare_next()
+
+    async def verify(self, nation, resp, local_id=None):
+        """Check the response of an endorsement and record it.
+
+        Args:
+            nation (str): Endorsed nation's name
+            resp (asyncio.Future): Future of the response
+            local_id (str): Local id the request was sent with
+
+        Returns:
+            bool: True if the nation was endorsed
+        """
+
+        try:
+            page = check_errors(await resp)
+        except RETRY_ERRORS as e:
+            # Retry it next time
+            with self.ns_data.lock:
+                self.ns_data.endorseable.requeue(nation)
+            self.failures.append((nation, e))
+
+            if (isinstance(e, exceptions.SessionError) and self.endorse_executor is not None
+                    and self.endorse_executor.password is not None):
+                try:
+                    await self.relogin(local_id)
+                except (exceptions.EndotarterError, requests.RequestException) as login_error:
+                    self.failures.append((nation, login_error))
+            return False
+
+        if page.endorsed:
+            error = exceptions.EndotarterError('Could not endorse {}'.format(nation))
+            self.failures.append((nation, error))
+            return False
+
+        self.ns_data.record_endorsement(nation)
+        return True
+
+    async def drain(self):
+        """Wait until every sent endorsement is verified.
+        """
+
+        while self.pending:
+            await asyncio.wait(set(self.pending))
+
+    def close(self):
+        self.pool.shutdown()
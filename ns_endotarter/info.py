@@ -1,4 +1,12 @@
 DATA_DUMP_PATH = 'nations.xml.gz'
+DECOMPRESSED_DUMP_PATH = 'nations.xml'
+DUMP_INDEX_PATH = 'dump_index.json'
+ENDORSEMENT_DB_PATH = 'endorsements.sqlite3'
 CACHE_PATH = 'cache.json'
+JOURNAL_PATH = 'journal_{}.log'
+SESSION_PATH = 'session_{}.json'
+MEMBERS_CACHE_PATH = 'members_cache.json'
+METRICS_PATH = 'metrics.json'
+DAEMON_SOCKET_PATH = 'endotarter.sock'
 CONFIG_PATH = 'config.toml'
 DATA_DUMP_URL = 'https://www.nationstates.net/pages/nations.xml.gz'
\ No newline at end of file
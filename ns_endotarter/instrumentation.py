@@ -0,0 +1,333 @@
+import bisect
+import contextlib
+import json
+import os
+import re
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+
+# Upper bounds of latency histogram buckets in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+PROMETHEUS_PREFIX = 'endotarter_'
+JSON_FORMAT = 'json'
+PROMETHEUS_FORMAT = 'prometheus'
+
+METRIC_NAME_RE = re.compile(r'[^a-zA-Z0-9_]')
+
+# Bytes of a unit of max RSS reported by getrusage
+RSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+
+def get_metric_name(name):
+    return PROMETHEUS_PREFIX + METRIC_NAME_RE.sub('_', name)
+
+
+class Histogram():
+    """Counts of observed values within buckets.
+
+    Args:
+        buckets (tuple): Sorted upper bounds of buckets
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        # The last count is of values above every bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def to_dict(self):
+        return {'buckets': dict(zip([str(bound) for bound in self.buckets] + ['+Inf'],
+                                    self.counts)),
+                'sum': self.sum,
+                'count': self.count}
+
+
+class CountingReader():
+    """Count bytes and occurrences of a marker read from a file.
+
+    Args:
+        fileobj (file): File to read from
+        marker (bytes): Marker to count, e.g. the start tag of an item
+    """
+
+    def __init__(self, fileobj, marker):
+        self.fileobj = fileobj
+        self.marker = marker
+        self.bytes_num = 0
+        self.items_num = 0
+        # End of the last chunk, to count markers split between chunks
+        self._tail = b''
+
+    def read(self, size=-1):
+        chunk = self.fileobj.read(size)
+        data = chunk.encode() if isinstance(chunk, str) else chunk
+
+        self.items_num += data.count(self.marker)
+        overlap = len(self.marker) - 1
+        if overlap:
+            self.items_num += (self._tail + data[:overlap]).count(self.marker)
+            self._tail = (self._tail + data[-overlap:])[-overlap:]
+        self.bytes_num += len(data)
+
+        return chunk
+
+
+class Metrics():
+    """Collects timings, latency histograms, scan throughput and
+    peak memory of a session, and exports them.
+
+    Args:
+        clock (callable): Monotonic clock
+        trace_memory (bool): Trace memory allocated by Python to measure peak
+        memory instead of reading the max RSS of the process. Exact, but slows
+        the measured code down several times and counts allocations of every thread.
+    """
+
+    enabled = True
+
+    def __init__(self, clock=time.perf_counter, trace_memory=False):
+        self.clock = clock
+        self.trace_memory = trace_memory
+        # Name -> seconds
+        self.timers = {}
+        # Name -> Histogram
+        self.histograms = {}
+        # Name -> value
+        self.gauges = {}
+
+    def record_time(self, name, seconds):
+        self.timers[name] = self.timers.get(name, 0.0) + seconds
+
+    def observe(self, name, value):
+        if name not in self.histograms:
+            self.histograms[name] = Histogram()
+        self.histograms[name].observe(value)
+
+    def set_gauge(self, name, value):
+        self.gauges[name] = value
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        """Add the time spent in the block to a timer.
+
+        Args:
+            name (str): Timer name
+        """
+
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.record_time(name, self.clock() - start)
+
+    @contextlib.contextmanager
+    def latency(self, name):
+        """Observe the time spent in the block in a latency histogram.
+
+        Args:
+            name (str): Histogram name
+        """
+
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.observe(name, self.clock() - start)
+
+    def peak_memory(self, name):
+        """Record memory use of the block: the max RSS of the process after
+        it and how much the block raised it, or with trace_memory the peak
+        memory allocated by Python during it.
+
+        Args:
+            name (str): Gauge name, '_max_rss_bytes' and '_max_rss_increase_bytes',
+            or '_peak_bytes' is appended
+        """
+
+        if self.trace_memory:
+            return self.trace_peak_memory(name)
+        return self.max_rss(name)
+
+    @contextlib.contextmanager
+    def max_rss(self, name):
+        """Record the max RSS of the process after the block and how much
+        the block raised it. Reading it costs nothing while the block runs.
+        The max RSS is the peak of the whole process so far, so the increase
+        is 0 if the process used more memory earlier, however much the block
+        used, and it includes memory of other threads.
+
+        Args:
+            name (str): Gauge name, '_max_rss_bytes' and '_max_rss_increase_bytes'
+            are appended
+        """
+
+        if resource is None:
+            yield
+            return
+
+        start = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        try:
+            yield
+        finally:
+            end = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            self.set_gauge(name + '_max_rss_bytes', end * RSS_UNIT)
+            self.set_gauge(name + '_max_rss_increase_bytes', (end - start) * RSS_UNIT)
+
+    @contextlib.contextmanager
+    def trace_peak_memory(self, name):
+        """Record the peak memory allocated by Python during the block.
+
+        Args:
+            name (str): Gauge name, '_peak_bytes' is appended
+        """
+
+        was_tracing = tracemalloc.is_tracing()
+        if was_tracing:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        else:
+            tracemalloc.start()
+            base = 0
+
+        try:
+            yield
+        finally:
+            peak = tracemalloc.get_traced_memory()[1] - base
+            if not was_tracing:
+                tracemalloc.stop()
+            self.set_gauge(name + '_peak_bytes', peak)
+
+    @contextlib.contextmanager
+    def scan(self, name, fileobj, marker):
+        """Measure the throughput of scanning a file.
+
+        Args:
+            name (str): Scan name
+            fileobj (file): File to be scanned
+            marker (bytes): Marker to count items by
+
+        Yields:
+            CountingReader: File to scan instead of fileobj
+        """
+
+        reader = CountingReader(fileobj, marker)
+        start = self.clock()
+        try:
+            yield reader
+        finally:
+            seconds = self.clock() - start
+            self.record_time(name, seconds)
+            self.set_gauge(name + '_bytes', reader.bytes_num)
+            self.set_gauge(name + '_items', reader.items_num)
+            # Tracing memory slows the scan down, its rate would be misleading
+            if seconds > 0 and not tracemalloc.is_tracing():
+                self.set_gauge(name + '_mb_per_second', reader.bytes_num / seconds / 1024 / 1024)
+                self.set_gauge(name + '_items_per_second', reader.items_num / seconds)
+
+    def to_dict(self):
+        return {'timers': dict(self.timers),
+                'histograms': {name: histogram.to_dict()
+                               for name, histogram in self.histograms.items()},
+                'gauges': dict(self.gauges)}
+
+    def to_prometheus(self):
+        """Format metrics in Prometheus text format.
+
+        Returns:
+            str: Metrics
+        """
+
+        lines = []
+        for name, seconds in self.timers.items():
+            metric = get_metric_name(name) + '_seconds'
+            lines.append('# TYPE {} gauge'.format(metric))
+            lines.append('{} {}'.format(metric, seconds))
+
+        for name, histogram in self.histograms.items():
+            metric = get_metric_name(name) + '_seconds'
+            lines.append('# TYPE {} histogram'.format(metric))
+            cumulative = 0
+            for bound, count in zip([str(bound) for bound in histogram.buckets] + ['+Inf'],
+                                    histogram.counts):
+                cumulative += count
+                lines.append('{}_bucket{{le="{}"}} {}'.format(metric, bound, cumulative))
+            lines.append('{}_sum {}'.format(metric, histogram.sum))
+            lines.append('{}_count {}'.format(metric, histogram.count))
+
+        for name, value in self.gauges.items():
+            metric = get_metric_name(name)
+            lines.append('# TYPE {} gauge'.format(metric))
+            lines.append('{} {}'.format(metric, value))
+
+        return '\n'.join(lines) + '\n'
+
+    def export(self, file_path, export_format=JSON_FORMAT):
+        """Write metrics to a file. The file is replaced at once
+        so a Prometheus textfile collector never reads it half written.
+
+        Args:
+            file_path (str): File path
+            export_format (str): JSON_FORMAT or PROMETHEUS_FORMAT
+        """
+
+        if export_format == JSON_FORMAT:
+            content = json.dumps(self.to_dict(), indent=2)
+        elif export_format == PROMETHEUS_FORMAT:
+            content = self.to_prometheus()
+        else:
+            raise ValueError('Unknown metrics format: {}'.format(export_format))
+
+        tmp_path = file_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(content)
+        os.replace(tmp_path, file_path)
+
+
+class NullMetrics():
+    """Metrics that record nothing, used when instrumentation is disabled.
+    """
+
+    enabled = False
+
+    def record_time(self, name, seconds):
+        pass
+
+    def observe(self, name, value):
+        pass
+
+    def set_gauge(self, name, value):
+        pass
+
+    def timer(self, name):
+        return NULL_CONTEXT
+
+    def latency(self, name):
+        return NULL_CONTEXT
+
+    def peak_memory(self, name):
+        return NULL_CONTEXT
+
+    def scan(self, name, fileobj, marker):
+        return contextlib.nullcontext(fileobj)
+
+    def export(self, file_path, export_format=JSON_FORMAT):
+        pass
+
+
+NULL_CONTEXT = contextlib.nullcontext()
+NULL_METRICS = NullMetrics()
@@ -0,0 +1,82 @@
+import os
+
+
+# Number of appended entries between two fsyncs
+SYNC_EVERY = 10
+
+
+class Journal():
+    """Append-only journal of endorsed nations. Each entry is flushed
+    to the OS right away so it survives a crash of the program,
+    while fsyncs are batched.
+
+    Args:
+        file_path (str): Journal file path
+        sync_every (int): Number of entries between fsyncs
+    """
+
+    def __init__(self, file_path, sync_every=SYNC_EVERY):
+        self.file_path = file_path
+        self.sync_every = sync_every
+
+        self.file = None
+        self.unsynced_num = 0
+
+    def replay(self):
+        """Read all complete entries of the journal.
+
+        Returns:
+            list: Endorsed nations in order
+        """
+
+        if not os.path.exists(self.file_path):
+            return []
+
+        with open(self.file_path, 'rb') as f:
+            content = f.read()
+
+        # The last entry may be torn by a crash
+        end = content.rfind(b'\n') + 1
+        return content[:end].decode().splitlines()
+
+    def append(self, nation):
+        """Record an endorsed nation.
+
+        Args:
+            nation (str): Nation's name
+        """
+
+        if self.file is None:
+            self.file = open(self.file_path, 'ab')
+
+        self.file.write(nation.encode() + b'\n')
+        self.file.flush()
+
+        self.unsynced_num += 1
+        if self.unsynced_num >= self.sync_every:
+            self.sync()
+
+    def sync(self):
+        """Force written entries to disk.
+        """
+
+        if self.file is not None and self.unsynced_num:
+            os.fsync(self.file.fileno())
+            self.unsynced_num = 0
+
+    def clear(self):
+        """Remove all entries after they have been compacted into the cache.
+        """
+
+        self.close()
+        if os.path.exists(self.file_path):
+            os.remove(self.file_path)
+
+    def close(self):
+        """Sync and close the journal file.
+        """
+
+        if self.file is not None:
+            self.sync()
+            self.file.close()
+            self.file = None
@@ -0,0 +1,307 @@
+import re
+import threading
+import time
+
+from ns_endotarter import api_adapter
+from ns_endotarter import ratelimit
+from ns_endotarter import utils
+
+
+# Happenings that change WA or region membership
+HAPPENINGS_FILTERS = ['member', 'move', 'founding', 'cte', 'eject']
+# Max seconds since the last sync to catch up from happenings
+MAX_DELTA_AGE = 6 * 60 * 60
+# Seconds of happenings before the last sync to read again in case of late events
+SYNC_OVERLAP = 60
+# Seconds between syncs of the background pruner
+PRUNE_INTERVAL = 60
+# API requests of a rate limit window left for others, the pruner waits otherwise
+PRUNE_RESERVE = 10
+
+WA_ADMITTED_RE = re.compile(r'^@@(.+?)@@ was admitted to the World Assembly')
+WA_LEFT_RE = re.compile(r'^@@(.+?)@@ (?:resigned from the World Assembly|was ejected from the WA)')
+MOVED_RE = re.compile(r'^@@(.+?)@@ relocated from %%(.+?)%% to %%(.+?)%%')
+FOUNDED_RE = re.compile(r'^@@(.+?)@@ was (?:re)?founded in %%(.+?)%%')
+CEASED_RE = re.compile(r'^@@(.+?)@@ ceased to exist')
+EJECTED_RE = re.compile(r'^@@(.+?)@@ was ejected (?:and banned )?from %%(.+?)%%')
+
+
+class MembershipSync():
+    """WA members and members of my region, cached locally and
+    brought up to date from the happenings of my region. Both sets
+    are fetched in full when the last sync is older than max_delta_age
+    or when there are more happenings than one request returns.
+
+    Happenings of my region do not show WA admissions elsewhere, so
+    WA status of nations moving in or founded in my region is requested
+    for each of them. Syncing is safe from several threads.
+
+    Args:
+        api (NS_API): NationStates API adapter
+        cache (Cache): File cache object
+        my_region (str): My region name
+        max_delta_age (int): Max seconds since the last sync to catch up from happenings
+    """
+
+    def __init__(self, api, cache, my_region, max_delta_age=MAX_DELTA_AGE):
+        self.api = api
+        self.cache = cache
+        self.my_region = my_region
+        self.max_delta_age = max_delta_age
+
+        self.wa_members = set()
+        self.region_members = set()
+        # UNIX timestamp of the last sync
+        self.synced_time = None
+        # Held while member sets are read or changed
+        self.lock = threading.RLock()
+
+    @property
+    def region_wa_members(self):
+        """WA members of my region.
+        """
+
+        with self.lock:
+            return self.wa_members & self.region_members
+
+    def get_members(self):
+        """Get copies of the member sets.
+
+        Returns:
+            tuple: WA members and members of my region
+        """
+
+        with self.lock:
+            return set(self.wa_members), set(self.region_members)
+
+    def load(self):
+        """Load member sets from cache if they have not been loaded.
+        """
+
+        with self.lock:
+            if self.synced_time is not None:
+                return
+
+            synced_key = 'synced_time:{}'.format(self.my_region)
+            if self.cache.load() and synced_key in self.cache:
+                self.wa_members = set(self.cache['wa_members'])
+                self.region_members = set(self.cache['region_members:{}'.format(self.my_region)])
+                self.synced_time = self.cache[synced_key]
+
+    def save(self):
+        """Save member sets to cache.
+        """
+
+        with self.lock:
+            self.cache['wa_members'] = list(self.wa_members)
+            self.cache['region_members:{}'.format(self.my_region)] = list(self.region_members)
+            self.cache['synced_time:{}'.format(self.my_region)] = self.synced_time
+            self.cache.save()
+
+    def fetch_all(self):
+        """Fetch both member sets in full.
+        """
+
+        self.wa_members = self.api.get_wa_members()
+        self.region_members = self.api.get_region_members()
+
+    def apply_event(self, text):
+        """Apply a happening to the member sets.
+
+        Args:
+            text (str): Happening text
+
+        Returns:
+            str: Nation which moved in or was founded in my region, None otherwise
+        """
+
+        match = WA_ADMITTED_RE.match(text)
+        if match:
+            self.wa_members.add(utils.canonical(match.group(1)))
+            return None
+
+        match = WA_LEFT_RE.match(text)
+        if match:
+            self.wa_members.discard(utils.canonical(match.group(1)))
+            return None
+
+        match = MOVED_RE.match(text)
+        if match:
+            nation = utils.canonical(match.group(1))
+            if utils.canonical(match.group(3)) == self.my_region:
+                self.region_members.add(nation)
+                return nation
+            elif utils.canonical(match.group(2)) == self.my_region:
+                self.region_members.discard(nation)
+            return None
+
+        match = FOUNDED_RE.match(text)
+        if match:
+            if utils.canonical(match.group(2)) == self.my_region:
+                nation = utils.canonical(match.group(1))
+                self.region_members.add(nation)
+                return nation
+            return None
+
+        match = CEASED_RE.match(text)
+        if match:
+            nation = utils.canonical(match.group(1))
+            self.wa_members.discard(nation)
+            self.region_members.discard(nation)
+            return
+
+        match = EJECTED_RE.match(text)
+        if match:
+            if utils.canonical(match.group(2)) == self.my_region:
+                self.region_members.discard(utils.canonical(match.group(1)))
+
+        return None
+
+    def resolve_wa_status(self, nations):
+        """Request WA status of nations, one request each.
+
+        Args:
+            nations (iterable): Nation names
+        """
+
+        for nation in nations:
+            if self.api.is_wa_member(nation):
+                self.wa_members.add(nation)
+            else:
+                self.wa_members.discard(nation)
+
+    def sync(self):
+        """Bring member sets up to date.
+
+        Returns:
+            tuple: Nations that joined and left WA members of my region
+            since the last sync, None if the sets were fetched in full
+        """
+
+        with self.lock:
+            current_time = int(time.time())
+            self.load()
+
+            changes = None
+            if self.synced_time is None or current_time - self.synced_time > self.max_delta_age:
+                self.fetch_all()
+            else:
+                events = self.api.get_happenings(HAPPENINGS_FILTERS,
+                                                 self.synced_time - SYNC_OVERLAP,
+                                                 self.my_region)
+                # Older events may have been cut off
+                if len(events) >= api_adapter.HAPPENINGS_LIMIT:
+                    self.fetch_all()
+                else:
+                    before = self.region_wa_members
+                    arrivals = set()
+                    for timestamp, text in events:
+                        nation = self.apply_event(text)
+                        if nation is not None:
+                            arrivals.add(nation)
+                    # Nations which arrived and are still here
+                    self.resolve_wa_status(arrivals & self.region_members)
+                    after = self.region_wa_members
+                    changes = (after - before, before - after)
+
+            self.synced_time = current_time
+            self.save()
+            return changes
+
+
+class MembershipPruner():
+    """Sync member sets in the background during a session and drop
+    nations which left the WA or my region from the endorse queue
+    before they are tried, which would only end in an error page.
+
+    Args:
+        member_sync (MembershipSync): Member sets to sync
+        ns_data (Data): Data which holds the endorse queue
+        governor (ratelimit.Governor): Rate limit governor of the API
+        interval (float): Seconds between syncs
+        reserve (int): API requests of a rate limit window left for others
+    """
+
+    def __init__(self, member_sync, ns_data, governor=None, interval=PRUNE_INTERVAL,
+                 reserve=PRUNE_RESERVE):
+        self.member_sync = member_sync
+        self.ns_data = ns_data
+        self.governor = governor
+        self.interval = interval
+        self.reserve = reserve
+
+        # Queued nations dropped, each an endorse request saved
+        self.pruned_num = 0
+        self.syncs_num = 0
+        self.skipped_num = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def prune(self):
+        """Sync member sets and apply the changes to the endorse queue.
+
+        Returns:
+            int: Number of queued nations dropped
+        """
+
+        if self.governor is not None:
+            free, limit, window = self.governor.get_capacity(ratelimit.API)
+            if free <= self.reserve:
+                self.skipped_num += 1
+                return 0
+
+        # Syncs of other threads must not fall between before and after
+        with self.member_sync.lock:
+            self.member_sync.load()
+            before = self.member_sync.region_wa_members
+            changes = self.member_sync.sync()
+            if changes is None:
+                after = self.member_sync.region_wa_members
+                changes = (after - before, before - after)
+        self.syncs_num += 1
+
+        joined, left = changes
+        with self.ns_data.lock:
+            pruned_num = sum(1 for nation in left if nation in self.ns_data.endorseable)
+            self.ns_data.gen_endorseable(changes=(joined, left))
+
+        self.pruned_num += pruned_num
+        return pruned_num
+
+    def run(self):
+        """Prune until stop is called.
+        """
+
+        while not self._stop.wait(self.interval):
+            try:
+                self.prune()
+            except Exception as err:
+                # The queue is only less fresh, endorsing goes on
+                print('Syncing members failed: {}: {}'.format(type(err).__name__, err))
+
+    def start(self):
+        """Start pruning in a background thread.
+        """
+
+        if not self.interval or self._thread is not None:
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread.
+        """
+
+        if self._thread is None:
+            return
+
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def get_metrics(self):
+        return {'pruned': self.pruned_num,
+                'syncs': self.syncs_num,
+                'skipped': self.skipped_num}
@@ -0,0 +1,47 @@
+import collections
+import concurrent.futures
+import time
+
+
+# A stage function is called with the results of its dependencies in order
+Stage = collections.namedtuple('Stage', ['func', 'deps'])
+
+
+def run_stages(stages, max_workers=None):
+    """Run stages as a dependency graph on a thread pool.
+    Independent stages run concurrently.
+
+    Args:
+        stages (dict): Stage name -> Stage, with dependencies
+        listed before the stages that need them
+        max_workers (int): Max number of threads, defaults to one per stage
+
+    Raises:
+        ValueError: A stage depends on a stage not listed before it
+
+    Returns:
+        tuple: Stage name -> result and stage name -> duration in seconds
+    """
+
+    futures = {}
+    durations = {}
+
+    def run(name, stage):
+        args = [futures[dep].result() for dep in stage.deps]
+        start = time.perf_counter()
+        result = stage.func(*args)
+        durations[name] = time.perf_counter() - start
+        return result
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers or len(stages)) as pool:
+        for name, stage in stages.items():
+            for dep in stage.deps:
+                if dep not in futures:
+                    raise ValueError('Stage {} depends on unknown stage {}'.format(name, dep))
+            # Dependencies are submitted first so a waiting
+            # stage never holds up the stages it waits for
+            futures[name] = pool.submit(run, name, stage)
+
+        results = {name: future.result() for name, future in futures.items()}
+
+    return results, durations
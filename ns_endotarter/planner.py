@@ -0,0 +1,113 @@
+import collections
+import math
+import os
+
+from ns_endotarter import ratelimit
+
+
+DUMP = 'dump'
+API = 'api'
+
+# Typical seconds of one API request
+API_REQUEST_SECONDS = 0.3
+# API requests sent at once by the fetch loop
+API_WORKERS = 4
+# Compressed data dump bytes scanned per second
+DUMP_SCAN_RATE = 15 * 1024 * 1024
+# Compressed data dump bytes downloaded per second
+DUMP_DOWNLOAD_RATE = 5 * 1024 * 1024
+# Compressed data dump size assumed before it is first downloaded
+DUMP_SIZE = 60 * 1024 * 1024
+# Seconds to read a region from a dump index or endorsement database
+INDEX_LOOKUP_SECONDS = 0.05
+
+# Chosen source and the estimated seconds of each source
+Plan = collections.namedtuple('Plan', ['source', 'api_seconds', 'dump_seconds'])
+
+
+class SourcePlanner():
+    """Choose where to get endorsed nations from. The data dump
+    costs the same for every region, while asking the API for each
+    WA member of my region costs one rate limited request per nation.
+
+    Args:
+        governor (ratelimit.Governor): Rate limit governor of the API
+        cache (Cache): Cache object, tells if the data dump is up-to-date
+        dump_path (str): Data dump file path
+        api_request_seconds (float): Typical seconds of one API request
+        api_workers (int): API requests sent at once
+        dump_scan_rate (float): Compressed dump bytes scanned per second
+        dump_download_rate (float): Compressed dump bytes downloaded per second
+    """
+
+    def __init__(self, governor, cache, dump_path, api_request_seconds=API_REQUEST_SECONDS,
+                 api_workers=API_WORKERS, dump_scan_rate=DUMP_SCAN_RATE,
+                 dump_download_rate=DUMP_DOWNLOAD_RATE):
+        self.governor = governor
+        self.cache = cache
+        self.dump_path = dump_path
+        self.api_request_seconds = api_request_seconds
+        self.api_workers = api_workers
+        self.dump_scan_rate = dump_scan_rate
+        self.dump_download_rate = dump_download_rate
+
+    def estimate_api(self, requests_num):
+        """Estimate seconds to send API requests, including
+        waiting for the rate limit.
+
+        Args:
+            requests_num (int): Number of requests
+
+        Returns:
+            float: Estimated seconds
+        """
+
+        send_time = math.ceil(requests_num / self.api_workers) * self.api_request_seconds
+
+        free, limit, window = self.governor.get_capacity(ratelimit.API)
+        if requests_num <= free:
+            return send_time
+
+        # Each further window lets another limit of requests through
+        windows_num = math.ceil((requests_num - free) / limit)
+        return max(send_time, windows_num * window)
+
+    def estimate_dump(self, is_indexed=False):
+        """Estimate seconds to get endorsed nations from the data dump.
+
+        Args:
+            is_indexed (bool): An up-to-date dump index or endorsement database exists
+
+        Returns:
+            float: Estimated seconds
+        """
+
+        if is_indexed:
+            return INDEX_LOOKUP_SECONDS
+
+        if os.path.exists(self.dump_path):
+            size = os.path.getsize(self.dump_path)
+        else:
+            size = DUMP_SIZE
+
+        seconds = size / self.dump_scan_rate
+        if not self.cache.is_file_updated(self.dump_path):
+            seconds += size / self.dump_download_rate
+
+        return seconds
+
+    def plan(self, targets_num, is_indexed=False):
+        """Choose the cheaper source.
+
+        Args:
+            targets_num (int): Nations whose endorsements the API would be asked for
+            is_indexed (bool): An up-to-date dump index or endorsement database exists
+
+        Returns:
+            Plan: Chosen source and estimates
+        """
+
+        api_seconds = self.estimate_api(targets_num)
+        dump_seconds = self.estimate_dump(is_indexed)
+        source = API if api_seconds < dump_seconds else DUMP
+        return Plan(source, api_seconds, dump_seconds)
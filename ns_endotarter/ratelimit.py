@@ -0,0 +1,261 @@
+import collections
+import re
+import threading
+import time
+
+
+API = 'api'
+SITE = 'site'
+
+# Budget name -> (max requests, window in seconds).
+# The API allows 50 requests per 30 seconds.
+DEFAULT_BUDGETS = {API: (50, 30),
+                   SITE: (30, 30)}
+
+# Seconds to wait after a 429 response without Retry-After
+DEFAULT_RETRY_AFTER = 30
+
+POLICY_RE = re.compile(r'^\s*(\d+)\s*;\s*w=(\d+)')
+RETRY_AFTER_RE = re.compile(r'Retry-After: (\d+)')
+
+
+def parse_retry_after(message):
+    """Get the Retry-After seconds from a rate limit error message.
+
+    Args:
+        message (str): Error message
+
+    Returns:
+        int: Seconds to wait
+    """
+
+    match = RETRY_AFTER_RE.search(message)
+    if match is None:
+        return DEFAULT_RETRY_AFTER
+
+    return int(match.group(1))
+
+
+class Budget():
+    """Requests allowed within a sliding time window. Unlike a
+    refilling bucket it never lets a burst exceed the limit
+    within any window, which is how NationStates counts requests.
+
+    Args:
+        limit (int): Max requests within a window
+        window (float): Window length in seconds
+    """
+
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+
+        # Times requests were sent at
+        self.sent = collections.deque()
+        self.blocked_until = 0
+        self.in_flight = 0
+
+        self.requests_num = 0
+        self.waits_num = 0
+        self.wait_time = 0.0
+        self.throttled_num = 0
+
+    def prune(self, now):
+        while self.sent and self.sent[0] <= now - self.window:
+            self.sent.popleft()
+
+    def get_delay(self, now):
+        """Get seconds to wait before a request can be sent.
+
+        Args:
+            now (float): Current time
+
+        Returns:
+            float: Seconds to wait, 0 if a request can be sent now
+        """
+
+        self.prune(now)
+        delay = self.blocked_until - now
+        if len(self.sent) >= self.limit:
+            delay = max(delay, self.sent[len(self.sent) - self.limit] + self.window - now)
+
+        return max(delay, 0)
+
+    def take(self, now):
+        self.sent.append(now)
+        self.in_flight += 1
+        self.requests_num += 1
+
+    def sync(self, now, remaining, reset):
+        """Match the budget with what the server reports.
+        Only ever makes the budget stricter.
+
+        Args:
+            now (float): Current time
+            remaining (int): Requests left in the server's window
+            reset (float): Seconds until the server's window resets
+        """
+
+        if remaining <= 0:
+            self.blocked_until = max(self.blocked_until, now + reset)
+            return
+
+        self.prune(now)
+        free = self.limit - len(self.sent)
+        # Other requests in flight are not counted by the server yet
+        server_free = remaining - max(self.in_flight, 0)
+        if free <= server_free:
+            return
+
+        # Count phantom requests that expire when the server's window resets
+        for _ in range(free - server_free):
+            self.sent.append(now + reset - self.window)
+        self.sent = collections.deque(sorted(self.sent))
+
+    def get_metrics(self):
+        return {'requests': self.requests_num,
+                'waits': self.waits_num,
+                'wait_time': self.wait_time,
+                'throttled': self.throttled_num}
+
+
+class Governor():
+    """Rate limit governor shared by every path that sends requests
+    to NationStates. Each budget is tightened by the rate limit
+    headers and Retry-After of responses.
+
+    Args:
+        budgets (dict): Budget name -> (max requests, window in seconds)
+        clock (callable): Monotonic clock
+        sleep (callable): Sleep function
+    """
+
+    def __init__(self, budgets=None, clock=time.monotonic, sleep=time.sleep):
+        budgets = budgets or DEFAULT_BUDGETS
+        self.budgets = {name: Budget(limit, window) for name, (limit, window) in budgets.items()}
+        self.clock = clock
+        self.sleep = sleep
+        self.lock = threading.Lock()
+
+    def acquire(self, name):
+        """Wait until a request can be sent within a budget.
+
+        Args:
+            name (str): Budget name
+
+        Returns:
+            float: Seconds waited
+        """
+
+        budget = self.budgets[name]
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = self.clock()
+                delay = budget.get_delay(now)
+                if delay <= 0:
+                    budget.take(now)
+                    if waited:
+                        budget.waits_num += 1
+                        budget.wait_time += waited
+                    return waited
+
+            self.sleep(delay)
+            waited += delay
+
+    def try_acquire(self, name, reserve=0):
+        """Take a request from a budget only if it can be sent now.
+        For optional requests that should never delay others.
+
+        Args:
+            name (str): Budget name
+            reserve (int): Requests of the window to leave for others
+
+        Returns:
+            bool: True if the request can be sent
+        """
+
+        budget = self.budgets[name]
+        with self.lock:
+            now = self.clock()
+            if budget.get_delay(now) > 0 or len(budget.sent) + reserve >= budget.limit:
+                return False
+
+            budget.take(now)
+            return True
+
+    def get_capacity(self, name):
+        """Get how many requests a budget lets through.
+
+        Args:
+            name (str): Budget name
+
+        Returns:
+            tuple: Requests that can be sent now, max requests
+            within a window and window length in seconds
+        """
+
+        budget = self.budgets[name]
+        with self.lock:
+            now = self.clock()
+            free = 0
+            if budget.get_delay(now) <= 0:
+                free = budget.limit - len(budget.sent)
+
+            return free, budget.limit, budget.window
+
+    def update(self, name, headers=None, status_code=None):
+        """Report a finished request and adjust the budget
+        to the rate limit headers of its response.
+
+        Args:
+            name (str): Budget name
+            headers (dict): Response headers, None if the request failed
+            status_code (int): Response HTTP status code
+        """
+
+        budget = self.budgets[name]
+        headers = headers or {}
+
+        with self.lock:
+            now = self.clock()
+            budget.in_flight -= 1
+
+            policy = POLICY_RE.match(headers.get('RateLimit-Policy', ''))
+            if policy:
+                budget.limit = int(policy.group(1))
+                budget.window = int(policy.group(2))
+
+            retry_after = headers.get('Retry-After')
+            if status_code == 429:
+                budget.throttled_num += 1
+                seconds = int(retry_after) if retry_after else DEFAULT_RETRY_AFTER
+                budget.blocked_until = max(budget.blocked_until, now + seconds)
+
+            remaining = headers.get('RateLimit-Remaining')
+            if remaining is not None:
+                reset = float(headers.get('RateLimit-Reset', budget.window))
+                budget.sync(now, int(remaining), reset)
+
+    def block(self, name, seconds):
+        """Stop sending requests within a budget for some time.
+
+        Args:
+            name (str): Budget name
+            seconds (float): Seconds to wait
+        """
+
+        budget = self.budgets[name]
+        with self.lock:
+            budget.throttled_num += 1
+            budget.blocked_until = max(budget.blocked_until, self.clock() + seconds)
+
+    def get_metrics(self):
+        """Get request and waiting statistics.
+
+        Returns:
+            dict: Budget name -> statistics
+        """
+
+        with self.lock:
+            return {name: budget.get_metrics() for name, budget in self.budgets.items()}
@@ -0,0 +1,72 @@
+import json
+import os
+import stat
+import time
+
+
+# Only the owner may read or write a saved session
+FILE_MODE = 0o600
+
+
+class SessionStore():
+    """Saves a logged in NationStates site session (PIN, cookies
+    and local id) to reuse it on the next start instead of logging in.
+
+    Args:
+        file_path (str): Session file path
+        nation (str): Nation the session belongs to
+    """
+
+    def __init__(self, file_path, nation):
+        self.file_path = file_path
+        self.nation = nation
+
+    def load(self):
+        """Load the saved session.
+
+        Returns:
+            dict: Session state, None if there is no usable saved session
+        """
+
+        try:
+            file_stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            return None
+
+        # Do not trust a session others could have read or replaced
+        if os.name == 'posix' and file_stat.st_mode & (stat.S_IRWXG | stat.S_IRWXO):
+            return None
+
+        try:
+            with open(self.file_path) as f:
+                saved = json.load(f)
+        except ValueError:
+            return None
+
+        if saved.get('nation') != self.nation:
+            return None
+
+        return saved['session']
+
+    def save(self, session):
+        """Save a session. The file is created with owner-only
+        permissions before anything is written to it.
+
+        Args:
+            session (dict): Session state
+        """
+
+        tmp_path = self.file_path + '.tmp'
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, FILE_MODE)
+        with os.fdopen(fd, 'w') as f:
+            if os.name == 'posix':
+                # The file may have existed with other permissions
+                os.fchmod(f.fileno(), FILE_MODE)
+            json.dump({'nation': self.nation,
+                       'saved_time': int(time.time()),
+                       'session': session}, f)
+        os.replace(tmp_path, self.file_path)
+
+    def clear(self):
+        if os.path.exists(self.file_path):
+            os.remove(self.file_path)
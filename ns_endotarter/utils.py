@@ -1,13 +1,32 @@
 import os
+import io
+import json
+import queue
 import shutil
 import gzip
+import tempfile
+import threading
+import zlib
 
 import toml
 import requests
 
+from ns_endotarter import exceptions
 from ns_endotarter import info
 
 
+# Max size of a decompressed buffer of ThreadedGzipReader
+DECOMPRESS_BUFFER_SIZE = 1024 * 1024
+# Decompressed buffers ThreadedGzipReader can hold before waiting
+DECOMPRESS_QUEUE_DEPTH = 8
+# zlib window bits to accept a gzip header
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+# Buffer size to write the downloaded data dump with
+DOWNLOAD_BUFFER_SIZE = 1024 * 1024
+# Suffix of the file that keeps HTTP metadata of the data dump
+DUMP_META_SUFFIX = '.meta.json'
+
+
 def load_config(file_path):
     with open(file_path) as f:
         return toml.load(f)
@@ -27,21 +46,351 @@ def canonical(name):
     return name.lower().replace(' ', '_')
 
 
-def load_dump(file_path):
+class ThreadedGzipReader(io.RawIOBase):
+    """Read-only gzip file that is decompressed on a background thread.
+    zlib releases the GIL so decompression overlaps with parsing.
+    Closing the reader stops decompression.
+
+    Args:
+        fileobj (file): Compressed file object opened in binary mode
+        buffer_size (int): Max size of a decompressed buffer
+        queue_depth (int): Decompressed buffers to hold before waiting
+    """
+
+    def __init__(self, fileobj, buffer_size=DECOMPRESS_BUFFER_SIZE,
+                 queue_depth=DECOMPRESS_QUEUE_DEPTH):
+        super().__init__()
+
+        self.fileobj = fileobj
+        self.buffer_size = buffer_size
+        self.queue = queue.Queue(queue_depth)
+
+        self._buf = b''
+        self._pos = 0
+        self._is_eof = False
+        self._error = None
+        self._stop_event = threading.Event()
+
+        self.thread = threading.Thread(target=self._decompress, daemon=True)
+        self.thread.start()
+
+    def _put(self, item):
+        """Put an item in the queue unless the reader is closed.
+
+        Returns:
+            bool: True if the item was put, False if the reader is closed
+        """
+
+        while not self._stop_event.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+
+        return False
+
+    def _decompress(self):
+        """Producer thread. Decompress chunks of the file into the queue.
+        """
+
+        try:
+            decompressor = zlib.decompressobj(GZIP_WBITS)
+            while not self._stop_event.is_set():
+                chunk = self.fileobj.read(self.buffer_size)
+                if not chunk:
+                    break
+
+                while chunk:
+                    result = decompressor.decompress(chunk, self.buffer_size)
+                    if result and not self._put(result):
+                        return
+
+                    # A gzip file can have several members
+                    if decompressor.eof:
+                        chunk = decompressor.unused_data
+                        decompressor = zlib.decompressobj(GZIP_WBITS)
+                    else:
+                        chunk = decompressor.unconsumed_tail
+        except Exception as err:
+            self._error = err
+        finally:
+            self._put(None)
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        """Read up to size decompressed bytes.
+
+        Args:
+            size (int): Max number of bytes, -1 to read all
+
+        Returns:
+            bytes: Decompressed bytes, empty at end of file
+        """
+
+        if size is None or size < 0:
+            return b''.join(iter(lambda: self.read(self.buffer_size), b''))
+
+        if self._pos >= len(self._buf):
+            if self._is_eof:
+                return b''
+
+            self._buf = self.queue.get()
+            self._pos = 0
+            if self._buf is None:
+                self._buf = b''
+                self._is_eof = True
+                if self._error is not None:
+                    raise self._error
+                return b''
+
+        if self._pos == 0 and size >= len(self._buf):
+            result = self._buf
+        else:
+            result = self._buf[self._pos:self._pos + size]
+        self._pos += len(result)
+        return result
+
+    def readinto(self, b):
+        result = self.read(len(b))
+        b[:len(result)] = result
+        return len(result)
+
+    def close(self):
+        """Stop decompressing and close the file.
+        """
+
+        if self.closed:
+            return
+
+        self._stop_event.set()
+        # Unblock the producer if it is waiting for space
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+        self.thread.join()
+        self.fileobj.close()
+        super().close()
+
+
+def load_dump_meta(file_path):
+    """Load HTTP metadata saved next to the data dump.
+
+    Args:
+        file_path (str): Dump file path
+
+    Returns:
+        dict: ETag and Last-Modified of the dump, empty if unknown
+    """
+
+    meta_path = file_path + DUMP_META_SUFFIX
+    if not os.path.exists(file_path) or not os.path.exists(meta_path):
+        return {}
+
+    with open(meta_path) as f:
+        return json.load(f)
+
+
+def save_dump_meta(file_path, headers):
+    """Save HTTP metadata of the data dump next to it.
+
+    Args:
+        file_path (str): Dump file path
+        headers (dict): Response headers
+    """
+
+    meta = {'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified')}
+    with open(file_path + DUMP_META_SUFFIX, 'w') as f:
+        json.dump(meta, f)
+
+
+class DumpDownload(io.RawIOBase):
+    """Data dump response that is written to a temporary file as it
+    is read, then atomically renamed to the dump file path once
+    complete. If it is closed before the end, the rest is downloaded
+    on a background thread so the dump on disk is still complete.
+
+    Args:
+        resp (requests.Response): Streamed response
+        file_path (str): Dump file path
+    """
+
+    def __init__(self, resp, file_path):
+        super().__init__()
+
+        self.resp = resp
+        self.file_path = file_path
+        self.is_complete = False
+        # Thread that finishes the download after an early close
+        self.thread = None
+        # Error of the background download
+        self.error = None
+
+        dir_path = os.path.dirname(os.path.abspath(file_path))
+        fd, self.tmp_path = tempfile.mkstemp(dir=dir_path, prefix=os.path.basename(file_path),
+                                             suffix='.part')
+        self.file = os.fdopen(fd, 'wb', buffering=DOWNLOAD_BUFFER_SIZE)
+
+    def _commit(self):
+        self.file.close()
+        os.replace(self.tmp_path, self.file_path)
+        save_dump_meta(self.file_path, self.resp.headers)
+        self.resp.close()
+        self.is_complete = True
+
+    def _discard(self):
+        self.file.close()
+        self.resp.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        if self.is_complete:
+            return 0
+
+        try:
+            result = self.resp.raw.read(len(b))
+            if not result:
+                self._commit()
+                return 0
+
+            self.file.write(result)
+        except BaseException:
+            self._discard()
+            raise
+
+        b[:len(result)] = result
+        return len(result)
+
+    def complete(self):
+        """Download the rest of the data dump without reading it.
+        """
+
+        if self.is_complete:
+            return
+
+        try:
+            shutil.copyfileobj(self.resp.raw, self.file, DOWNLOAD_BUFFER_SIZE)
+            self._commit()
+        except BaseException:
+            self._discard()
+            raise
+
+    def _complete_in_background(self):
+        try:
+            self.complete()
+        except Exception as err:
+            self.error = err
+
+    def close(self):
+        """Close the download, which continues in the background if incomplete.
+        """
+
+        if not self.closed and not self.is_complete and not self.file.closed:
+            self.thread = threading.Thread(target=self._complete_in_background)
+            self.thread.start()
+
+        super().close()
+
+
+def request_dump(file_path, url=info.DATA_DUMP_URL, user_agent=None):
+    """Send a conditional request for the data dump.
+
+    Args:
+        file_path (str): Dump file path
+        url (str): Data dump URL
+        user_agent (str): User agent
+
+    Raises:
+        exceptions.DumpError: Contains HTTP status code
+
+    Returns:
+        requests.Response: Streamed response, None if the local dump is up-to-date
+    """
+
+    headers = {}
+    if user_agent:
+        headers['User-Agent'] = user_agent
+
+    meta = load_dump_meta(file_path)
+    if meta.get('etag'):
+        headers['If-None-Match'] = meta['etag']
+    if meta.get('last_modified'):
+        headers['If-Modified-Since'] = meta['last_modified']
+
+    resp = requests.get(url, headers=headers, stream=True)
+
+    if resp.status_code == 304:
+        resp.close()
+        return None
+
+    if resp.status_code != 200:
+        resp.close()
+        raise exceptions.DumpError('Could not download the data dump. '
+                                   'HTTP status code: {}'.format(resp.status_code))
+
+    return resp
+
+
+def refresh_dump(file_path, url=info.DATA_DUMP_URL, user_agent=None):
+    """Download the data dump if the server copy is newer than the local one.
+
+    Args:
+        file_path (str): Dump file path
+        url (str): Data dump URL
+        user_agent (str): User agent
+
+    Returns:
+        bool: True if a new dump was downloaded
+    """
+
+    resp = request_dump(file_path, url, user_agent)
+    if resp is None:
+        return False
+
+    DumpDownload(resp, file_path).complete()
+    return True
+
+
+def load_dump(file_path, refresh=False, user_agent=None, stream=False, threaded=False,
+              buffer_size=DECOMPRESS_BUFFER_SIZE, queue_depth=DECOMPRESS_QUEUE_DEPTH,
+              url=info.DATA_DUMP_URL):
     """Load data dump file
 
     Args:
         file_path (str): Dump file path
+        refresh (bool): Download the dump if the server copy is newer
+        user_agent (str): User agent for downloading
+        stream (bool): Decompress a new dump while it is downloaded
+        instead of after. Decompression runs on a background thread.
+        threaded (bool): Decompress on a background thread
+        buffer_size (int): Max size of a decompressed buffer if threaded
+        queue_depth (int): Decompressed buffers to hold ahead if threaded
+        url (str): Data dump URL
 
     Returns:
         file: File object
     """
 
-    if not os.path.exists(file_path):
-        resp = requests.get(info.DATA_DUMP_URL, stream=True)
+    if refresh or not os.path.exists(file_path):
+        if stream:
+            resp = request_dump(file_path, url, user_agent)
+            if resp is not None:
+                download = DumpDownload(resp, file_path)
+                return ThreadedGzipReader(download, buffer_size, queue_depth)
+        else:
+            refresh_dump(file_path, url, user_agent)
 
-        with open(file_path, 'w') as f:
-            shutil.copyfileobj(resp.raw, f)
+    if threaded:
+        return ThreadedGzipReader(open(file_path, 'rb'), buffer_size, queue_depth)
 
     dump = gzip.open(file_path)
-    return dump
\ No newline at end of file
+    return dump
@@ -5,6 +5,7 @@ import pytest
 
 from ns_endotarter import api_adapter
 from ns_endotarter import exceptions
+from ns_endotarter import ratelimit
 
 
 class TestNS_API():
@@ -25,20 +26,119 @@ class TestNS_API():
             ns_api.login('hunterprime123') == '12345678'
 
     def test_get_wa_members(self):
-        mock_wa = mock.Mock(members='testnation1;testnation2')
+        resp = {'data': {'wa': {'members': 'testnation1;testnation2'}}, 'headers': {}}
+        mock_wa = mock.Mock(get_shards=mock.Mock(return_value=resp))
         mock_api = mock.Mock(wa=mock.Mock(return_value=mock_wa))
         ns_api = api_adapter.NS_API(mock_api, '')
 
         assert ns_api.get_wa_members() == {'testnation1', 'testnation2'}
 
     def test_get_region_members(self):
-        mock_nations = [mock.Mock(nation_name='testnation1'),
-                        mock.Mock(nation_name='testnation2')]
-        mock_region = mock.Mock(nations=mock_nations)
-        mock_nation = mock.Mock(region=mock_region)
-        mock_api = mock.Mock(nation=mock.Mock(return_value=mock_nation))
+        nation_resp = {'data': {'nation': {'region': 'my_region'}}, 'headers': {}}
+        mock_nation = mock.Mock(get_shards=mock.Mock(return_value=nation_resp))
+        region_resp = {'data': {'region': {'nations': 'testnation1:testnation2'}}, 'headers': {}}
+        mock_region = mock.Mock(get_shards=mock.Mock(return_value=region_resp))
+        mock_api = mock.Mock(nation=mock.Mock(return_value=mock_nation),
+                             region=mock.Mock(return_value=mock_region))
         ns_api = api_adapter.NS_API(mock_api, 'my_nation')
 
         assert ns_api.get_region_members() == {'testnation1', 'testnation2'}
-        assert mock_api.nation.called_with('my_nation')
+        mock_api.nation.assert_called_with('my_nation')
+        mock_api.region.assert_called_with('my_region')
+
+    def test_get_endorsements(self):
+        resp = {'data': {'nation': {'endorsements': 'my_nation,Nation_2'}}, 'headers': {}}
+        mock_nation = mock.Mock(get_shards=mock.Mock(return_value=resp))
+        mock_api = mock.Mock(nation=mock.Mock(return_value=mock_nation))
+        ns_api = api_adapter.NS_API(mock_api, 'my_nation')
+
+        assert ns_api.get_endorsements('nation_1') == {'my_nation', 'nation_2'}
+        mock_api.nation.assert_called_with('nation_1')
+
+    def test_get_endorsements_none(self):
+        resp = {'data': {'nation': {'endorsements': None}}, 'headers': {}}
+        mock_nation = mock.Mock(get_shards=mock.Mock(return_value=resp))
+        mock_api = mock.Mock(nation=mock.Mock(return_value=mock_nation))
+        ns_api = api_adapter.NS_API(mock_api, 'my_nation')
+
+        assert ns_api.get_endorsements('nation_1') == set()
+
+    @pytest.mark.parametrize('status,expected', [
+        ('WA Member', True), ('WA Delegate', True), ('Non-member', False)])
+    def test_is_wa_member(self, status, expected):
+        resp = {'data': {'nation': {'unstatus': status}}, 'headers': {}}
+        mock_nation = mock.Mock(get_shards=mock.Mock(return_value=resp))
+        mock_api = mock.Mock(nation=mock.Mock(return_value=mock_nation))
+        ns_api = api_adapter.NS_API(mock_api, 'my_nation')
+
+        assert ns_api.is_wa_member('nation_1') is expected
+        mock_nation.get_shards.assert_called_with('wa', full_response=True)
+
+    def test_get_region_members_with_my_region(self):
+        resp = {'data': {'region': {'nations': 'Test_Nation1:testnation2'}}, 'headers': {}}
+        mock_region = mock.Mock(get_shards=mock.Mock(return_value=resp))
+        mock_api = mock.Mock(region=mock.Mock(return_value=mock_region))
+        ns_api = api_adapter.NS_API(mock_api, 'my_nation', 'my_region')
+
+        assert ns_api.get_region_members() == {'test_nation1', 'testnation2'}
+        mock_api.region.assert_called_with('my_region')
+        mock_api.nation.assert_not_called()
+        mock_region.get_shards.assert_called_with('nations', full_response=True)
+
+    def test_get_region_members_empty_region(self):
+        resp = {'data': {'region': {'nations': ''}}, 'headers': {}}
+        mock_region = mock.Mock(get_shards=mock.Mock(return_value=resp))
+        mock_api = mock.Mock(region=mock.Mock(return_value=mock_region))
+        ns_api = api_adapter.NS_API(mock_api, 'my_nation', 'my_region')
+
+        assert ns_api.get_region_members() == set()
+
+    def test_get_happenings(self):
+        events = {'happenings': {'event': [{'timestamp': '20', 'text': 'b'},
+                                           {'timestamp': '10', 'text': 'a'}]}}
+        events = {'data': {'world': events}, 'headers': {}}
+        mock_world = mock.Mock(get_shards=mock.Mock(return_value=events))
+        mock_api = mock.Mock(world=mock.Mock(return_value=mock_world))
+        ns_api = api_adapter.NS_API(mock_api, 'my_nation')
+
+        assert ns_api.get_happenings(['move'], 5, 'my_region') == [(10, 'a'), (20, 'b')]
+
+    def test_get_happenings_single_event(self):
+        events = {'data': {'world': {'happenings': {'event': {'timestamp': '10', 'text': 'a'}}}},
+                  'headers': {}}
+        mock_world = mock.Mock(get_shards=mock.Mock(return_value=events))
+        mock_api = mock.Mock(world=mock.Mock(return_value=mock_world))
+        ns_api = api_adapter.NS_API(mock_api, 'my_nation')
+
+        assert ns_api.get_happenings(['move'], 5) == [(10, 'a')]
+
+    def test_get_happenings_no_event(self):
+        resp = {'data': {'world': {'happenings': None}}, 'headers': {}}
+        mock_world = mock.Mock(get_shards=mock.Mock(return_value=resp))
+        mock_api = mock.Mock(world=mock.Mock(return_value=mock_world))
+        ns_api = api_adapter.NS_API(mock_api, 'my_nation')
+
+        assert ns_api.get_happenings(['move'], 5) == []
+
+    def test_get_shards_through_governor(self):
+        resp = {'data': {}, 'headers': {'RateLimit-Remaining': '0', 'RateLimit-Reset': '10'},
+                'status': 200}
+        mock_object = mock.Mock(get_shards=mock.Mock(return_value=resp))
+        governor = mock.Mock()
+        ns_api = api_adapter.NS_API(mock.Mock(), 'my_nation', governor=governor)
+
+        assert ns_api.get_shards(mock_object, 'ping') == resp
+        governor.acquire.assert_called_with(ratelimit.API)
+        governor.update.assert_called_with(ratelimit.API, resp['headers'], 200)
+
+    def test_get_shards_rate_limit_ban(self):
+        error = nationstates.exceptions.APIRateLimitBan('Banned. Retry-After: 900')
+        mock_object = mock.Mock(get_shards=mock.Mock(side_effect=error))
+        governor = mock.Mock()
+        ns_api = api_adapter.NS_API(mock.Mock(), 'my_nation', governor=governor)
+
+        with pytest.raises(nationstates.exceptions.APIRateLimitBan):
+            ns_api.get_shards(mock_object, 'ping')
 
+        governor.update.assert_called_with(ratelimit.API)
+        governor.block.assert_called_with(ratelimit.API, 900)
@@ -0,0 +1,57 @@
+from ns_endotarter import audit
+
+
+def new_index():
+    obj = audit.EndorsementIndex()
+    obj.add('nation_1', ['my_nation', 'nation_2'])
+    obj.add('nation_2', ['my_nation', 'nation_3', 'nation_4'])
+    obj.add('my_nation', ['nation_1', 'nation_3', 'my_nation'])
+    obj.add('nation_3', [])
+    obj.add('nation_4', [''])
+    return obj
+
+
+class TestEndorsementIndex():
+    def test_get_endorsers(self):
+        obj = new_index()
+
+        assert obj.get_endorsers('my_nation') == {'nation_1', 'nation_3'}
+        assert obj.get_endorsers('nation_5') == set()
+
+    def test_get_endorsed(self):
+        obj = new_index()
+
+        assert obj.get_endorsed('my_nation') == {'nation_1', 'nation_2'}
+        assert obj.get_endorsed('nation_5') == set()
+
+    def test_get_counts(self):
+        obj = new_index()
+
+        assert obj.get_counts() == {'nation_1': 2, 'nation_2': 3, 'my_nation': 2,
+                                    'nation_3': 0, 'nation_4': 0}
+
+    def test_get_reciprocation_gaps(self):
+        obj = new_index()
+
+        assert obj.get_reciprocation_gaps('my_nation', {'nation_1'}) == {'nation_3'}
+
+    def test_order(self):
+        obj = new_index()
+
+        result = obj.order({'nation_1', 'nation_2', 'nation_3', 'nation_4'}, 'my_nation', set())
+
+        assert result == ['nation_1', 'nation_3', 'nation_2', 'nation_4']
+
+    def test_nations_stored_once(self):
+        obj = new_index()
+
+        assert len(obj) == 5
+        assert all(isinstance(endorser, int) for endorsers in obj.endorsers
+                   for endorser in endorsers)
+
+    def test_to_dict(self):
+        obj = new_index()
+
+        result = audit.EndorsementIndex(**obj.to_dict())
+
+        assert result.get_endorsers('nation_2') == {'my_nation', 'nation_3', 'nation_4'}
@@ -0,0 +1,58 @@
+import socket
+import threading
+
+import pytest
+
+from ns_endotarter import client
+from ns_endotarter import exceptions
+
+
+@pytest.fixture
+def fake_daemon(tmp_path):
+    """Answer one connection with a canned response.
+    """
+
+    socket_path = str(tmp_path / 'endotarter.sock')
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen()
+    requests = []
+
+    def respond(resp):
+        def serve():
+            conn, _ = server.accept()
+            with conn, conn.makefile('rb') as f:
+                requests.append(client.decode(f.readline()))
+                conn.sendall(client.encode(resp))
+
+        thread = threading.Thread(target=serve, daemon=True)
+        thread.start()
+        return requests
+
+    yield socket_path, respond
+    server.close()
+
+
+class TestDaemonClient():
+    def test_send(self, fake_daemon):
+        socket_path, respond = fake_daemon
+        requests = respond({'ok': True, 'remaining': 3})
+
+        assert client.DaemonClient(socket_path).get_remaining() == 3
+        assert requests == [{'command': client.REMAINING}]
+
+    def test_send_error(self, fake_daemon):
+        socket_path, respond = fake_daemon
+        respond({'ok': False, 'error': 'NSSiteError: failed'})
+
+        with pytest.raises(exceptions.DaemonError, match='failed'):
+            client.DaemonClient(socket_path).endorse()
+
+    def test_send_not_running(self, tmp_path):
+        obj = client.DaemonClient(str(tmp_path / 'endotarter.sock'))
+
+        with pytest.raises(exceptions.DaemonError):
+            obj.get_status()
+
+    def test_main_usage(self):
+        assert client.main(['unknown']) == 2
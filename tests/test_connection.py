@@ -0,0 +1,111 @@
+import http.server
+import threading
+import time
+
+import pytest
+import requests
+
+from ns_endotarter import connection
+from ns_endotarter import executor
+from ns_endotarter import ratelimit
+
+
+class KeepAliveHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.requests.append(('GET', self.path))
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_HEAD(self):
+        self.server.requests.append(('HEAD', self.path))
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def site_server():
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def base_url(site_server):
+    return 'http://127.0.0.1:{}/'.format(site_server.server_port)
+
+
+class TestConnectionManager():
+    def test_warm_up_connection_is_reused(self, site_server, base_url):
+        site = executor.NSSite('test', base_url=base_url)
+
+        site.connections.warm_up()
+        for _ in range(3):
+            site.send(site.session.get, base_url)
+
+        assert site.connections.get_metrics() == {'handshakes': 1, 'reuses': 3, 'keepalives': 1}
+        assert site_server.requests[0] == ('HEAD', '/' + connection.KEEPALIVE_PAGE)
+
+    def test_warm_up_once(self, site_server, base_url):
+        manager = connection.ConnectionManager(requests.Session(), base_url)
+
+        manager.warm_up()
+        manager.warm_up()
+
+        assert len(site_server.requests) == 1
+
+    def test_ping_leaves_reserve(self, site_server, base_url):
+        governor = ratelimit.Governor({ratelimit.SITE: (connection.KEEPALIVE_RESERVE + 1, 30)})
+        manager = connection.ConnectionManager(requests.Session(), base_url, governor)
+
+        assert manager.ping()
+        assert not manager.ping()
+        assert len(site_server.requests) == 1
+
+    def test_ping_connection_error(self):
+        manager = connection.ConnectionManager(requests.Session(), 'http://127.0.0.1:1/',
+                                               ratelimit.Governor())
+
+        assert not manager.ping()
+        assert manager.governor.budgets[ratelimit.SITE].in_flight == 0
+
+    def test_keepalive_when_idle(self, site_server, base_url):
+        manager = connection.ConnectionManager(requests.Session(), base_url,
+                                               keepalive_interval=0.05)
+
+        manager.start_keepalive()
+        time.sleep(0.3)
+        manager.stop_keepalive()
+
+        assert manager.keepalives_num >= 2
+        assert manager.get_metrics()['handshakes'] == 1
+
+    def test_no_keepalive_while_busy(self, site_server, base_url):
+        manager = connection.ConnectionManager(requests.Session(), base_url,
+                                               keepalive_interval=10)
+
+        manager.start_keepalive()
+        time.sleep(0.1)
+        manager.stop_keepalive()
+
+        assert manager.keepalives_num == 0
+
+    def test_keepalive_disabled(self, base_url):
+        manager = connection.ConnectionManager(requests.Session(), base_url,
+                                               keepalive_interval=0)
+
+        manager.start_keepalive()
+
+        assert manager._thread is None
@@ -0,0 +1,165 @@
+import os
+import stat
+import threading
+from unittest import mock
+
+import pytest
+
+from benchmarks import bench_session
+from benchmarks import fake_ns
+from benchmarks import synthetic_dump
+from ns_endotarter import client
+from ns_endotarter import daemon
+from ns_endotarter import endotarter
+from ns_endotarter import exceptions
+from ns_endotarter import info
+
+
+@pytest.fixture
+def mock_endotarter():
+    obj = mock.Mock(member_sync=None)
+    obj.ns_data.my_nation = 'my_nation'
+    obj.ns_data.my_region = 'my_region'
+    obj.ns_data.endorseable = ['nation_1', 'nation_2']
+    obj.ns_data.endorsed = {'nation_3'}
+    obj.endorse_next.return_value = 'nation_1'
+    return obj
+
+
+@pytest.fixture
+def running_daemon(mock_endotarter, tmp_path):
+    obj = daemon.EndotarterDaemon(mock_endotarter, str(tmp_path / 'endotarter.sock'),
+                                  refresh_interval=0)
+    obj.start()
+    yield obj
+    obj.stop()
+
+
+class TestEndotarterDaemon():
+    def test_endorse(self, running_daemon):
+        resp = client.DaemonClient(running_daemon.socket_path).endorse()
+
+        assert resp == {'ok': True, 'nation': 'nation_1', 'remaining': 2}
+        assert running_daemon.endorsements_num == 1
+
+    def test_endorse_error(self, running_daemon, mock_endotarter):
+        mock_endotarter.endorse_next.side_effect = exceptions.NSSiteError('failed')
+
+        with pytest.raises(exceptions.DaemonError, match='NSSiteError: failed'):
+            client.DaemonClient(running_daemon.socket_path).endorse()
+
+    def test_status(self, running_daemon):
+        resp = client.DaemonClient(running_daemon.socket_path).get_status()
+
+        assert resp['remaining'] == 2
+        assert resp['endorsed'] == 1
+        assert resp['refresh_error'] is None
+
+    def test_unknown_command(self, running_daemon):
+        with pytest.raises(exceptions.DaemonError, match='Unknown command'):
+            client.DaemonClient(running_daemon.socket_path).send('unknown')
+
+    def test_stop(self, running_daemon, mock_endotarter):
+        client.DaemonClient(running_daemon.socket_path).stop()
+
+        running_daemon.wait()
+
+        mock_endotarter.shutdown.assert_called_once()
+        assert not os.path.exists(running_daemon.socket_path)
+
+    def test_socket_owner_only(self, running_daemon):
+        mode = stat.S_IMODE(os.stat(running_daemon.socket_path).st_mode)
+
+        assert mode & (stat.S_IRWXG | stat.S_IRWXO) == 0
+
+    def test_already_running(self, running_daemon, mock_endotarter):
+        obj = daemon.EndotarterDaemon(mock_endotarter, running_daemon.socket_path)
+
+        with pytest.raises(exceptions.DaemonError):
+            obj.bind()
+
+    def test_stale_socket(self, mock_endotarter, tmp_path):
+        socket_path = str(tmp_path / 'endotarter.sock')
+        obj = daemon.EndotarterDaemon(mock_endotarter, socket_path, refresh_interval=0)
+        obj.bind()
+        # Left behind by a daemon which was killed
+        obj.server.server_close()
+
+        obj.start()
+        try:
+            assert client.DaemonClient(socket_path).get_remaining() == 2
+        finally:
+            obj.stop()
+
+    def test_refresh(self, mock_endotarter):
+        obj = daemon.EndotarterDaemon(mock_endotarter)
+
+        obj.refresh()
+
+        ns_data = mock_endotarter.ns_data
+        ns_data.save_cache.assert_called_once()
+        ns_data.gen_endorseable.assert_called_with(ns_data.get_wa_members.return_value,
+                                                   ns_data.get_region_members.return_value)
+
+    def test_refresh_new_dump_does_not_block_endorsing(self, mock_endotarter):
+        ns_data = mock_endotarter.ns_data
+        ns_data.is_endorsed_cached.return_value = False
+        obj = daemon.EndotarterDaemon(mock_endotarter)
+        rebuilding = threading.Event()
+        endorsed = threading.Event()
+
+        def rebuild(wa_members, region_members):
+            rebuilding.set()
+            assert endorsed.wait(5)
+            return mock.sentinel.rebuilt
+
+        ns_data.rebuild.side_effect = rebuild
+        thread = threading.Thread(target=obj.refresh)
+        thread.start()
+        assert rebuilding.wait(5)
+        assert obj.endorse()['nation'] == 'nation_1'
+        endorsed.set()
+        thread.join()
+
+        ns_data.replace.assert_called_once_with(mock.sentinel.rebuilt)
+        ns_data.save_cache.assert_not_called()
+
+    def test_refresh_member_sync(self, mock_endotarter):
+        mock_endotarter.member_sync = mock.Mock(
+            sync=mock.Mock(return_value=({'nation_4'}, set())),
+            get_members=mock.Mock(return_value=(set(), set())), lock=threading.RLock())
+        obj = daemon.EndotarterDaemon(mock_endotarter)
+
+        obj.refresh()
+
+        mock_endotarter.ns_data.gen_endorseable.assert_called_with(changes=({'nation_4'}, set()))
+
+
+class TestEndotarterDaemonSession():
+    def test_session(self, tmp_path, monkeypatch):
+        dump_path = str(tmp_path / info.DATA_DUMP_PATH)
+        synthetic_dump.write_dump(dump_path, 500, target_size=50,
+                                  target_region=bench_session.MY_REGION,
+                                  my_nation=bench_session.MY_NATION)
+        monkeypatch.chdir(tmp_path)
+        config = bench_session.get_config(str(tmp_path / info.METRICS_PATH))
+
+        with fake_ns.FakeNationStates(dump_path, 'my_nation', bench_session.PASSWORD) as server, \
+                server.redirect():
+            obj = daemon.EndotarterDaemon(endotarter.Endotarter(config),
+                                          str(tmp_path / 'endotarter.sock'), refresh_interval=0)
+            obj.start()
+            try:
+                daemon_client = client.DaemonClient(obj.socket_path)
+                remaining = daemon_client.get_remaining()
+                resp = daemon_client.endorse()
+                obj.refresh()
+                status = daemon_client.get_status()
+            finally:
+                obj.stop()
+
+        assert server.endorsed == [resp['nation']]
+        assert resp['remaining'] == remaining - 1
+        # The endorsed nation is not queued again by the refresh
+        assert status['remaining'] == remaining - 1
+        assert status['logged_in']
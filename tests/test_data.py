@@ -9,7 +9,12 @@ import freezegun
 import pytest
 import xmltodict
 
+from ns_endotarter import audit
 from ns_endotarter import data
+from ns_endotarter import endorse_queue
+from ns_endotarter import instrumentation
+from ns_endotarter import journal
+from ns_endotarter import planner
 
 
 @pytest.fixture
@@ -39,38 +44,249 @@ class TestData():
 
         assert obj.endorsed == {'nation_1', 'nation_2'}
 
-    def test_gen_endorseable(self):
+    def test_get_endorsed_from_dump_metrics(self, mock_dump):
+        metrics = instrumentation.Metrics()
+        obj = data.Data(mock.Mock(), mock.Mock(), '',
+                        'my_region', 'my_nation', metrics=metrics)
+
+        obj.get_endorsed_from_dump(mock_dump)
+
+        assert obj.endorsed == {'nation_1', 'nation_2'}
+        assert metrics.gauges['dump_scan_items'] == 5
+        assert metrics.gauges['dump_scan_bytes'] == len(mock_dump.getvalue())
+        assert metrics.gauges['dump_scan_max_rss_bytes'] > 0
+        assert metrics.gauges['dump_scan_items_per_second'] > 0
+        assert 'dump_scan' in metrics.timers
+
+    def test_gen_endorseable(self, tmp_path):
         get_wa_members = mock.Mock(return_value={'nation1', 'nation2', 'nation3', 'nation4'})
         get_region_members = mock.Mock(return_value={'nation1', 'nation2', 'nation3', 'nation5'})
         mock_api = mock.Mock(get_wa_members=get_wa_members,
                              get_region_members=get_region_members)
-        obj = data.Data(mock_api, mock.Mock(), '', '', '')
+        cache = data.Cache(str(tmp_path / 'cache.json'), '00:00:00')
+        obj = data.Data(mock_api, cache, '', '', '')
         obj.endorsed = {'nation1'}
 
         obj.gen_endorseable()
 
         assert all(nation in ['nation2', 'nation3'] for nation in obj.endorseable)
 
+    def test_get_wa_members_cached(self, tmp_path):
+        mock_api = mock.Mock(get_wa_members=mock.Mock(return_value={'nation1', 'nation2'}))
+        cache = data.Cache(str(tmp_path / 'cache.json'), '00:00:00')
+        obj = data.Data(mock_api, cache, '', '', '')
+
+        with freezegun.freeze_time('2020-01-01 00:00:00') as frozen_time:
+            obj.get_wa_members()
+            frozen_time.tick(data.ROSTER_TTL - 1)
+            result = obj.get_wa_members()
+            assert mock_api.get_wa_members.call_count == 1
+
+            frozen_time.tick(1)
+            obj.get_wa_members()
+            assert mock_api.get_wa_members.call_count == 2
+
+        assert result == {'nation1', 'nation2'}
+
+    def test_gen_endorseable_with_changes(self):
+        obj = data.Data(mock.Mock(), mock.Mock(), '', '', 'my_nation')
+        obj.endorsed = {'nation4'}
+        obj.endorseable = endorse_queue.EndorseQueue(['nation1', 'nation2'])
+
+        obj.gen_endorseable(changes=({'nation3', 'nation4', 'my_nation'}, {'nation1'}))
+
+        assert list(obj.endorseable) == ['nation2', 'nation3']
+        obj.api.get_wa_members.assert_not_called()
+
     def test_endorseable_iterator(self):
         obj = data.Data(mock.Mock(), mock.Mock(), '', '', '')
-        obj.endorseable = ['nation_1', 'nation_2', 'nation_3']
+        obj.endorseable = endorse_queue.EndorseQueue(['nation_1', 'nation_2', 'nation_3'])
         iterator = obj.get_endorseable_iter()
 
         first_result = next(iterator)
-        next(iterator)
+        second_result = next(iterator)
 
         assert first_result == 'nation_1'
-        assert obj.endorseable == ['nation_2', 'nation_3']
-        assert 'nation_1' in obj.endorsed
+        assert second_result == 'nation_2'
+        assert list(obj.endorseable) == ['nation_3']
+
+    def test_endorseable_iterator_requeue(self):
+        obj = data.Data(mock.Mock(), mock.Mock(), '', '', '')
+        obj.endorseable = endorse_queue.EndorseQueue(['nation_1', 'nation_2'])
+        iterator = obj.get_endorseable_iter()
+
+        obj.endorseable.requeue(next(iterator))
+
+        assert next(iterator) == 'nation_1'
 
     def test_endorseable_iterator_empty_endoresable(self):
         obj = data.Data(mock.Mock(), mock.Mock(), '', '', '')
-        obj.endorseable = []
         iterator = obj.get_endorseable_iter()
 
         with pytest.raises(StopIteration):
             next(iterator)
 
+    def test_record_endorsement(self):
+        mock_journal = mock.Mock()
+        obj = data.Data(mock.Mock(), mock.Mock(), '', '', '', journal=mock_journal)
+
+        obj.record_endorsement('nation_1')
+
+        assert 'nation_1' in obj.endorsed
+        mock_journal.append.assert_called_with('nation_1')
+
+    def test_rebuild_keeps_session_endorsements(self, tmp_path):
+        cache = data.Cache(str(tmp_path / 'cache.json'), '00:00:00')
+        cache['endorsed:my_nation'] = ['nation_1']
+        obj = data.Data(mock.Mock(), cache, '', 'my_region', 'my_nation')
+        obj.get_endorsed_nations()
+        obj.gen_endorseable({'nation_1', 'nation_2', 'nation_3'},
+                            {'nation_1', 'nation_2', 'nation_3'})
+        cache['endorsed:my_nation'] = ['nation_3']
+
+        rebuilt = obj.rebuild({'nation_1', 'nation_2', 'nation_3'},
+                              {'nation_1', 'nation_2', 'nation_3'})
+        # Endorsed while the data was rebuilt
+        obj.endorseable.discard('nation_2')
+        obj.record_endorsement('nation_2')
+        obj.replace(rebuilt)
+
+        assert obj.endorsed == {'nation_2', 'nation_3'}
+        assert list(obj.endorseable) == ['nation_1']
+        assert set(cache['endorsed:my_nation']) == {'nation_2', 'nation_3'}
+
+
+class TestDataAudit():
+    def new_data(self, mock_dump, tmp_path):
+        dump_path = str(tmp_path / 'dump.xml.gz')
+        with gzip.open(dump_path, 'wb') as f:
+            f.write(mock_dump.getvalue().encode())
+        cache = data.Cache(str(tmp_path / 'cache.json'), '00:00:00')
+        return data.Data(mock.Mock(), cache, dump_path, 'my_region', 'my_nation',
+                         audit_endorsements=True)
+
+    def test_get_endorsed_nations_audit(self, mock_dump, tmp_path):
+        obj = self.new_data(mock_dump, tmp_path)
+
+        obj.get_endorsed_nations()
+
+        assert obj.endorsed == {'nation_1', 'nation_2'}
+        assert obj.audit.get_endorsers('my_nation') == {'nation_1', 'nation_2'}
+        assert obj.audit.get_counts()['nation_3'] == 0
+        # Nations of other regions are not indexed
+        assert 'nation_4' not in obj.audit.get_counts()
+        assert data.AUDIT_KEY.format('my_region') in obj.cache
+
+    def test_get_endorsed_nations_cached_audit(self, mock_dump, tmp_path):
+        obj = self.new_data(mock_dump, tmp_path)
+        obj.get_endorsed_nations()
+
+        cached = data.Data(mock.Mock(), obj.cache, obj.dump_path, 'my_region', 'my_nation',
+                           audit_endorsements=True)
+        with mock.patch.object(data, 'extract_endorsed') as mock_extract:
+            cached.get_endorsed_nations()
+
+        mock_extract.assert_not_called()
+        assert cached.audit.get_endorsers('my_nation') == {'nation_1', 'nation_2'}
+
+    def test_gen_endorseable_ordered(self, tmp_path):
+        obj = data.Data(mock.Mock(), mock.Mock(), '', 'my_region', 'my_nation')
+        obj.audit = audit.EndorsementIndex()
+        obj.audit.add('my_nation', ['nation_3'])
+        obj.audit.add('nation_1', ['nation_2', 'nation_3'])
+        obj.audit.add('nation_2', ['nation_3'])
+        obj.audit.add('nation_3', [])
+        nations = {'nation_1', 'nation_2', 'nation_3', 'my_nation'}
+
+        obj.gen_endorseable(nations, nations)
+
+        assert list(obj.endorseable) == ['nation_3', 'nation_1', 'nation_2']
+        assert obj.get_reciprocation_gaps() == {'nation_3'}
+
+
+class TestDataSourcePlanner():
+    @pytest.fixture
+    def mock_api(self):
+        endorsements = {'nation_1': {'my_nation', 'nation_2'}, 'nation_2': {'nation_1'},
+                        'nation_3': {'my_nation'}}
+        return mock.Mock(get_endorsements=mock.Mock(side_effect=endorsements.get))
+
+    def new_data(self, mock_api, tmp_path, source):
+        cache = data.Cache(str(tmp_path / 'cache.json'), '00:00:00')
+        plan = planner.Plan(source, 1, 2)
+        source_planner = mock.Mock(api_workers=2, plan=mock.Mock(return_value=plan))
+        obj = data.Data(mock_api, cache, str(tmp_path / 'dump.xml.gz'), 'my_region',
+                        'my_nation', source_planner=source_planner)
+        return obj
+
+    def test_get_endorsed_nations_from_api(self, mock_api, tmp_path):
+        obj = self.new_data(mock_api, tmp_path, planner.API)
+
+        obj.get_endorsed_nations({'nation_1', 'nation_2', 'nation_3', 'my_nation', 'nation_4'},
+                                 {'nation_1', 'nation_2', 'nation_3', 'my_nation'})
+
+        assert obj.endorsed == {'nation_1', 'nation_3'}
+        assert mock_api.get_endorsements.call_count == 3
+        obj.source_planner.plan.assert_called_with(3, False)
+        assert obj.endorsed_plan.source == planner.API
+        assert obj.cache[data.ENDORSED_KEY.format('my_nation')]
+
+    def test_get_endorsed_nations_from_dump(self, mock_api, mock_dump, tmp_path):
+        obj = self.new_data(mock_api, tmp_path, planner.DUMP)
+        with gzip.open(obj.dump_path, 'wb') as f:
+            f.write(mock_dump.getvalue().encode())
+        # The dump is up-to-date
+        os.utime(obj.dump_path)
+
+        obj.get_endorsed_nations({'nation_1'}, {'nation_1'})
+
+        assert obj.endorsed == {'nation_1', 'nation_2'}
+        mock_api.get_endorsements.assert_not_called()
+
+    def test_get_endorsed_nations_cached(self, mock_api, tmp_path):
+        obj = self.new_data(mock_api, tmp_path, planner.API)
+        obj.cache[data.ENDORSED_KEY.format('my_nation')] = ['nation_5']
+
+        obj.get_endorsed_nations()
+
+        assert obj.endorsed == {'nation_5'}
+        assert obj.endorsed_plan is None
+        obj.source_planner.plan.assert_not_called()
+
+
+class TestExtractEndorsed():
+    def test_extract_endorsed(self, mock_dump):
+        pairs = [('my_nation', 'my_region'), ('nation_2', 'my_region'),
+                 ('nation_5', 'other_region')]
+
+        result = data.extract_endorsed(mock_dump, pairs)
+
+        assert result == {'my_nation': {'nation_1', 'nation_2'},
+                          'nation_2': {'nation_1', 'my_nation'},
+                          'nation_5': {'nation_4'}}
+
+    def test_extract_endorsed_parallel(self, mock_dump, tmp_path):
+        xml_path = tmp_path / 'nations.xml'
+        xml_path.write_text(mock_dump.getvalue())
+        pairs = [('my_nation', 'my_region'), ('nation_5', 'other_region')]
+
+        result = data.extract_endorsed_parallel(str(xml_path), pairs, processes=2)
+
+        assert result == {'my_nation': {'nation_1', 'nation_2'},
+                          'nation_5': {'nation_4'}}
+
+    def test_build_endorsed_cache(self, mock_dump, tmp_path):
+        dump_path = str(tmp_path / 'dump.xml.gz')
+        with gzip.open(dump_path, 'wb') as f:
+            f.write(mock_dump.getvalue().encode())
+        cache = data.Cache(str(tmp_path / 'cache.json'), '00:00:00')
+        pairs = [('my_nation', 'my_region'), ('nation_5', 'other_region')]
+
+        data.build_endorsed_cache(cache, pairs, dump_path)
+
+        assert set(cache['endorsed:my_nation']) == {'nation_1', 'nation_2'}
+        assert cache['endorsed:nation_5'] == ['nation_4']
+
 
 class TestCache():
     @pytest.fixture
@@ -84,6 +300,7 @@ class TestCache():
         yield
         os.remove('cache.json')
 
+    @freezegun.freeze_time('1970-01-01 00:00:02')
     def test_load(self, setup_cache_file, remove_cache_file):
         obj = data.Cache('cache.json', '00:00:00')
 
@@ -102,7 +319,119 @@ class TestCache():
         with open('cache.json') as f:
             result = json.load(f)
 
-        assert result == {'created_time': 1, 'key1': ['data1', 'data2']}
+        assert result == {'created_time': 1, '_stored_times': {'key1': 1},
+                          'key1': ['data1', 'data2']}
+
+    def test_entries_after_save(self, tmp_path):
+        obj = data.Cache(str(tmp_path / 'cache.json'), '00:00:00')
+        obj['key1'] = ['data1']
+
+        obj.save()
+
+        assert obj['key1'] == ['data1']
+
+    def test_dump_policy(self, tmp_path):
+        obj = data.Cache(str(tmp_path / 'cache.json'), '12:00:00')
+
+        with freezegun.freeze_time('2020-01-01 13:00:00') as frozen_time:
+            obj['endorsed:my_nation'] = ['nation1']
+            frozen_time.move_to('2020-01-02 11:59:59')
+            assert 'endorsed:my_nation' in obj
+
+            frozen_time.move_to('2020-01-02 12:00:00')
+            assert 'endorsed:my_nation' not in obj
+            assert obj.get('endorsed:my_nation', allow_expired=True) == ['nation1']
+
+    def test_dump_policy_stored_before_update(self, tmp_path):
+        obj = data.Cache(str(tmp_path / 'cache.json'), '12:00:00')
+
+        with freezegun.freeze_time('2020-01-01 11:00:00') as frozen_time:
+            obj['endorsed:my_nation'] = ['nation1']
+            frozen_time.move_to('2020-01-01 11:59:59')
+            assert 'endorsed:my_nation' in obj
+
+            frozen_time.move_to('2020-01-01 12:00:00')
+            assert 'endorsed:my_nation' not in obj
+
+    def test_ttl_policy(self, tmp_path):
+        obj = data.Cache(str(tmp_path / 'cache.json'), '12:00:00', policies={'key': 10})
+
+        with freezegun.freeze_time('2020-01-01 13:00:00') as frozen_time:
+            obj['key:1'] = 'data1'
+            obj['other'] = 'data2'
+            frozen_time.tick(10)
+
+            assert obj == {'other': 'data2'}
+            with pytest.raises(KeyError):
+                obj['key:1']
+
+    def test_no_expiry_policy(self, tmp_path):
+        obj = data.Cache(str(tmp_path / 'cache.json'), '12:00:00', policies={},
+                         default_policy=data.NO_EXPIRY)
+
+        with freezegun.freeze_time('2020-01-01 13:00:00') as frozen_time:
+            obj['key1'] = 'data1'
+            frozen_time.move_to('2021-01-01 13:00:00')
+
+            assert obj['key1'] == 'data1'
+
+    def test_evict_least_recently_used(self, tmp_path):
+        obj = data.Cache(str(tmp_path / 'cache.json'), '00:00:00', max_entries=2)
+        obj['key1'] = 'data1'
+        obj['key2'] = 'data2'
+        obj['key1']
+
+        obj['key3'] = 'data3'
+
+        assert obj == {'key1': 'data1', 'key3': 'data3'}
+
+    def test_save_drops_expired_entries(self, tmp_path):
+        obj = data.Cache(str(tmp_path / 'cache.json'), '00:00:00', policies={'key': 10})
+
+        with freezegun.freeze_time('2020-01-01 13:00:00') as frozen_time:
+            obj['key:1'] = 'data1'
+            obj['other'] = 'data2'
+            frozen_time.tick(10)
+            obj.save()
+
+            with open(obj.file_path) as f:
+                result = json.load(f)
+
+        assert 'key:1' not in result
+        assert result['other'] == 'data2'
+
+    def test_load_keeps_newer_entries(self, tmp_path):
+        file_path = str(tmp_path / 'cache.json')
+        other = data.Cache(file_path, '00:00:00')
+        obj = data.Cache(file_path, '00:00:00')
+
+        with freezegun.freeze_time('2020-01-01 13:00:00') as frozen_time:
+            other['key1'] = 'old'
+            other['key2'] = 'data2'
+            frozen_time.tick(1)
+            obj['key1'] = 'new'
+            other.save()
+
+            obj.load()
+
+            assert obj == {'key1': 'new', 'key2': 'data2'}
+
+    def test_load_removed_file(self, tmp_path):
+        obj = data.Cache(str(tmp_path / 'cache.json'), '00:00:00')
+        obj['key1'] = 'data1'
+        obj.save()
+        os.remove(obj.file_path)
+
+        assert not obj.load()
+        assert obj == {}
+
+    def test_get_cache_shared(self, tmp_path):
+        file_path = str(tmp_path / 'cache.json')
+
+        obj = data.get_cache(file_path, '00:00:00')
+
+        assert data.get_cache(file_path, '00:00:00') is obj
+        assert data.get_cache(str(tmp_path / 'other.json'), '00:00:00') is not obj
 
     @freezegun.freeze_time('1970-01-02 11:00:00')
     def test_is_update(self):
@@ -111,6 +440,17 @@ class TestCache():
 
         assert obj.is_updated
 
+    @freezegun.freeze_time('1970-01-02 11:00:00')
+    def test_last_dump_update_time(self):
+        obj = data.Cache('', '12:00:00')
+
+        assert obj.last_dump_update_time == datetime.datetime(1970, 1, 1, 12)
+
+    def test_is_file_updated_not_exist_file(self):
+        obj = data.Cache('', '12:00:00')
+
+        assert not obj.is_file_updated('not_exist.xml.gz')
+
 
 class TestDataandCache():
     @pytest.fixture
@@ -124,7 +464,8 @@ class TestDataandCache():
 
     @pytest.fixture
     def setup_mock_cache(self):
-        json_dict = {'created_time': 1, 'endorsed': ['nation_3', 'nation_4']}
+        # Stored at 1970-01-01 13:00:00, after that day's dump update
+        json_dict = {'created_time': 46800, 'endorsed:my_nation': ['nation_3', 'nation_4']}
         with open('cache.json', 'w') as f:
             json.dump(json_dict, f)
 
@@ -164,3 +505,31 @@ class TestDataandCache():
         obj.get_endorsed_nations()
 
         assert obj.endorsed == {'nation_3', 'nation_4'}
+
+    @freezegun.freeze_time('1970-01-01 14:00:00')
+    def test_get_endorsed_nations_compact_journal(self, mock_dump_file, setup_mock_cache,
+                                                  remove_mock_cache, tmp_path):
+        endorse_journal = journal.Journal(str(tmp_path / 'journal.log'))
+        endorse_journal.append('nation_5')
+        cache = data.Cache('cache.json', '12:00:00')
+        obj = data.Data(mock.Mock(), cache, 'dump.xml.gz',
+                        'my_region', 'my_nation', journal=endorse_journal)
+
+        obj.get_endorsed_nations()
+
+        assert obj.endorsed == {'nation_3', 'nation_4', 'nation_5'}
+        assert set(cache['endorsed:my_nation']) == {'nation_3', 'nation_4', 'nation_5'}
+        assert endorse_journal.replay() == []
+
+    @freezegun.freeze_time('1970-01-01 14:00:00')
+    def test_get_endorsed_nations_up_to_date_cache_without_my_nation(self, mock_dump_file,
+                                                                     setup_mock_cache,
+                                                                     remove_mock_cache):
+        cache = data.Cache('cache.json', '12:00:00')
+        obj = data.Data(mock.Mock(), cache, 'dump.xml.gz',
+                        'my_region', 'nation_2')
+
+        obj.get_endorsed_nations()
+
+        assert obj.endorsed == {'nation_1', 'my_nation'}
+        assert cache['endorsed:my_nation'] == ['nation_3', 'nation_4']
@@ -0,0 +1,108 @@
+import gzip
+import io
+from unittest import mock
+
+import freezegun
+import pytest
+
+from ns_endotarter import data
+from ns_endotarter import dump_scanner
+
+
+@pytest.fixture
+def mock_dump():
+    xml = ('<NATIONS>'
+           '<NATION><NAME>Nation 1</NAME><REGION>Region A</REGION></NATION>'
+           '<NATION><NAME>Nation 2</NAME><REGION>My Region</REGION></NATION>'
+           '<NATION><NAME>Nation 3</NAME><REGION>my region</REGION></NATION>'
+           '<NATION><NAME>Nation 4</NAME><REGION>Region B</REGION></NATION>'
+           '<NATION><NAME>Nation 5</NAME><REGION>My Region</REGION></NATION>'
+           '</NATIONS>')
+    return io.BytesIO(xml.encode())
+
+
+class TestDumpScanner():
+    def test_canonical_bytes(self):
+        assert dump_scanner.canonical_bytes(b'My Region') == b'my_region'
+
+    def test_canonical_bytes_with_entity(self):
+        assert dump_scanner.canonical_bytes(b'Tom &amp; Jerry') == b'tom_&_jerry'
+
+    @pytest.mark.parametrize('chunk_size', [7, 64, 1024])
+    def test_iter_nation_blocks_across_chunks(self, mock_dump, chunk_size):
+        blocks = list(dump_scanner.iter_nation_blocks(mock_dump, chunk_size))
+
+        assert len(blocks) == 5
+        assert blocks[0] == b'<NATION><NAME>Nation 1</NAME><REGION>Region A</REGION></NATION>'
+
+    def test_iter_nation_blocks_text_stream(self):
+        dump = io.StringIO('<NATIONS><NATION><NAME>A</NAME></NATION></NATIONS>')
+
+        assert list(dump_scanner.iter_nation_blocks(dump)) == [b'<NATION><NAME>A</NAME></NATION>']
+
+    def test_iter_region_blocks_early_exit(self, mock_dump):
+        result = list(dump_scanner.iter_region_blocks(mock_dump, {b'my_region'}))
+
+        assert [region for region, block in result] == [b'my_region', b'my_region']
+        assert b'Nation 5' not in b''.join(block for region, block in result)
+
+    def test_iter_region_blocks_no_early_exit(self, mock_dump):
+        result = list(dump_scanner.iter_region_blocks(mock_dump, {b'my_region'},
+                                                      early_exit=False))
+
+        assert len(result) == 3
+
+
+class TestDumpIndex():
+    @pytest.fixture
+    def dump_index(self, tmp_path, mock_dump):
+        dump_path = str(tmp_path / 'nations.xml.gz')
+        with gzip.open(dump_path, 'wb') as f:
+            f.write(mock_dump.getvalue())
+
+        cache = data.Cache(str(tmp_path / 'dump_index.json'), '00:00:00')
+        obj = dump_scanner.DumpIndex(cache, dump_path, str(tmp_path / 'nations.xml'))
+        yield obj
+        obj.close()
+
+    def test_build(self, dump_index):
+        dump_index.build()
+
+        blocks = dump_index.get_region(b'my_region')
+
+        assert blocks.count(b'<NATION>') == 2
+        assert b'Nation 4' not in blocks
+
+    def test_get_region_not_exist(self, dump_index):
+        dump_index.build()
+
+        assert dump_index.get_region(b'region_c') == b''
+
+    @freezegun.freeze_time('1970-01-01 12:00:00')
+    def test_load_up_to_date_index(self, dump_index):
+        dump_index.build()
+        dump_index.regions = {}
+
+        with mock.patch.object(dump_index, 'build') as mock_build:
+            dump_index.load()
+
+        mock_build.assert_not_called()
+        assert dump_index.get_region(b'region_a').count(b'<NATION>') == 1
+
+    def test_load_expired_index(self, tmp_path, mock_dump):
+        dump_path = str(tmp_path / 'nations.xml.gz')
+        with gzip.open(dump_path, 'wb') as f:
+            f.write(mock_dump.getvalue())
+        cache = data.Cache(str(tmp_path / 'dump_index.json'), '22:00:00')
+        obj = dump_scanner.DumpIndex(cache, dump_path, str(tmp_path / 'nations.xml'))
+
+        with freezegun.freeze_time('2020-01-01 01:00:00') as frozen_time:
+            obj.build()
+            frozen_time.move_to('2020-01-01 23:00:00')
+
+            with mock.patch.object(obj, 'build', wraps=obj.build) as mock_build:
+                obj.load()
+
+        mock_build.assert_called_once()
+        assert obj.get_region(b'region_a').count(b'<NATION>') == 1
+        obj.close()
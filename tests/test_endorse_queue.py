@@ -0,0 +1,45 @@
+import pytest
+
+from ns_endotarter import endorse_queue
+
+
+class TestEndorseQueue():
+    @pytest.fixture
+    def queue(self):
+        return endorse_queue.EndorseQueue(['nation_1', 'nation_2', 'nation_3'])
+
+    def test_pop(self, queue):
+        assert queue.pop() == 'nation_1'
+        assert list(queue) == ['nation_2', 'nation_3']
+
+    def test_pop_empty_queue(self):
+        with pytest.raises(IndexError):
+            endorse_queue.EndorseQueue().pop()
+
+    def test_peek(self, queue):
+        assert queue.peek() == 'nation_1'
+        assert len(queue) == 3
+
+    def test_append_queued_nation(self, queue):
+        queue.append('nation_1')
+
+        assert list(queue) == ['nation_1', 'nation_2', 'nation_3']
+
+    def test_requeue(self, queue):
+        nation = queue.pop()
+
+        queue.requeue(nation)
+
+        assert queue.peek() == 'nation_1'
+
+    def test_defer(self, queue):
+        queue.defer('nation_1')
+
+        assert list(queue) == ['nation_2', 'nation_3', 'nation_1']
+
+    def test_discard(self, queue):
+        queue.discard('nation_2')
+        queue.discard('nation_4')
+
+        assert 'nation_2' not in queue
+        assert len(queue) == 2
@@ -0,0 +1,119 @@
+import gzip
+import io
+import os
+
+import pytest
+from unittest import mock
+
+from ns_endotarter import data
+from ns_endotarter import dump_scanner
+from ns_endotarter import endorsement_db
+
+
+DUMP = ('<NATIONS>'
+        '<NATION><NAME>Nation 1</NAME><UNSTATUS>WA Member</UNSTATUS>'
+        '<ENDORSEMENTS>my_nation,nation_2</ENDORSEMENTS><REGION>My Region</REGION></NATION>'
+        '<NATION><NAME>Nation 2</NAME><UNSTATUS>WA Delegate</UNSTATUS>'
+        '<ENDORSEMENTS>my_nation</ENDORSEMENTS><REGION>My Region</REGION></NATION>'
+        '<NATION><NAME>Nation 3</NAME><UNSTATUS>Non-member</UNSTATUS>'
+        '<ENDORSEMENTS></ENDORSEMENTS><REGION>My Region</REGION></NATION>'
+        '<NATION><NAME>My Nation</NAME><UNSTATUS>WA Member</UNSTATUS>'
+        '<ENDORSEMENTS>nation_1,nation_2,my_nation</ENDORSEMENTS><REGION>My Region</REGION></NATION>'
+        '<NATION><NAME>Nation 4</NAME><UNSTATUS>WA Member</UNSTATUS>'
+        '<ENDORSEMENTS>my_nation</ENDORSEMENTS><REGION>Other Region</REGION></NATION>'
+        '</NATIONS>')
+
+
+@pytest.fixture
+def db(tmp_path):
+    dump_path = str(tmp_path / 'nations.xml.gz')
+    with gzip.open(dump_path, 'wt') as f:
+        f.write(DUMP)
+
+    cache = data.Cache(str(tmp_path / 'cache.json'), '00:00:00')
+    obj = endorsement_db.EndorsementDB(cache, str(tmp_path / 'endorsements.sqlite3'), dump_path)
+    obj.build()
+    yield obj
+    obj.close()
+
+
+class TestIterDumpRows():
+    def test_rows(self):
+        rows = list(endorsement_db.iter_dump_rows(io.BytesIO(DUMP.encode())))
+
+        assert rows[0] == (('nation_1', 'my_region', True),
+                           [('my_nation', 'nation_1'), ('nation_2', 'nation_1')])
+        assert rows[2] == (('nation_3', 'my_region', False), [])
+        # Self endorsements are dropped
+        assert rows[3][1] == [('nation_1', 'my_nation'), ('nation_2', 'my_nation')]
+
+    def test_get_block_field(self):
+        block = b'<NATION><NAME>A</NAME></NATION>'
+
+        assert dump_scanner.get_block_field(block, b'NAME') == b'A'
+        assert dump_scanner.get_block_field(block, b'REGION') is None
+
+
+class TestEndorsementDB():
+    def test_get_endorsed(self, db):
+        assert db.get_endorsed('my_nation') == {'nation_1', 'nation_2', 'nation_4'}
+
+    def test_get_endorsed_in_region(self, db):
+        assert db.get_endorsed('my_nation', 'my_region') == {'nation_1', 'nation_2'}
+
+    def test_get_endorsers(self, db):
+        assert db.get_endorsers('my_nation') == {'nation_1', 'nation_2'}
+
+    def test_get_region_members(self, db):
+        assert db.get_region_members('my_region') == {'nation_1', 'nation_2', 'nation_3',
+                                                      'my_nation'}
+        assert db.get_region_members('my_region', wa_only=True) == {'nation_1', 'nation_2',
+                                                                    'my_nation'}
+
+    def test_get_region_endorsements(self, db):
+        result = db.get_region_endorsements('my_region')
+
+        assert {nation: set(endorsers) for nation, endorsers in result.items()} == {
+            'nation_1': {'my_nation', 'nation_2'}, 'nation_2': {'my_nation'},
+            'nation_3': set(), 'my_nation': {'nation_1', 'nation_2'}}
+
+    def test_get_region(self, db):
+        assert db.get_region('nation_4') == 'other_region'
+        assert db.get_region('nation_5') is None
+
+    def test_batches(self, db):
+        with mock.patch.object(endorsement_db, 'BATCH_SIZE', 2):
+            db.build()
+
+        assert len(db.get_region_members('my_region')) == 4
+
+    def test_load_up_to_date(self, db):
+        db.close()
+
+        with mock.patch.object(db, 'build') as mock_build:
+            db.load()
+
+        mock_build.assert_not_called()
+        assert db.get_region('nation_1') == 'my_region'
+
+    def test_load_outdated(self, db):
+        os.utime(db.db_path, (0, 0))
+
+        with mock.patch.object(db, 'build') as mock_build:
+            db.load()
+
+        mock_build.assert_called_once()
+
+
+class TestDataWithEndorsementDB():
+    def test_get_endorsed_nations(self, db, tmp_path):
+        cache = data.Cache(str(tmp_path / 'endorsed.json'), '00:00:00')
+        obj = data.Data(mock.Mock(), cache, db.dump_path, 'my_region', 'my_nation',
+                        endorsement_db=db)
+
+        with mock.patch.object(data.Data, 'get_endorsed_from_dump') as mock_scan:
+            obj.get_endorsed_nations()
+
+        mock_scan.assert_not_called()
+        assert obj.endorsed == {'nation_1', 'nation_2'}
+        assert cache[data.ENDORSED_KEY.format('my_nation')]
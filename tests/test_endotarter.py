@@ -0,0 +1,155 @@
+import os
+import time
+from unittest import mock
+
+import pytest
+import requests
+
+from benchmarks import bench_session
+from benchmarks import fake_ns
+from benchmarks import synthetic_dump
+from ns_endotarter import endotarter
+from ns_endotarter import exceptions
+from ns_endotarter import info
+from ns_endotarter import planner
+
+
+@pytest.fixture
+def fake_server(tmp_path, monkeypatch):
+    dump_path = str(tmp_path / info.DATA_DUMP_PATH)
+    synthetic_dump.write_dump(dump_path, 500, target_size=50, target_region=bench_session.MY_REGION,
+                              my_nation=bench_session.MY_NATION)
+    monkeypatch.chdir(tmp_path)
+
+    with fake_ns.FakeNationStates(dump_path, 'my_nation', bench_session.PASSWORD) as server:
+        with server.redirect():
+            yield server
+
+
+class TestEndotarterSession():
+    def test_session(self, fake_server, tmp_path):
+        obj = endotarter.Endotarter(bench_session.get_config(str(tmp_path / info.METRICS_PATH)))
+
+        obj.prepare()
+        remaining = len(obj.ns_data.endorseable)
+        for _ in range(3):
+            obj.endorse()
+        obj.shutdown()
+
+        region_wa_members = (set(fake_server.wa_members)
+                             & set(fake_server.regions['my_region'])) - {'my_nation'}
+        assert remaining == len(region_wa_members - obj.ns_data.endorsed) + 3
+        assert len(fake_server.endorsed) == 3
+        assert set(fake_server.endorsed) <= region_wa_members
+        assert (tmp_path / info.METRICS_PATH).exists()
+
+    def test_failed_endorse_requeued(self, fake_server, tmp_path):
+        obj = endotarter.Endotarter(bench_session.get_config(str(tmp_path / info.METRICS_PATH)))
+        obj.prepare()
+        first = obj.ns_data.endorseable.peek()
+        remaining = len(obj.ns_data.endorseable)
+        fake_server.site_error_rate = 1
+
+        with pytest.raises(exceptions.NSSiteError):
+            obj.endorse()
+
+        assert fake_server.endorsed == []
+        assert len(obj.ns_data.endorseable) == remaining
+        assert obj.ns_data.endorseable.peek() == first
+
+    @pytest.mark.parametrize('error', [requests.ConnectionError, exceptions.AuthError])
+    def test_endorse_error_requeued(self, fake_server, tmp_path, error):
+        obj = endotarter.Endotarter(bench_session.get_config(str(tmp_path / info.METRICS_PATH)))
+        obj.prepare()
+        first = obj.ns_data.endorseable.peek()
+        remaining = len(obj.ns_data.endorseable)
+
+        with mock.patch.object(obj.executor, 'endorse', side_effect=error):
+            with pytest.raises(error):
+                obj.endorse()
+
+        assert len(obj.ns_data.endorseable) == remaining
+        assert obj.ns_data.endorseable.peek() == first
+
+    def test_print_remaining_nations(self, fake_server, tmp_path, capsys):
+        obj = endotarter.Endotarter(bench_session.get_config(str(tmp_path / info.METRICS_PATH)))
+        obj.prepare()
+        capsys.readouterr()
+
+        obj.print_remaining_nations()
+
+        output = capsys.readouterr().out
+        assert output.startswith('{} nations to endorse:'.format(len(obj.ns_data.endorseable)))
+        assert obj.ns_data.endorseable.peek() in output
+
+    def test_warm_start(self, fake_server, tmp_path):
+        config = bench_session.get_config(str(tmp_path / info.METRICS_PATH))
+        config['General']['save_session'] = True
+        obj = endotarter.Endotarter(config)
+        obj.prepare()
+        obj.shutdown()
+        api_requests_num = fake_server.requests_num['api']
+        site_requests_num = fake_server.requests_num['site']
+
+        obj = endotarter.Endotarter(config)
+        obj.prepare()
+        obj.endorse()
+
+        # No login, settings page or member lists, which are still cached
+        assert fake_server.requests_num['api'] - api_requests_num == 0
+        assert fake_server.requests_num['site'] - site_requests_num == 1
+        assert len(fake_server.endorsed) == 1
+
+    def test_warm_start_expired_session(self, fake_server, tmp_path):
+        config = bench_session.get_config(str(tmp_path / info.METRICS_PATH))
+        config['General']['save_session'] = True
+        obj = endotarter.Endotarter(config)
+        obj.prepare()
+        obj.shutdown()
+        fake_server.local_id = 'expired'
+
+        obj = endotarter.Endotarter(config)
+        obj.prepare()
+        with pytest.raises(exceptions.SessionError):
+            obj.endorse()
+        assert len(fake_server.endorsed) == 0
+        obj.endorse()
+
+        assert len(fake_server.endorsed) == 1
+        assert obj.executor.ns_site.local_id == 'expired'
+
+    def test_plan_endorsed_source(self, fake_server, tmp_path):
+        config = bench_session.get_config(str(tmp_path / info.METRICS_PATH))
+        obj = endotarter.Endotarter(config)
+        obj.prepare()
+        from_dump = obj.ns_data.endorsed
+        os.remove(info.CACHE_PATH)
+
+        config['Cache']['plan_endorsed_source'] = True
+        obj = endotarter.Endotarter(config)
+        # The synthetic dump is small, make scanning it look slow
+        obj.ns_data.source_planner.dump_scan_rate = 1
+        obj.prepare()
+
+        assert obj.ns_data.endorsed_plan.source == planner.API
+        assert obj.ns_data.endorsed == from_dump
+
+    def test_prune_left_nations(self, fake_server, tmp_path):
+        config = bench_session.get_config(str(tmp_path / info.METRICS_PATH))
+        config['General']['prune_interval'] = 0.05
+        obj = endotarter.Endotarter(config)
+        obj.prepare()
+        left = list(obj.ns_data.endorseable)[-3:]
+        for nation in left:
+            fake_server.resign(nation)
+
+        while obj.pruner.syncs_num < 2:
+            time.sleep(0.01)
+        remaining = len(obj.ns_data.endorseable)
+        for _ in range(remaining):
+            obj.endorse()
+        obj.shutdown()
+
+        assert obj.pruner.pruned_num == 3
+        assert fake_server.stale_endorsements_num == 0
+        assert not set(left) & set(fake_server.endorsed)
@@ -1,12 +1,95 @@
+import asyncio
+import threading
 from unittest import mock
 
 import pytest
+import requests
 
 from ns_endotarter import api_adapter
+from ns_endotarter import endorse_queue
 from ns_endotarter import executor
 from ns_endotarter import exceptions
 
 
+class TestClassifyPage():
+    def test_endorse_page(self):
+        html = ('<form method="post" action="/cgi-bin/endorse.cgi">'
+                '<input type="hidden" name="localid" value="abc123">'
+                '<input type="hidden" name="action" value="endorse">'
+                '<button type="submit">Endorse</button></form>')
+
+        assert executor.classify_page(html) == executor.PageInfo(None, False, 'abc123')
+
+    def test_unendorse_page(self):
+        html = "<input type='hidden' name='action' value='unendorse'>"
+
+        assert executor.classify_page(html).endorsed is True
+
+    def test_error_with_entity(self):
+        html = '<div><p class="error">Tom &amp; Jerry failed.</p></div>'
+
+        assert executor.classify_page(html).error == 'Tom & Jerry failed.'
+
+    def test_error_class_list(self):
+        html = '<p class="info error">Failed.</p>'
+
+        assert executor.classify_page(html).error == 'Failed.'
+
+    def test_error_with_nested_markup(self):
+        html = '<p class="error">You cannot endorse <a href="nation=x">X</a> now.</p>'
+
+        assert executor.classify_page(html).error == 'You cannot endorse X now.'
+
+    def test_empty_error(self):
+        assert executor.classify_page_bs4('<p class="error"></p>').error == ''
+
+    def test_error_class_prefix(self):
+        html = '<p class="error-hint">Hint.</p>'
+
+        with mock.patch('ns_endotarter.executor.classify_page_bs4') as mock_bs4:
+            assert executor.classify_page(html).error is None
+
+        mock_bs4.assert_not_called()
+
+    def test_data_value_attribute(self):
+        html = '<input type="hidden" name="localid" data-value="x" value="abc123">'
+
+        assert executor.classify_page(html).local_id == 'abc123'
+
+    def test_empty_page(self):
+        assert executor.classify_page('') == executor.PageInfo(None, None, None)
+
+    @pytest.mark.parametrize('html', [
+        '<p class="error"><b>Failed.</b></p>',
+        '<p id="x" class="error" >Failed.</p>',
+        '<input name="localid" value=abc123 type="hidden">',
+        '<input name="action" value="unendorse"><input name="action" value="endorse">',
+        '<p class="error-hint">Hint.</p><input name="action" value="endorse">',
+        '<input name="localid" data-value="x" value="abc123">',
+        '<input data-name="localid" name="action" value="endorse">',
+        "<p class='info error'>Failed.</p>",
+        '<p class=error>Failed.</p>',
+    ])
+    def test_same_as_bs4(self, html):
+        assert executor.classify_page(html) == executor.classify_page_bs4(html)
+
+    def test_fallback_to_bs4(self):
+        html = '<p class="error"><b>Failed.</b></p>'
+
+        with mock.patch('ns_endotarter.executor.classify_page_bs4') as mock_bs4:
+            executor.classify_page(html)
+
+        mock_bs4.assert_called_with(html)
+
+    def test_no_fallback_for_plain_page(self):
+        html = '<input type="hidden" name="action" value="endorse">'
+
+        with mock.patch('ns_endotarter.executor.classify_page_bs4') as mock_bs4:
+            executor.classify_page(html)
+
+        mock_bs4.assert_not_called()
+
+
 class TestHandleErrors():
     def test_raise_no_exception(self):
         resp = mock.Mock(status_code=200, text='')
@@ -19,6 +102,13 @@ class TestHandleErrors():
         with pytest.raises(exceptions.NSSiteError):
             executor.check_errors(resp)
 
+    def test_raise_exception_site_error_with_nested_markup(self):
+        resp = mock.Mock(status_code=200,
+                         text='<p class="error">You cannot endorse <a href="nation=x">X</a> now.</p>')
+
+        with pytest.raises(exceptions.NSSiteError, match='You cannot endorse X now.'):
+            executor.check_errors(resp)
+
     def test_raise_exception_site_error(self):
         html = '<p class="error">This request failed a security check. Please try again.</p>'
         resp = mock.Mock(status_code=200, text=html)
@@ -38,6 +128,14 @@ class TestNSSite():
 
         assert obj.local_id == "123456"
 
+    @mock.patch('requests.Session.get',
+                return_value=mock.Mock(status_code=200, text='<p>Settings</p>'))
+    def test_set_localid_not_found(self, mock_requests_session_get):
+        obj = executor.NSSite('')
+
+        with pytest.raises(exceptions.NSSiteError):
+            obj.set_local_id('1234567890')
+
     @mock.patch('requests.Session.post',
                 return_value=mock.Mock(status_code=200, text=''))
     def test_execute_send_post_request(self, mock_requests_session_post):
@@ -53,7 +151,8 @@ class TestNSSite():
 class TestEndorseExecutor():
     def test_endorse_succeeded(self):
         html = '<input type="hidden" name="action" value="endorse">'
-        mock_site = mock.Mock(execute=mock.Mock(return_value=html))
+        page = executor.classify_page(html)
+        mock_site = mock.Mock(execute=mock.Mock(return_value=page))
         obj = executor.EndorseExecutor(mock.Mock(), mock_site)
 
         obj.endorse('nation_1')
@@ -62,8 +161,204 @@ class TestEndorseExecutor():
 
     def test_endorse_failed(self):
         html = '<input type="hidden" name="action" value="unendorse">'
-        mock_site = mock.Mock(execute=mock.Mock(return_value=html))
+        page = executor.classify_page(html)
+        mock_site = mock.Mock(execute=mock.Mock(return_value=page))
         obj = executor.EndorseExecutor(mock.Mock(), mock_site)
 
         with pytest.raises(exceptions.EndotarterError):
             obj.endorse('nation_1')
+
+
+class TestEndorseExecutorSession():
+    def test_setup_session_login(self):
+        store = mock.Mock(load=mock.Mock(return_value=None))
+        mock_api = mock.Mock(login=mock.Mock(return_value='1234'))
+        mock_site = mock.Mock(get_session_state=mock.Mock(return_value={'local_id': '5'}))
+        obj = executor.EndorseExecutor(mock_api, mock_site, store)
+
+        obj.setup_session('password')
+
+        mock_api.login.assert_called_with('password')
+        mock_site.set_local_id.assert_called_with('1234')
+        store.save.assert_called_with({'local_id': '5'})
+
+    def test_setup_session_restore(self):
+        state = {'local_id': '5', 'cookies': {'pin': '1234'}}
+        store = mock.Mock(load=mock.Mock(return_value=state))
+        mock_api = mock.Mock()
+        mock_site = mock.Mock()
+        obj = executor.EndorseExecutor(mock_api, mock_site, store)
+
+        obj.setup_session('password')
+
+        mock_api.login.assert_not_called()
+        mock_site.restore_session_state.assert_called_with(state)
+
+    def test_endorse_expired_session(self):
+        mock_api = mock.Mock(login=mock.Mock(return_value='1234'))
+        mock_site = mock.Mock(execute=mock.Mock(side_effect=exceptions.SessionError))
+        obj = executor.EndorseExecutor(mock_api, mock_site)
+        obj.password = 'password'
+
+        with pytest.raises(exceptions.SessionError):
+            obj.endorse('nation_1')
+
+        mock_api.login.assert_called_with('password')
+        mock_site.set_local_id.assert_called_with('1234')
+        mock_site.execute.assert_called_once()
+
+    def test_endorse_expired_session_without_password(self):
+        mock_site = mock.Mock(execute=mock.Mock(side_effect=exceptions.SessionError))
+        obj = executor.EndorseExecutor(mock.Mock(), mock_site)
+
+        with pytest.raises(exceptions.SessionError):
+            obj.endorse('nation_1')
+
+    def test_check_errors_security_check(self):
+        html = '<p class="error">This request failed a security check. Please try again.</p>'
+
+        with pytest.raises(exceptions.SessionError):
+            executor.check_errors(mock.Mock(status_code=200, text=html))
+
+    def test_session_state(self):
+        obj = executor.NSSite('')
+        obj.session.cookies['pin'] = '1234'
+        obj.local_id = '5'
+        state = obj.get_session_state()
+
+        other = executor.NSSite('')
+        other.restore_session_state(state)
+
+        assert other.local_id == '5'
+        assert other.session.cookies['pin'] == '1234'
+
+
+class TestAsyncEndorseExecutor():
+    @pytest.fixture
+    def ns_data(self):
+        return mock.Mock(endorseable=endorse_queue.EndorseQueue(['nation_1', 'nation_2']),
+                         lock=threading.RLock())
+
+    @pytest.fixture
+    def ns_site(self):
+        site = executor.NSSite('')
+        site.local_id = '12345'
+        return site
+
+    def run(self, obj, triggers):
+        async def main():
+            tasks = [obj.trigger() for _ in range(triggers)]
+            await obj.drain()
+            return [task.result() if task else None for task in tasks]
+
+        return asyncio.run(main())
+
+    def test_one_action_per_trigger(self, ns_data, ns_site):
+        resp = mock.Mock(status_code=200, text='')
+        obj = executor.AsyncEndorseExecutor(ns_site, ns_data)
+
+        with mock.patch('requests.Session.send', return_value=resp) as mock_send:
+            results = self.run(obj, 3)
+
+        assert results == [True, True, None]
+        assert mock_send.call_count == 2
+        bodies = [call.args[0].body for call in mock_send.call_args_list]
+        assert bodies == ['nation=nation_1&action=endorse&localid=12345',
+                          'nation=nation_2&action=endorse&localid=12345']
+        ns_data.record_endorsement.assert_has_calls([mock.call('nation_1'),
+                                                     mock.call('nation_2')])
+
+    def test_request_prepared_ahead(self, ns_data, ns_site):
+        obj = executor.AsyncEndorseExecutor(ns_site, ns_data)
+
+        async def main():
+            with mock.patch('requests.Session.send',
+                            return_value=mock.Mock(status_code=200, text='')):
+                obj.trigger()
+                await asyncio.sleep(0)
+                prepared = obj.next
+                await obj.drain()
+            return prepared
+
+        nation, prepared = asyncio.run(main())
+
+        assert nation == 'nation_2'
+        assert 'nation=nation_2' in prepared.body
+
+    def test_failure_requeued(self, ns_data, ns_site):
+        resp = mock.Mock(status_code=200, text='<p class="error">Failed.</p>')
+        obj = executor.AsyncEndorseExecutor(ns_site, ns_data)
+
+        with mock.patch('requests.Session.send', return_value=resp) as mock_send:
+            results = self.run(obj, 1)
+
+        assert results == [False]
+        assert mock_send.call_count == 1
+        assert list(ns_data.endorseable) == ['nation_1', 'nation_2']
+        assert obj.failures[0][0] == 'nation_1'
+        ns_data.record_endorsement.assert_not_called()
+
+    def test_connection_error_requeued(self, ns_data, ns_site):
+        obj = executor.AsyncEndorseExecutor(ns_site, ns_data)
+
+        with mock.patch('requests.Session.send', side_effect=requests.ConnectionError):
+            results = self.run(obj, 1)
+
+        assert results == [False]
+        assert ns_data.endorseable.peek() == 'nation_1'
+
+    def test_not_endorsed_not_requeued(self, ns_data, ns_site):
+        resp = mock.Mock(status_code=200,
+                         text='<input type="hidden" name="action" value="unendorse">')
+        obj = executor.AsyncEndorseExecutor(ns_site, ns_data)
+
+        with mock.patch('requests.Session.send', return_value=resp):
+            results = self.run(obj, 1)
+
+        assert results == [False]
+        assert list(ns_data.endorseable) == ['nation_2']
+
+    def test_expired_session_login_again(self, ns_data, ns_site):
+        expired = mock.Mock(status_code=200,
+                            text='<p class="error">You failed a security check.</p>')
+        endorse_executor = mock.Mock(password='password')
+        endorse_executor.login.side_effect = lambda: setattr(ns_site, 'local_id', '67890')
+        obj = executor.AsyncEndorseExecutor(ns_site, ns_data,
+                                            endorse_executor=endorse_executor)
+
+        with mock.patch('requests.Session.send', return_value=expired):
+            results = self.run(obj, 1)
+
+        assert results == [False]
+        endorse_executor.login.assert_called_once_with()
+        assert list(ns_data.endorseable) == ['nation_1', 'nation_2']
+        nation, prepared = obj.next
+        assert nation == 'nation_1'
+        assert 'localid=67890' in prepared.body
+
+        resp = mock.Mock(status_code=200, text='')
+        with mock.patch('requests.Session.send', return_value=resp):
+            results = self.run(obj, 1)
+
+        assert results == [True]
+        ns_data.record_endorsement.assert_called_with('nation_1')
+
+    def test_expired_session_without_login(self, ns_data, ns_site):
+        expired = mock.Mock(status_code=200,
+                            text='<p class="error">You failed a security check.</p>')
+        obj = executor.AsyncEndorseExecutor(ns_site, ns_data)
+
+        with mock.patch('requests.Session.send', return_value=expired):
+            results = self.run(obj, 1)
+
+        assert results == [False]
+        assert isinstance(obj.failures[0][1], exceptions.SessionError)
+
+    def test_prepare_next_under_lock(self, ns_data, ns_site):
+        obj = executor.AsyncEndorseExecutor(ns_site, ns_data)
+        ns_data.lock = mock.MagicMock()
+
+        obj.prepare_next_locked()
+
+        ns_data.lock.__enter__.assert_called_once()
+        assert obj.next[0] == 'nation_1'
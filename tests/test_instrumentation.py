@@ -0,0 +1,161 @@
+import io
+import json
+import tracemalloc
+from unittest import mock
+
+import pytest
+
+from ns_endotarter import instrumentation
+
+
+class FakeClock():
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        self.now += 0.3
+        return self.now
+
+
+@pytest.fixture
+def metrics():
+    return instrumentation.Metrics(FakeClock())
+
+
+class TestHistogram():
+    def test_observe(self):
+        histogram = instrumentation.Histogram((0.1, 1))
+
+        for value in (0.05, 0.1, 0.5, 5):
+            histogram.observe(value)
+
+        assert histogram.counts == [2, 1, 1]
+        assert histogram.count == 4
+        assert histogram.sum == pytest.approx(5.65)
+
+
+class TestCountingReader():
+    def test_bytes(self):
+        reader = instrumentation.CountingReader(io.BytesIO(b'<A>1</A><A>2</A>'), b'<A>')
+
+        while reader.read(5):
+            pass
+
+        assert reader.bytes_num == 16
+        assert reader.items_num == 2
+
+    def test_text(self):
+        reader = instrumentation.CountingReader(io.StringIO('<A>é</A>'), b'<A>')
+
+        reader.read()
+
+        assert reader.bytes_num == 9
+        assert reader.items_num == 1
+
+
+class TestMetrics():
+    def test_timer(self, metrics):
+        with metrics.timer('login'):
+            pass
+        with metrics.timer('login'):
+            pass
+
+        assert metrics.timers['login'] == pytest.approx(0.6)
+
+    def test_latency(self, metrics):
+        with metrics.latency('site_execute'):
+            pass
+
+        assert metrics.histograms['site_execute'].counts[3] == 1
+
+    def test_latency_on_error(self, metrics):
+        with pytest.raises(ValueError):
+            with metrics.latency('site_execute'):
+                raise ValueError
+
+        assert metrics.histograms['site_execute'].count == 1
+
+    def test_scan(self, metrics):
+        with metrics.scan('dump_scan', io.BytesIO(b'<N></N>' * 10), b'<N>') as reader:
+            reader.read()
+
+        assert metrics.gauges['dump_scan_items'] == 10
+        assert metrics.gauges['dump_scan_items_per_second'] == pytest.approx(10 / 0.3)
+
+    def test_peak_memory(self):
+        metrics = instrumentation.Metrics(FakeClock(), trace_memory=True)
+
+        with metrics.peak_memory('dump_scan'):
+            buf = bytearray(1024 * 1024)
+            del buf
+
+        assert metrics.gauges['dump_scan_peak_bytes'] >= 1024 * 1024
+        assert not tracemalloc.is_tracing()
+
+    def test_max_rss(self, metrics):
+        usages = [mock.Mock(ru_maxrss=1000), mock.Mock(ru_maxrss=3000)]
+
+        with mock.patch('resource.getrusage', side_effect=usages):
+            with metrics.peak_memory('dump_scan'):
+                assert not tracemalloc.is_tracing()
+
+        assert metrics.gauges['dump_scan_max_rss_bytes'] == 3000 * instrumentation.RSS_UNIT
+        assert metrics.gauges['dump_scan_max_rss_increase_bytes'] == \
+            2000 * instrumentation.RSS_UNIT
+
+    def test_scan_rate_not_set_while_tracing(self):
+        metrics = instrumentation.Metrics(FakeClock(), trace_memory=True)
+
+        with metrics.peak_memory('dump_scan'), \
+                metrics.scan('dump_scan', io.BytesIO(b'<N></N>'), b'<N>') as reader:
+            reader.read()
+
+        assert metrics.gauges['dump_scan_items'] == 1
+        assert 'dump_scan_items_per_second' not in metrics.gauges
+
+    def test_export_json(self, metrics, tmp_path):
+        metrics.record_time('prepare', 1.5)
+        metrics.set_gauge('site_handshakes', 1)
+        file_path = str(tmp_path / 'metrics.json')
+
+        metrics.export(file_path)
+
+        with open(file_path) as f:
+            exported = json.load(f)
+        assert exported['timers'] == {'prepare': 1.5}
+        assert exported['gauges'] == {'site_handshakes': 1}
+
+    def test_export_prometheus(self, metrics, tmp_path):
+        metrics.record_time('prepare_login', 1.5)
+        metrics.observe('site_execute', 0.2)
+        metrics.observe('site_execute', 20)
+        file_path = str(tmp_path / 'metrics.prom')
+
+        metrics.export(file_path, instrumentation.PROMETHEUS_FORMAT)
+
+        with open(file_path) as f:
+            lines = f.read().splitlines()
+        assert 'endotarter_prepare_login_seconds 1.5' in lines
+        assert 'endotarter_site_execute_seconds_bucket{le="0.25"} 1' in lines
+        assert 'endotarter_site_execute_seconds_bucket{le="+Inf"} 2' in lines
+        assert 'endotarter_site_execute_seconds_count 2' in lines
+
+    def test_export_unknown_format(self, metrics, tmp_path):
+        with pytest.raises(ValueError):
+            metrics.export(str(tmp_path / 'metrics'), 'xml')
+
+
+class TestNullMetrics():
+    def test_records_nothing(self, tmp_path):
+        metrics = instrumentation.NULL_METRICS
+        dump = io.BytesIO()
+
+        with metrics.timer('login'), metrics.latency('site_execute'), \
+                metrics.peak_memory('dump_scan'):
+            pass
+        with metrics.scan('dump_scan', dump, b'<N>') as reader:
+            assert reader is dump
+        metrics.export(str(tmp_path / 'metrics.json'))
+
+        assert not metrics.enabled
+        assert not (tmp_path / 'metrics.json').exists()
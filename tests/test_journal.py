@@ -0,0 +1,49 @@
+from unittest import mock
+
+import pytest
+
+from ns_endotarter import journal
+
+
+class TestJournal():
+    @pytest.fixture
+    def file_path(self, tmp_path):
+        return str(tmp_path / 'journal.log')
+
+    def test_replay_not_exist_journal(self, file_path):
+        obj = journal.Journal(file_path)
+
+        assert obj.replay() == []
+
+    def test_append_and_replay(self, file_path):
+        obj = journal.Journal(file_path)
+
+        obj.append('nation_1')
+        obj.append('nation_2')
+
+        assert journal.Journal(file_path).replay() == ['nation_1', 'nation_2']
+
+    def test_replay_ignores_torn_entry(self, file_path):
+        with open(file_path, 'wb') as f:
+            f.write(b'nation_1\nnati')
+        obj = journal.Journal(file_path)
+
+        assert obj.replay() == ['nation_1']
+
+    @mock.patch('os.fsync')
+    def test_batched_sync(self, mock_fsync, file_path):
+        obj = journal.Journal(file_path, sync_every=2)
+
+        obj.append('nation_1')
+        mock_fsync.assert_not_called()
+        obj.append('nation_2')
+
+        mock_fsync.assert_called_once()
+
+    def test_clear(self, file_path):
+        obj = journal.Journal(file_path)
+        obj.append('nation_1')
+
+        obj.clear()
+
+        assert obj.replay() == []
@@ -0,0 +1,170 @@
+import threading
+from unittest import mock
+
+import freezegun
+import pytest
+
+from ns_endotarter import data
+from ns_endotarter import endorse_queue
+from ns_endotarter import membership
+from ns_endotarter import ratelimit
+
+
+class TestMembershipSync():
+    @pytest.fixture
+    def mock_api(self):
+        return mock.Mock(get_wa_members=mock.Mock(return_value={'nation_1', 'nation_2', 'nation_9'}),
+                         get_region_members=mock.Mock(return_value={'nation_1', 'nation_2',
+                                                                    'nation_3'}),
+                         get_happenings=mock.Mock(return_value=[]),
+                         is_wa_member=mock.Mock(return_value=True))
+
+    @pytest.fixture
+    def synced_cache(self):
+        cache = mock.MagicMock()
+        cache.load.return_value = True
+        cache_dict = {'wa_members': ['nation_1', 'nation_2', 'nation_9'],
+                      'region_members:my_region': ['nation_1', 'nation_2', 'nation_3'],
+                      'synced_time:my_region': 1000}
+        cache.__contains__.side_effect = cache_dict.__contains__
+        cache.__getitem__.side_effect = cache_dict.__getitem__
+        return cache
+
+    def test_sync_without_cache_fetches_all(self, mock_api):
+        cache = mock.MagicMock()
+        cache.load.return_value = False
+        obj = membership.MembershipSync(mock_api, cache, 'my_region')
+
+        changes = obj.sync()
+
+        assert changes is None
+        assert obj.region_wa_members == {'nation_1', 'nation_2'}
+        mock_api.get_happenings.assert_not_called()
+
+    @freezegun.freeze_time('1970-01-01 00:20:00')
+    def test_sync_applies_happenings(self, mock_api, synced_cache):
+        mock_api.get_happenings.return_value = [
+            (1100, '@@nation_3@@ was admitted to the World Assembly.'),
+            (1110, '@@nation_1@@ resigned from the World Assembly.'),
+            (1120, '@@nation_9@@ relocated from %%other_region%% to %%My_Region%%.'),
+            (1130, '@@nation_2@@ relocated from %%my_region%% to %%other_region%%.')]
+        obj = membership.MembershipSync(mock_api, synced_cache, 'my_region')
+
+        joined, left = obj.sync()
+
+        assert joined == {'nation_3', 'nation_9'}
+        assert left == {'nation_1', 'nation_2'}
+        assert obj.synced_time == 1200
+        mock_api.get_wa_members.assert_not_called()
+        mock_api.get_happenings.assert_called_with(membership.HAPPENINGS_FILTERS,
+                                                   1000 - membership.SYNC_OVERLAP, 'my_region')
+
+    @freezegun.freeze_time('1970-01-01 00:20:00')
+    def test_sync_resolves_wa_status_of_arrivals(self, mock_api, synced_cache):
+        mock_api.get_happenings.return_value = [
+            (1100, '@@nation_4@@ relocated from %%other_region%% to %%my_region%%.'),
+            (1110, '@@nation_5@@ was founded in %%my_region%%.'),
+            (1120, '@@nation_6@@ relocated from %%other_region%% to %%my_region%%.'),
+            (1130, '@@nation_6@@ relocated from %%my_region%% to %%other_region%%.')]
+        mock_api.is_wa_member.side_effect = lambda nation: nation == 'nation_4'
+        obj = membership.MembershipSync(mock_api, synced_cache, 'my_region')
+
+        joined, left = obj.sync()
+
+        assert joined == {'nation_4'}
+        assert left == set()
+        assert sorted(call.args[0] for call in mock_api.is_wa_member.call_args_list) == \
+            ['nation_4', 'nation_5']
+
+    @freezegun.freeze_time('1970-01-01 12:00:00')
+    def test_sync_too_old_fetches_all(self, mock_api, synced_cache):
+        obj = membership.MembershipSync(mock_api, synced_cache, 'my_region')
+
+        assert obj.sync() is None
+        mock_api.get_happenings.assert_not_called()
+
+    @freezegun.freeze_time('1970-01-01 00:20:00')
+    def test_sync_too_many_happenings_fetches_all(self, mock_api, synced_cache):
+        mock_api.get_happenings.return_value = [(1100, '')] * 100
+        obj = membership.MembershipSync(mock_api, synced_cache, 'my_region')
+
+        assert obj.sync() is None
+        mock_api.get_wa_members.assert_called()
+
+    @pytest.mark.parametrize('text,wa_members,region_members', [
+        ('@@nation_1@@ was ejected from the WA for rule violations.',
+         {'nation_2'}, {'nation_1', 'nation_2'}),
+        ('@@nation_3@@ was founded in %%my_region%%.',
+         {'nation_1', 'nation_2'}, {'nation_1', 'nation_2', 'nation_3'}),
+        ('@@nation_1@@ ceased to exist in %%my_region%%.',
+         {'nation_2'}, {'nation_2'}),
+        ('@@nation_1@@ was ejected and banned from %%my_region%% by @@nation_2@@.',
+         {'nation_1', 'nation_2'}, {'nation_2'})])
+    def test_apply_event(self, text, wa_members, region_members):
+        obj = membership.MembershipSync(mock.Mock(), mock.Mock(), 'my_region')
+        obj.wa_members = {'nation_1', 'nation_2'}
+        obj.region_members = {'nation_1', 'nation_2'}
+
+        obj.apply_event(text)
+
+        assert obj.wa_members == wa_members
+        assert obj.region_members == region_members
+
+
+class TestMembershipPruner():
+    @pytest.fixture
+    def member_sync(self):
+        obj = mock.Mock(region_wa_members={'nation_1', 'nation_2', 'nation_3'},
+                        lock=threading.RLock())
+
+        def sync():
+            obj.region_wa_members = {'nation_1', 'nation_4'}
+            return ({'nation_4'}, {'nation_2', 'nation_3'})
+
+        obj.sync.side_effect = sync
+        return obj
+
+    @pytest.fixture
+    def ns_data(self):
+        obj = data.Data(mock.Mock(), mock.Mock(), '', 'my_region', 'my_nation')
+        obj.endorseable = endorse_queue.EndorseQueue(['nation_1', 'nation_2'])
+        return obj
+
+    def test_prune(self, member_sync, ns_data):
+        obj = membership.MembershipPruner(member_sync, ns_data)
+
+        assert obj.prune() == 1
+        assert list(ns_data.endorseable) == ['nation_1', 'nation_4']
+        assert obj.get_metrics() == {'pruned': 1, 'syncs': 1, 'skipped': 0}
+
+    def test_prune_after_fetching_all(self, member_sync, ns_data):
+        obj = membership.MembershipPruner(member_sync, ns_data)
+        member_sync.load.side_effect = lambda: setattr(member_sync, 'region_wa_members',
+                                                       {'nation_1', 'nation_2'})
+
+        def sync():
+            member_sync.region_wa_members = {'nation_1', 'nation_5'}
+
+        member_sync.sync.side_effect = sync
+
+        assert obj.prune() == 1
+        assert list(ns_data.endorseable) == ['nation_1', 'nation_5']
+
+    def test_prune_low_rate_limit_budget(self, member_sync, ns_data):
+        governor = ratelimit.Governor({ratelimit.API: (3, 30)})
+        governor.acquire(ratelimit.API)
+        obj = membership.MembershipPruner(member_sync, ns_data, governor, reserve=2)
+
+        assert obj.prune() == 0
+        member_sync.sync.assert_not_called()
+        assert obj.skipped_num == 1
+
+    def test_start_stop(self, member_sync, ns_data):
+        obj = membership.MembershipPruner(member_sync, ns_data, interval=0.01)
+
+        obj.start()
+        while not obj.syncs_num:
+            pass
+        obj.stop()
+
+        assert list(ns_data.endorseable) == ['nation_1', 'nation_4']
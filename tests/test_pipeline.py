@@ -0,0 +1,48 @@
+import threading
+
+import pytest
+
+from ns_endotarter import pipeline
+
+
+class TestRunStages():
+    def test_run_stages_with_dependencies(self):
+        stages = {'a': pipeline.Stage(lambda: 1, []),
+                  'b': pipeline.Stage(lambda: 2, []),
+                  'c': pipeline.Stage(lambda a, b: a + b, ['a', 'b'])}
+
+        results, durations = pipeline.run_stages(stages)
+
+        assert results == {'a': 1, 'b': 2, 'c': 3}
+        assert set(durations) == {'a', 'b', 'c'}
+
+    def test_independent_stages_run_concurrently(self):
+        barrier = threading.Barrier(2, timeout=5)
+        stages = {'a': pipeline.Stage(barrier.wait, []),
+                  'b': pipeline.Stage(barrier.wait, [])}
+
+        pipeline.run_stages(stages)
+
+    def test_single_worker(self):
+        stages = {'a': pipeline.Stage(lambda: 1, []),
+                  'b': pipeline.Stage(lambda a: a + 1, ['a'])}
+
+        results, durations = pipeline.run_stages(stages, max_workers=1)
+
+        assert results['b'] == 2
+
+    def test_unknown_dependency(self):
+        stages = {'b': pipeline.Stage(lambda a: a, ['a'])}
+
+        with pytest.raises(ValueError):
+            pipeline.run_stages(stages)
+
+    def test_stage_error(self):
+        def fail():
+            raise RuntimeError
+
+        stages = {'a': pipeline.Stage(fail, []),
+                  'b': pipeline.Stage(lambda a: a, ['a'])}
+
+        with pytest.raises(RuntimeError):
+            pipeline.run_stages(stages)
@@ -0,0 +1,68 @@
+from unittest import mock
+
+import pytest
+
+from ns_endotarter import planner
+from ns_endotarter import ratelimit
+
+
+@pytest.fixture
+def governor():
+    return ratelimit.Governor({ratelimit.API: (50, 30)})
+
+
+@pytest.fixture
+def dump_path(tmp_path):
+    dump_path = str(tmp_path / 'nations.xml.gz')
+    with open(dump_path, 'wb') as f:
+        f.write(b'0' * 1000)
+    return dump_path
+
+
+def new_planner(governor, dump_path, is_dump_updated=True):
+    cache = mock.Mock(is_file_updated=mock.Mock(return_value=is_dump_updated))
+    return planner.SourcePlanner(governor, cache, dump_path, api_request_seconds=0.5,
+                                 api_workers=2, dump_scan_rate=100, dump_download_rate=50)
+
+
+class TestSourcePlanner():
+    def test_estimate_api_within_budget(self, governor, dump_path):
+        obj = new_planner(governor, dump_path)
+
+        assert obj.estimate_api(10) == 2.5
+
+    def test_estimate_api_over_budget(self, governor, dump_path):
+        obj = new_planner(governor, dump_path)
+
+        # 50 requests go now, the other 60 in two more windows
+        assert obj.estimate_api(110) == 60
+
+    def test_estimate_dump(self, governor, dump_path):
+        obj = new_planner(governor, dump_path)
+
+        assert obj.estimate_dump() == 10
+
+    def test_estimate_dump_outdated(self, governor, dump_path):
+        obj = new_planner(governor, dump_path, is_dump_updated=False)
+
+        assert obj.estimate_dump() == 30
+
+    def test_estimate_dump_not_downloaded(self, governor, tmp_path):
+        obj = new_planner(governor, str(tmp_path / 'nations.xml.gz'), is_dump_updated=False)
+
+        assert obj.estimate_dump() == planner.DUMP_SIZE / 100 + planner.DUMP_SIZE / 50
+
+    def test_estimate_dump_indexed(self, governor, dump_path):
+        obj = new_planner(governor, dump_path, is_dump_updated=False)
+
+        assert obj.estimate_dump(is_indexed=True) == planner.INDEX_LOOKUP_SECONDS
+
+    def test_plan_small_region(self, governor, dump_path):
+        obj = new_planner(governor, dump_path)
+
+        assert obj.plan(10) == planner.Plan(planner.API, 2.5, 10)
+
+    def test_plan_large_region(self, governor, dump_path):
+        obj = new_planner(governor, dump_path)
+
+        assert obj.plan(110).source == planner.DUMP
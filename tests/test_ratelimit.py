@@ -0,0 +1,169 @@
+import collections
+import http.server
+import threading
+import time
+
+import pytest
+
+from ns_endotarter import executor
+from ns_endotarter import ratelimit
+
+
+class FakeClock():
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def governor(clock):
+    return ratelimit.Governor({ratelimit.API: (3, 10)}, clock, clock.sleep)
+
+
+class TestGovernor():
+    def test_get_capacity(self, governor):
+        governor.acquire(ratelimit.API)
+
+        assert governor.get_capacity(ratelimit.API) == (2, 3, 10)
+
+    def test_get_capacity_blocked(self, governor):
+        governor.block(ratelimit.API, 5)
+
+        assert governor.get_capacity(ratelimit.API) == (0, 3, 10)
+
+    def test_acquire_within_limit(self, governor):
+        waits = [governor.acquire(ratelimit.API) for _ in range(3)]
+
+        assert waits == [0, 0, 0]
+
+    def test_acquire_over_limit(self, governor, clock):
+        for _ in range(3):
+            governor.acquire(ratelimit.API)
+            clock.now += 1
+
+        assert governor.acquire(ratelimit.API) == 7
+        assert governor.get_metrics()[ratelimit.API]['wait_time'] == 7
+
+    def test_never_over_limit_in_any_window(self, governor, clock):
+        sent = []
+        for _ in range(30):
+            governor.acquire(ratelimit.API)
+            governor.update(ratelimit.API, {})
+            sent.append(clock.now)
+            clock.now += 0.5
+
+        assert all(sum(1 for t in sent if start <= t < start + 10) <= 3 for start in sent)
+
+    def test_try_acquire(self, governor):
+        assert governor.try_acquire(ratelimit.API, reserve=1)
+        assert governor.try_acquire(ratelimit.API, reserve=1)
+        assert not governor.try_acquire(ratelimit.API, reserve=1)
+        assert governor.try_acquire(ratelimit.API)
+        assert not governor.try_acquire(ratelimit.API)
+
+    def test_retry_after(self, governor):
+        governor.acquire(ratelimit.API)
+
+        governor.update(ratelimit.API, {'Retry-After': '60'}, 429)
+
+        assert governor.acquire(ratelimit.API) == 60
+        assert governor.get_metrics()[ratelimit.API]['throttled'] == 1
+
+    def test_remaining_zero(self, governor):
+        governor.acquire(ratelimit.API)
+
+        governor.update(ratelimit.API, {'RateLimit-Remaining': '0', 'RateLimit-Reset': '5'})
+
+        assert governor.acquire(ratelimit.API) == 5
+
+    def test_remaining_lower_than_budget(self, governor, clock):
+        governor.acquire(ratelimit.API)
+
+        governor.update(ratelimit.API, {'RateLimit-Remaining': '1', 'RateLimit-Reset': '4'})
+
+        assert governor.acquire(ratelimit.API) == 0
+        assert governor.acquire(ratelimit.API) == 4
+
+    def test_policy(self, governor):
+        governor.acquire(ratelimit.API)
+
+        governor.update(ratelimit.API, {'RateLimit-Policy': '1;w=20'})
+
+        assert governor.acquire(ratelimit.API) == 20
+
+    def test_block(self, governor):
+        governor.block(ratelimit.API, 15)
+
+        assert governor.acquire(ratelimit.API) == 15
+
+
+class LimitedHandler(http.server.BaseHTTPRequestHandler):
+    """Allows LIMIT requests per WINDOW seconds and reports it in headers."""
+
+    LIMIT = 5
+    WINDOW = 1
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            now = time.monotonic()
+            # Be slightly lenient for network jitter
+            while server.seen and server.seen[0] <= now - self.WINDOW * 0.95:
+                server.seen.popleft()
+
+            if len(server.seen) >= self.LIMIT:
+                server.throttled += 1
+                self.send_response(429)
+                self.send_header('Retry-After', str(self.WINDOW))
+                self.end_headers()
+                return
+
+            server.seen.append(now)
+            remaining = self.LIMIT - len(server.seen)
+
+        self.send_response(200)
+        self.send_header('RateLimit-Policy', '{};w={}'.format(self.LIMIT, self.WINDOW))
+        self.send_header('RateLimit-Remaining', str(remaining))
+        self.send_header('RateLimit-Reset', str(self.WINDOW))
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class TestGovernorWithLimitedServer():
+    @pytest.fixture
+    def limited_server(self):
+        server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), LimitedHandler)
+        server.lock = threading.Lock()
+        server.seen = collections.deque()
+        server.throttled = 0
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+
+        yield server
+
+        server.shutdown()
+        server.server_close()
+
+    def test_site_requests_stay_within_server_limit(self, limited_server):
+        governor = ratelimit.Governor({ratelimit.SITE: (50, 30)})
+        site = executor.NSSite('test', governor,
+                               'http://127.0.0.1:{}/'.format(limited_server.server_port))
+
+        statuses = [site.send(site.session.get, site.base_url).status_code for _ in range(12)]
+
+        assert statuses == [200] * 12
+        assert limited_server.throttled == 0
+        assert governor.get_metrics()[ratelimit.SITE]['waits'] > 0
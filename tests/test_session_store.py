@@ -0,0 +1,64 @@
+import os
+import stat
+
+import pytest
+
+from ns_endotarter import session_store
+
+
+@pytest.fixture
+def store(tmp_path):
+    return session_store.SessionStore(str(tmp_path / 'session.json'), 'my_nation')
+
+
+class TestSessionStore():
+    def test_save_and_load(self, store):
+        state = {'local_id': 'abc', 'cookies': {'pin': '123'}}
+
+        store.save(state)
+
+        assert store.load() == state
+
+    def test_owner_only_permissions(self, store):
+        store.save({})
+
+        assert stat.S_IMODE(os.stat(store.file_path).st_mode) == session_store.FILE_MODE
+
+    def test_existing_file_permissions_fixed(self, store):
+        with open(store.file_path + '.tmp', 'w'):
+            pass
+        os.chmod(store.file_path + '.tmp', 0o644)
+
+        store.save({})
+
+        assert stat.S_IMODE(os.stat(store.file_path).st_mode) == session_store.FILE_MODE
+
+    def test_load_not_exist(self, store):
+        assert store.load() is None
+
+    def test_load_readable_by_others(self, store):
+        store.save({})
+        os.chmod(store.file_path, 0o644)
+
+        assert store.load() is None
+
+    def test_load_other_nation(self, store, tmp_path):
+        store.save({})
+
+        other = session_store.SessionStore(store.file_path, 'other_nation')
+
+        assert other.load() is None
+
+    def test_load_corrupt(self, store):
+        store.save({})
+        with open(store.file_path, 'w') as f:
+            f.write('{')
+
+        assert store.load() is None
+
+    def test_clear(self, store):
+        store.save({})
+
+        store.clear()
+
+        assert not os.path.exists(store.file_path)
@@ -1,3 +1,13 @@
+import gzip
+import http.server
+import os
+import threading
+import zlib
+from unittest import mock
+
+import pytest
+
+from ns_endotarter import exceptions
 from ns_endotarter import utils
 
 
@@ -6,3 +16,182 @@ class TestUtils():
         result = utils.canonical('Test_Nation')
 
         assert result == 'test_nation'
+
+
+class TestThreadedGzipReader():
+    @pytest.fixture
+    def gzip_file(self, tmp_path):
+        file_path = tmp_path / 'dump.xml.gz'
+        content = b''.join(b'<NATION>%d</NATION>' % i for i in range(20000))
+        with gzip.open(file_path, 'wb') as f:
+            f.write(content)
+        # Append a second gzip member
+        with gzip.open(file_path, 'ab') as f:
+            f.write(b'<END/>')
+
+        return file_path, content + b'<END/>'
+
+    def test_read(self, gzip_file):
+        file_path, content = gzip_file
+
+        with utils.ThreadedGzipReader(open(file_path, 'rb'), buffer_size=1024,
+                                      queue_depth=2) as reader:
+            result = b''.join(iter(lambda: reader.read(5000), b''))
+
+        assert result == content
+
+    def test_close_stops_decompression(self, gzip_file):
+        file_path, content = gzip_file
+        reader = utils.ThreadedGzipReader(open(file_path, 'rb'), buffer_size=64,
+                                          queue_depth=1)
+
+        reader.read(10)
+        reader.close()
+
+        assert not reader.thread.is_alive()
+        assert reader.fileobj.closed
+
+    def test_read_corrupted_file(self, tmp_path):
+        file_path = tmp_path / 'dump.xml.gz'
+        file_path.write_bytes(b'not gzip')
+
+        with utils.ThreadedGzipReader(open(file_path, 'rb')) as reader:
+            with pytest.raises(zlib.error):
+                reader.read()
+
+
+class DumpHandler(http.server.BaseHTTPRequestHandler):
+    """Serves the data dump of the server with conditional request support."""
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        if server.status != 200:
+            self.send_response(server.status)
+            self.end_headers()
+            return
+
+        if self.headers.get('If-None-Match') == server.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('ETag', server.etag)
+        self.send_header('Last-Modified', 'Thu, 01 Jan 1970 00:00:00 GMT')
+        self.send_header('Content-Length', str(len(server.dump)))
+        self.end_headers()
+        self.wfile.write(server.dump)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def dump_server():
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), DumpHandler)
+    server.dump = gzip.compress(b'<NATIONS></NATIONS>')
+    server.etag = '"1"'
+    server.status = 200
+    server.requests = []
+    server.url = 'http://127.0.0.1:{}/nations.xml.gz'.format(server.server_port)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+class TestRefreshDump():
+    def test_download_new_dump(self, dump_server, tmp_path):
+        file_path = str(tmp_path / 'nations.xml.gz')
+
+        is_downloaded = utils.refresh_dump(file_path, dump_server.url, 'test')
+
+        assert is_downloaded
+        assert gzip.open(file_path).read() == b'<NATIONS></NATIONS>'
+        assert utils.load_dump_meta(file_path)['etag'] == '"1"'
+        assert dump_server.requests[0]['User-Agent'] == 'test'
+
+    def test_not_download_unchanged_dump(self, dump_server, tmp_path):
+        file_path = str(tmp_path / 'nations.xml.gz')
+        utils.refresh_dump(file_path, dump_server.url)
+
+        is_downloaded = utils.refresh_dump(file_path, dump_server.url)
+
+        assert not is_downloaded
+        assert dump_server.requests[1]['If-None-Match'] == '"1"'
+        assert dump_server.requests[1]['If-Modified-Since'] == 'Thu, 01 Jan 1970 00:00:00 GMT'
+
+    def test_download_changed_dump(self, dump_server, tmp_path):
+        file_path = str(tmp_path / 'nations.xml.gz')
+        utils.refresh_dump(file_path, dump_server.url)
+        dump_server.dump = gzip.compress(b'<NATIONS><NATION></NATION></NATIONS>')
+        dump_server.etag = '"2"'
+
+        is_downloaded = utils.refresh_dump(file_path, dump_server.url)
+
+        assert is_downloaded
+        assert gzip.open(file_path).read() == b'<NATIONS><NATION></NATION></NATIONS>'
+
+    def test_failed_download_keeps_old_dump(self, dump_server, tmp_path):
+        file_path = str(tmp_path / 'nations.xml.gz')
+        utils.refresh_dump(file_path, dump_server.url)
+        dump_server.status = 500
+
+        with pytest.raises(exceptions.DumpError):
+            utils.refresh_dump(file_path, dump_server.url)
+
+        assert gzip.open(file_path).read() == b'<NATIONS></NATIONS>'
+        assert sorted(os.listdir(tmp_path)) == ['nations.xml.gz', 'nations.xml.gz.meta.json']
+
+    def test_interrupted_download_removes_temp_file(self, dump_server, tmp_path):
+        file_path = str(tmp_path / 'nations.xml.gz')
+
+        with mock.patch('shutil.copyfileobj', side_effect=IOError):
+            with pytest.raises(IOError):
+                utils.refresh_dump(file_path, dump_server.url)
+
+        assert os.listdir(tmp_path) == []
+
+
+class TestStreamDump():
+    @pytest.fixture
+    def content(self, dump_server):
+        content = b''.join(b'<NATION>%d</NATION>' % i for i in range(100000))
+        dump_server.dump = gzip.compress(content)
+        return content
+
+    def test_read_while_downloading(self, dump_server, content, tmp_path):
+        file_path = str(tmp_path / 'nations.xml.gz')
+
+        with utils.load_dump(file_path, stream=True, url=dump_server.url) as dump:
+            result = dump.read()
+
+        assert result == content
+        assert gzip.open(file_path).read() == content
+        assert utils.load_dump_meta(file_path)['etag'] == '"1"'
+
+    def test_download_continues_after_early_close(self, dump_server, content, tmp_path):
+        file_path = str(tmp_path / 'nations.xml.gz')
+        dump = utils.load_dump(file_path, stream=True, buffer_size=1024,
+                               queue_depth=1, url=dump_server.url)
+
+        dump.read(10)
+        dump.close()
+        dump.fileobj.thread.join()
+
+        assert gzip.open(file_path).read() == content
+        assert sorted(os.listdir(tmp_path)) == ['nations.xml.gz', 'nations.xml.gz.meta.json']
+
+    def test_unchanged_dump_is_read_from_disk(self, dump_server, content, tmp_path):
+        file_path = str(tmp_path / 'nations.xml.gz')
+        utils.refresh_dump(file_path, dump_server.url)
+
+        with utils.load_dump(file_path, refresh=True, stream=True, url=dump_server.url) as dump:
+            result = dump.read()
+
+        assert result == content
+        assert len(dump_server.requests) == 2